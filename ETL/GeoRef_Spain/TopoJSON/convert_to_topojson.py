@@ -28,6 +28,37 @@ SIMPLIFICATION_TOLERANCE = 0.0001
 QUANTIZATION = 1e5 
 print(f"Parámetros: Tolerancia de Simplificación={SIMPLIFICATION_TOLERANCE}, Cuantización={QUANTIZATION}")
 
+# --- Pirámide de Simplificación ---
+# Un TopoJSON por nivel de detalle: los mapas cargan el nivel que corresponde al ámbito mostrado
+# (España completa a zoom 6, una o varias CCAA, provincias). Tolerancias en grados (0.001 ≈ 100 m).
+# El nivel 'provincia' es el de máximo detalle y se guarda en TOPOJSON_PATH, como hasta ahora;
+# el resto en georef-spain-municipio_<nivel>.topojson.
+NIVELES_SIMPLIFICACION = {
+    'espana': {'simplification_tolerance': 0.005, 'quantization': 1e4},
+    'ccaa': {'simplification_tolerance': 0.001, 'quantization': 5e4},
+    'provincia': {'simplification_tolerance': SIMPLIFICATION_TOLERANCE, 'quantization': QUANTIZATION},
+}
+NIVEL_MAXIMO_DETALLE = 'provincia'
+
+
+def ruta_topojson_nivel(nivel, output_dir=CURRENT_DIR):
+    """Ruta del TopoJSON de un nivel de la pirámide."""
+    if nivel == NIVEL_MAXIMO_DETALLE:
+        return os.path.join(output_dir, TOPOJSON_FILENAME)
+    base, ext = os.path.splitext(TOPOJSON_FILENAME)
+    return os.path.join(output_dir, f"{base}_{nivel}{ext}")
+
+
+def construir_topojson(gdf, simplification_tolerance, quantization):
+    """String TopoJSON (objeto 'municipios') de un GeoDataFrame en EPSG:4326."""
+    topo = tp.Topology(
+        gdf,
+        object_name="municipios",
+        prequantize=quantization if quantization > 0 else False,
+        toposimplify=simplification_tolerance if simplification_tolerance > 0 else False
+    )
+    return topo.to_json()
+
 def convert_geojson_to_topojson(geojson_path, topojson_path, simplification_tolerance=0.0001, quantization=1e5):
     """
     Convierte un archivo GeoJSON a TopoJSON, aplicando simplificación y cuantización.
@@ -56,20 +87,11 @@ def convert_geojson_to_topojson(geojson_path, topojson_path, simplification_tole
             print(f"CRS convertido a {gdf.crs}.")
 
         print("Iniciando conversión a TopoJSON con la biblioteca 'topojson'...")
-        topo = tp.Topology(
-            gdf, 
-            object_name="municipios",
-            prequantize=quantization if quantization > 0 else False,
-            toposimplify=simplification_tolerance if simplification_tolerance > 0 else False
-        )
-        print(f"Conversión a objeto TopoJSON completada.")
+        topo_json_string = construir_topojson(gdf, simplification_tolerance, quantization)
+        print(f"Conversión a TopoJSON completada.")
 
         # Guardar el TopoJSON
         print(f"Preparando para guardar TopoJSON en: {topojson_path}...")
-        
-        # Cambio: Intentar con topo.to_json() que devuelve un string JSON
-        topo_json_string = topo.to_json() 
-        
         output_dir = os.path.dirname(topojson_path)
         if not os.path.exists(output_dir):
             print(f"El directorio de salida {output_dir} no existe. Creándolo...")
@@ -97,6 +119,43 @@ def convert_geojson_to_topojson(geojson_path, topojson_path, simplification_tole
         traceback.print_exc()
         print("--- Fin Traceback ---")
 
+def generar_piramide(geojson_path, output_dir=CURRENT_DIR, niveles=NIVELES_SIMPLIFICACION):
+    """
+    Genera un TopoJSON por nivel de `niveles` leyendo el GeoJSON una sola vez.
+    Devuelve {nivel: tamaño en bytes} e imprime el tamaño de cada nivel frente al GeoJSON original.
+    """
+    if not os.path.exists(geojson_path):
+        print(f"Error Crítico: No se encontró el archivo GeoJSON en {geojson_path}")
+        return {}
+
+    print(f"Cargando GeoJSON con GeoPandas: {geojson_path}...")
+    gdf = gpd.read_file(geojson_path)
+    if gdf.empty:
+        print("Error Crítico: El GeoDataFrame cargado está vacío.")
+        return {}
+    if gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    os.makedirs(output_dir, exist_ok=True)
+
+    tamaños = {}
+    for nivel, parametros in niveles.items():
+        topojson_path = ruta_topojson_nivel(nivel, output_dir)
+        print(f"Nivel '{nivel}': tolerancia={parametros['simplification_tolerance']}, "
+              f"cuantización={parametros['quantization']:g} -> {topojson_path}")
+        topo_json_string = construir_topojson(gdf, **parametros)
+        tmp_path = topojson_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(topo_json_string)
+        os.replace(tmp_path, topojson_path)
+        tamaños[nivel] = os.path.getsize(topojson_path)
+
+    size_geojson = os.path.getsize(geojson_path)
+    print(f"\nTamaño por nivel (GeoJSON original: {size_geojson / (1024 * 1024):.2f} MB):")
+    for nivel, size in tamaños.items():
+        print(f"  {nivel:<10} {size / (1024 * 1024):8.2f} MB  ({size / size_geojson:.1%} del GeoJSON)")
+    return tamaños
+
+
 if __name__ == "__main__":
     print("Ejecutando bloque __main__ del script...")
     output_dir_main = os.path.dirname(TOPOJSON_PATH)
@@ -105,12 +164,11 @@ if __name__ == "__main__":
         os.makedirs(output_dir_main)
         print(f"Bloque __main__: Directorio {output_dir_main} creado.")
 
-    convert_geojson_to_topojson(
-        GEOJSON_PATH, 
-        TOPOJSON_PATH,
-        simplification_tolerance=SIMPLIFICATION_TOLERANCE,
-        quantization=QUANTIZATION
-    )
+    try:
+        generar_piramide(GEOJSON_PATH, output_dir_main)
+    except Exception as e:
+        print(f"Ocurrió un error CRÍTICO durante la generación de la pirámide: {e}")
+        traceback.print_exc()
     print("\n--- Script de Conversión a TopoJSON Finalizado ---")
     print("Recordatorio: Asegúrate de tener la biblioteca 'topojson' instalada (`pip install topojson`).")
     print("También necesitarás 'geopandas' (`pip install geopandas`).")
@@ -0,0 +1,198 @@
+import glob
+import json
+import os
+import sys
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+# Capa municipal normalizada para el dashboard (mapa de densidad de población).
+# Todo el trabajo que antes hacía la página en cada arranque (leer el TopoJSON dos
+# veces, estandarizar códigos y nombres, convertir a GeoJSON, validar geometrías y
+# calcular áreas) se hace aquí una sola vez. Salidas en capa_municipios/:
+#   - municipios.parquet: GeoParquet (EPSG:4326) con mun_code, nombres, CCAA/provincia y area_km2
+#   - municipios.geojson: las mismas geometrías y propiedades, ya serializadas para Folium
+#   - mun_area.csv: área de cada municipio (tabla 'mun_area' del data warehouse)
+#   - municipios_<nivel>.geojson: mismas propiedades con la geometría de cada nivel simplificado
+#     de la pirámide de TopoJSON/convert_to_topojson.py (los mapas eligen nivel según el ámbito)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+TOPOJSON_DIR = os.path.join(CURRENT_DIR, "TopoJSON")
+TOPOJSON_PATH = os.path.join(TOPOJSON_DIR, "georef-spain-municipio.topojson")
+TOPOJSON_NIVEL_PATRON = os.path.join(TOPOJSON_DIR, "georef-spain-municipio_*.topojson")
+GEOJSON_PATH = os.path.join(CURRENT_DIR, "georef-spain-municipio.geojson")
+
+OUTPUT_DIR = os.path.join(CURRENT_DIR, "capa_municipios")
+PARQUET_PATH = os.path.join(OUTPUT_DIR, "municipios.parquet")
+GEOJSON_OUTPUT_PATH = os.path.join(OUTPUT_DIR, "municipios.geojson")
+AREA_CSV_PATH = os.path.join(OUTPUT_DIR, "mun_area.csv")
+
+CRS_GEOGRAFICO = "EPSG:4326"
+# Proyección para el cálculo de áreas: ETRS89 / UTM 30N (península, Baleares, Ceuta y Melilla),
+# salvo Canarias (provincias 35 y 38), que están en el huso 28: REGCAN95 / UTM 28N
+CRS_AREA = "EPSG:25830"
+CRS_AREA_POR_PROVINCIA = {'35': "EPSG:4083", '38': "EPSG:4083"}
+COORDINATE_PRECISION = 6  # decimales de las coordenadas en el GeoJSON (~0.1 m)
+
+CODE_COL_OPTIONS = ['mun_code', 'ine.ine_cod_municipio', 'natcode', 'cartodb_id']
+NAME_COL_OPTIONS = ['mun_name', 'nameunit', 'nombre']
+COLUMNAS_CAPA = ['mun_code', 'mun_name', 'prov_name', 'acom_code', 'acom_name', 'area_km2']
+
+
+def primera_columna(gdf, opciones):
+    return next((col for col in opciones if col in gdf.columns), None)
+
+
+def estandarizar_codigo(serie):
+    """Código INE de 5 dígitos como texto ('1001.0' -> '01001')."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float).astype(int).astype(str).str.zfill(5)
+    return serie.astype(str).str.split('.').str[0].str.zfill(5)
+
+
+def crs_area_municipios(mun_codes):
+    """CRS proyectado con el que se mide el área de cada municipio (según su provincia)."""
+    return mun_codes.str[:2].map(CRS_AREA_POR_PROVINCIA).fillna(CRS_AREA)
+
+
+def calcular_area_km2(capa):
+    """Área en km² de cada municipio, proyectando cada grupo de provincias a su huso UTM."""
+    crs_area = crs_area_municipios(capa['mun_code'])
+    area_km2 = pd.Series(np.nan, index=capa.index, dtype='float64')
+    for crs, indices in capa.groupby(crs_area).groups.items():
+        area_km2[indices] = capa.loc[indices].to_crs(crs).area / 1_000_000
+    return area_km2
+
+
+def normalizar_municipios(gdf):
+    """GeoDataFrame con las columnas de COLUMNAS_CAPA (las disponibles) y geometrías válidas."""
+    if gdf.crs is None:
+        gdf = gdf.set_crs(CRS_GEOGRAFICO)
+    elif gdf.crs != CRS_GEOGRAFICO:
+        gdf = gdf.to_crs(CRS_GEOGRAFICO)
+
+    code_col = primera_columna(gdf, CODE_COL_OPTIONS)
+    if code_col is None:
+        raise ValueError(f"No se encontró columna de código municipal. Columnas: {gdf.columns.tolist()}")
+    name_col = primera_columna(gdf, NAME_COL_OPTIONS)
+
+    capa = gpd.GeoDataFrame({'mun_code': estandarizar_codigo(gdf[code_col])}, geometry=gdf.geometry.values,
+                            crs=gdf.crs, index=gdf.index)
+    capa['mun_name'] = gdf[name_col].astype(str) if name_col else capa['mun_code']
+    for col in ['prov_name', 'acom_code', 'acom_name']:
+        if col in gdf.columns:
+            capa[col] = gdf[col]
+
+    n_inicial = len(capa)
+    capa = capa[capa.is_valid & ~capa.is_empty]
+    capa = capa.drop_duplicates(subset=['mun_code'], keep='first')
+    if len(capa) < n_inicial:
+        print(f"⚠️ Descartados {n_inicial - len(capa)} municipios con geometría inválida/vacía o código duplicado")
+
+    capa['area_km2'] = calcular_area_km2(capa)
+    columnas = [col for col in COLUMNAS_CAPA if col in capa.columns]
+    return capa[columnas + ['geometry']].reset_index(drop=True)
+
+
+def topojson_niveles(patron=TOPOJSON_NIVEL_PATRON):
+    """{nivel: ruta} de los TopoJSON simplificados generados por convert_to_topojson.py."""
+    prefijo, sufijo = os.path.basename(patron).split('*')
+    return {os.path.basename(ruta)[len(prefijo):-len(sufijo)]: ruta for ruta in sorted(glob.glob(patron))}
+
+
+def ruta_geojson_nivel(nivel, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, f"municipios_{nivel}.geojson")
+
+
+def simplificar_capa(capa, gdf_nivel):
+    """
+    Capa con las mismas filas y propiedades que `capa` y la geometría de un nivel simplificado.
+    Los municipios que faltan en el nivel o cuya geometría simplificada no es válida conservan la original.
+    """
+    if gdf_nivel.crs is not None and gdf_nivel.crs != CRS_GEOGRAFICO:
+        gdf_nivel = gdf_nivel.to_crs(CRS_GEOGRAFICO)
+    code_col = primera_columna(gdf_nivel, CODE_COL_OPTIONS)
+    if code_col is None:
+        raise ValueError(f"No se encontró columna de código municipal. Columnas: {gdf_nivel.columns.tolist()}")
+
+    geometrias = gpd.GeoSeries(gdf_nivel.geometry.values, index=estandarizar_codigo(gdf_nivel[code_col]).values,
+                               crs=CRS_GEOGRAFICO)
+    geometrias = geometrias[geometrias.is_valid & ~geometrias.is_empty]
+    geometrias = geometrias[~geometrias.index.duplicated(keep='first')]
+
+    simplificadas = geometrias.reindex(capa['mun_code'].values)
+    faltan = simplificadas.isna().to_numpy()
+    if faltan.any():
+        print(f"⚠️ {faltan.sum()} municipios sin geometría simplificada válida; se usa la original")
+    geometria = gpd.GeoSeries(np.where(faltan, capa.geometry.values, simplificadas.values), index=capa.index,
+                              crs=capa.crs)
+    return capa.set_geometry(geometria)
+
+
+def escribir_geojson(capa, geojson_path):
+    """Escribe el GeoJSON vía archivo temporal y comprueba que es legible antes de publicarlo."""
+    tmp_geojson = geojson_path + ".tmp"
+    capa.to_file(tmp_geojson, driver="GeoJSON", COORDINATE_PRECISION=COORDINATE_PRECISION)
+    with open(tmp_geojson, 'r', encoding='utf-8') as f:
+        n_features = len(json.load(f)['features'])
+    if n_features != len(capa):
+        raise ValueError(f"El GeoJSON tiene {n_features} features y la capa {len(capa)} municipios")
+    os.replace(tmp_geojson, geojson_path)
+
+
+def guardar_capa(capa, parquet_path=PARQUET_PATH, geojson_path=GEOJSON_OUTPUT_PATH, area_csv_path=AREA_CSV_PATH):
+    """Escribe el GeoParquet, el GeoJSON y la tabla de áreas (vía archivos temporales, para no dejar salidas a medias)."""
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+
+    df_area = pd.DataFrame({'mun_code': capa['mun_code'], 'area_km2': capa['area_km2'],
+                            'crs_area': crs_area_municipios(capa['mun_code'])})
+    tmp_area = area_csv_path + ".tmp"
+    df_area.to_csv(tmp_area, index=False)
+    os.replace(tmp_area, area_csv_path)
+
+    tmp_parquet = parquet_path + ".tmp"
+    capa.to_parquet(tmp_parquet, index=False)
+    os.replace(tmp_parquet, parquet_path)
+
+    escribir_geojson(capa, geojson_path)
+
+
+def guardar_niveles(capa, niveles, output_dir=OUTPUT_DIR):
+    """Escribe municipios_<nivel>.geojson para cada TopoJSON simplificado. Devuelve {nivel: ruta}."""
+    rutas = {}
+    for nivel, topojson_path in niveles.items():
+        rutas[nivel] = ruta_geojson_nivel(nivel, output_dir)
+        escribir_geojson(simplificar_capa(capa, gpd.read_file(topojson_path)), rutas[nivel])
+    return rutas
+
+
+def main():
+    inicio = time.perf_counter()
+    origen = TOPOJSON_PATH if os.path.exists(TOPOJSON_PATH) else GEOJSON_PATH
+    if not os.path.exists(origen):
+        print(f"❌ No se encontró ni el TopoJSON ({TOPOJSON_PATH}) ni el GeoJSON ({GEOJSON_PATH}) de municipios.")
+        return 1
+
+    print(f"Leyendo municipios desde: {origen}")
+    gdf = gpd.read_file(origen)
+    capa = normalizar_municipios(gdf)
+    guardar_capa(capa)
+    niveles = topojson_niveles() if origen == TOPOJSON_PATH else {}
+    rutas_niveles = guardar_niveles(capa, niveles)
+
+    print(f"✅ Capa de {len(capa)} municipios guardada en:")
+    print(f"   {PARQUET_PATH} ({os.path.getsize(PARQUET_PATH) / 1e6:.1f} MB)")
+    print(f"   {GEOJSON_OUTPUT_PATH} ({os.path.getsize(GEOJSON_OUTPUT_PATH) / 1e6:.1f} MB, máximo detalle)")
+    for nivel, ruta in rutas_niveles.items():
+        print(f"   {ruta} ({os.path.getsize(ruta) / 1e6:.1f} MB, nivel '{nivel}')")
+    if not rutas_niveles:
+        print("   (sin niveles simplificados: ejecute TopoJSON/convert_to_topojson.py para generarlos)")
+    print(f"   {AREA_CSV_PATH}")
+    print(f"Tiempo total: {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
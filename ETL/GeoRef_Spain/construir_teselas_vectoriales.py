@@ -0,0 +1,225 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import geopandas as gpd
+import mapbox_vector_tile
+import numpy as np
+import shapely
+from mapbox_vector_tile.encoder import on_invalid_geometry_make_valid
+
+from construir_capa_municipios import CODE_COL_OPTIONS, NAME_COL_OPTIONS, estandarizar_codigo, primera_columna
+
+# Teselas vectoriales (Mapbox Vector Tiles) de municipios y comunidades autónomas en un único
+# archivo MBTiles. Los mapas del dashboard las piden a un servidor local
+# (dashboard/servidor_teselas.py), así que el navegador solo descarga las teselas visibles
+# en lugar de recibir todo el GeoJSON incrustado en el HTML de Folium.
+#   - capa 'municipios': mun_code, mun_name, prov_name, acom_name
+#   - capa 'comunidades': acom_code, acom_name
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MUNICIPIOS_GEOJSON_PATH = os.path.join(CURRENT_DIR, "georef-spain-municipio.geojson")
+COMUNIDADES_GEOJSON_PATH = os.path.join(CURRENT_DIR, "georef-spain-comunidad-autonoma.geojson")
+
+OUTPUT_DIR = os.path.join(CURRENT_DIR, "teselas")
+MBTILES_PATH = os.path.join(OUTPUT_DIR, "georef-spain.mbtiles")
+
+MIN_ZOOM = 4
+MAX_ZOOM = 10  # a partir de aquí el cliente escala las teselas de MAX_ZOOM (maxNativeZoom)
+EXTENT = 4096  # resolución interna de cada tesela
+BUFFER = 64  # margen alrededor de la tesela, en unidades de EXTENT (evita cortes visibles en los bordes)
+TOLERANCIA_PIXELES = 1.0  # simplificación por zoom: la geometría se simplifica a ~1 píxel de pantalla
+
+CRS_TESELAS = "EPSG:3857"
+ORIGEN_MERCATOR = 20037508.342789244
+
+CAMPOS_MUNICIPIOS = ['mun_code', 'mun_name', 'prov_name', 'acom_name']
+CAMPOS_COMUNIDADES = ['acom_code', 'acom_name']
+
+
+def leer_municipios(ruta=MUNICIPIOS_GEOJSON_PATH):
+    """Municipios en EPSG:3857 con mun_code de 5 dígitos (clave de unión del coroplético en el cliente)."""
+    gdf = gpd.read_file(ruta)
+    code_col = primera_columna(gdf, CODE_COL_OPTIONS)
+    if code_col is None:
+        raise ValueError(f"No se encontró columna de código municipal. Columnas: {gdf.columns.tolist()}")
+    name_col = primera_columna(gdf, NAME_COL_OPTIONS)
+    gdf['mun_code'] = estandarizar_codigo(gdf[code_col])
+    gdf['mun_name'] = gdf[name_col].astype(str) if name_col else gdf['mun_code']
+    gdf = gdf.drop_duplicates(subset=['mun_code'], keep='first')
+    return a_crs_teselas(gdf, CAMPOS_MUNICIPIOS)
+
+
+def leer_comunidades(ruta=COMUNIDADES_GEOJSON_PATH):
+    gdf = gpd.read_file(ruta)
+    if 'acom_code' in gdf.columns:
+        gdf['acom_code'] = gdf['acom_code'].astype(str)
+    return a_crs_teselas(gdf, CAMPOS_COMUNIDADES)
+
+
+def a_crs_teselas(gdf, campos):
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    columnas = [c for c in campos if c in gdf.columns]
+    return gdf[columnas + [gdf.geometry.name]].to_crs(CRS_TESELAS).reset_index(drop=True)
+
+
+def propiedades(gdf):
+    """Lista de dicts de propiedades (sin nulos, todo texto) en el orden de las filas."""
+    columnas = [c for c in gdf.columns if c != gdf.geometry.name]
+    registros = gdf[columnas].astype(object).where(gdf[columnas].notna(), None).to_dict('records')
+    return [{k: str(v) for k, v in r.items() if v is not None} for r in registros]
+
+
+def tamaño_tesela(z):
+    return 2 * ORIGEN_MERCATOR / 2 ** z
+
+
+def limites_tesela(z, x, y):
+    """(minx, miny, maxx, maxy) en EPSG:3857 de la tesela XYZ (y hacia abajo, como Leaflet)."""
+    size = tamaño_tesela(z)
+    minx = -ORIGEN_MERCATOR + x * size
+    maxy = ORIGEN_MERCATOR - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def rango_teselas(z, bounds):
+    """Rangos de x e y de las teselas del zoom z que cubren bounds (EPSG:3857)."""
+    size = tamaño_tesela(z)
+    n = 2 ** z
+    minx, miny, maxx, maxy = bounds
+    x0 = int(np.clip((minx + ORIGEN_MERCATOR) // size, 0, n - 1))
+    x1 = int(np.clip((maxx + ORIGEN_MERCATOR) // size, 0, n - 1))
+    y0 = int(np.clip((ORIGEN_MERCATOR - maxy) // size, 0, n - 1))
+    y1 = int(np.clip((ORIGEN_MERCATOR - miny) // size, 0, n - 1))
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+class CapaTeselas:
+    """Geometrías de una capa simplificadas para un zoom, con índice espacial para recortar por tesela."""
+
+    def __init__(self, nombre, gdf, z):
+        self.nombre = nombre
+        tolerancia = TOLERANCIA_PIXELES * tamaño_tesela(z) / 256
+        geometrias = shapely.simplify(gdf.geometry.to_numpy(), tolerancia, preserve_topology=True)
+        validas = ~shapely.is_empty(geometrias)
+        self.geometrias = geometrias[validas]
+        self.propiedades = [p for p, ok in zip(propiedades(gdf), validas) if ok]
+        self.arbol = shapely.STRtree(self.geometrias)
+
+    def features(self, bbox):
+        indices = self.arbol.query(shapely.box(*bbox))
+        if len(indices) == 0:
+            return []
+        recortes = shapely.clip_by_rect(self.geometrias[indices], *bbox)
+        return [{'geometry': g, 'properties': self.propiedades[i]}
+                for g, i in zip(recortes, indices) if not g.is_empty and g.area > 0]
+
+
+def teselas_zoom(capas_gdf, z, bounds):
+    """Genera (x, y, datos gzip) de todas las teselas no vacías del zoom z."""
+    capas = [CapaTeselas(nombre, gdf, z) for nombre, gdf in capas_gdf.items()]
+    margen = tamaño_tesela(z) * BUFFER / EXTENT
+    xs, ys = rango_teselas(z, bounds)
+    for x in xs:
+        for y in ys:
+            limites = limites_tesela(z, x, y)
+            bbox = (limites[0] - margen, limites[1] - margen, limites[2] + margen, limites[3] + margen)
+            contenido = [{'name': capa.nombre, 'features': features} for capa in capas
+                         if (features := capa.features(bbox))]
+            if not contenido:
+                continue
+            pbf = mapbox_vector_tile.encode(contenido, default_options={
+                'quantize_bounds': limites, 'extents': EXTENT,
+                'on_invalid_geometry': on_invalid_geometry_make_valid})
+            yield x, y, gzip.compress(pbf)
+
+
+def metadatos(capas_gdf, bounds_4326, min_zoom, max_zoom):
+    w, s, e, n = bounds_4326
+    vector_layers = [{'id': nombre, 'minzoom': min_zoom, 'maxzoom': max_zoom,
+                      'fields': {c: 'String' for c in gdf.columns if c != gdf.geometry.name}}
+                     for nombre, gdf in capas_gdf.items()]
+    return {
+        'name': 'georef-spain',
+        'description': 'Municipios y comunidades autónomas de España (GeoRef Spain)',
+        'format': 'pbf',
+        'type': 'overlay',
+        'version': '1',
+        'minzoom': str(min_zoom),
+        'maxzoom': str(max_zoom),
+        'bounds': f"{w:.6f},{s:.6f},{e:.6f},{n:.6f}",
+        'center': f"{(w + e) / 2:.6f},{(s + n) / 2:.6f},{min_zoom + 2}",
+        'json': json.dumps({'vector_layers': vector_layers}, ensure_ascii=False),
+    }
+
+
+def escribir_mbtiles(capas_gdf, mbtiles_path=MBTILES_PATH, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Escribe el MBTiles (vía archivo temporal). Devuelve {zoom: (teselas, bytes)}."""
+    os.makedirs(os.path.dirname(mbtiles_path), exist_ok=True)
+    bounds = np.array([gdf.total_bounds for gdf in capas_gdf.values()])
+    bounds = (bounds[:, 0].min(), bounds[:, 1].min(), bounds[:, 2].max(), bounds[:, 3].max())
+    bounds_4326 = gpd.GeoSeries([shapely.box(*bounds)], crs=CRS_TESELAS).to_crs("EPSG:4326").total_bounds
+
+    tmp_path = mbtiles_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    resumen = {}
+    try:
+        conn.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        conn.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        conn.executemany("INSERT INTO metadata VALUES (?, ?)",
+                         metadatos(capas_gdf, bounds_4326, min_zoom, max_zoom).items())
+        for z in range(min_zoom, max_zoom + 1):
+            inicio = time.perf_counter()
+            n_teselas = n_bytes = 0
+            # MBTiles guarda las filas en esquema TMS (y hacia arriba)
+            for x, y, datos in teselas_zoom(capas_gdf, z, bounds):
+                conn.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)", (z, x, 2 ** z - 1 - y, datos))
+                n_teselas += 1
+                n_bytes += len(datos)
+            resumen[z] = (n_teselas, n_bytes)
+            print(f"  zoom {z:>2}: {n_teselas:>6} teselas, {n_bytes / 1e6:7.2f} MB "
+                  f"({time.perf_counter() - inicio:.1f} s)")
+        conn.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, mbtiles_path)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera las teselas vectoriales (MBTiles) de municipios y CCAA.")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    faltan = [p for p in (MUNICIPIOS_GEOJSON_PATH, COMUNIDADES_GEOJSON_PATH) if not os.path.exists(p)]
+    if faltan:
+        print(f"❌ No se encontraron los GeoJSON de origen: {faltan}")
+        return 1
+
+    print(f"Leyendo municipios desde: {MUNICIPIOS_GEOJSON_PATH}")
+    print(f"Leyendo comunidades autónomas desde: {COMUNIDADES_GEOJSON_PATH}")
+    capas_gdf = {'municipios': leer_municipios(), 'comunidades': leer_comunidades()}
+
+    print(f"Generando teselas de los zooms {args.min_zoom}-{args.max_zoom}...")
+    resumen = escribir_mbtiles(capas_gdf, MBTILES_PATH, args.min_zoom, args.max_zoom)
+
+    total_teselas = sum(n for n, _ in resumen.values())
+    print(f"✅ {total_teselas} teselas guardadas en {MBTILES_PATH} "
+          f"({os.path.getsize(MBTILES_PATH) / 1e6:.1f} MB)")
+    print(f"Tiempo total: {time.perf_counter() - inicio:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,18 @@
 import os
 import re
+import json
 from collections import Counter
 from urllib.parse import unquote
 
 
 
 folder = "./ETL/PIE/data/raw/finanzas/liquidaciones/por_municipios_regimen_general/"
-files = os.listdir(folder)
+manifiesto = os.path.join(folder, "seleccion_liquidaciones.json")
+files = [f for f in os.listdir(folder) if f != os.path.basename(manifiesto)]
+# Libros originales seleccionados (ya no se convierten a .xlsx en esta carpeta)
+if os.path.exists(manifiesto):
+    with open(manifiesto, encoding="utf-8") as f:
+        files += [os.path.basename(ruta) for ruta in json.load(f).values()]
 
 years = []
 for fname in files:
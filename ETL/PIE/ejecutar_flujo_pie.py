@@ -1,20 +1,15 @@
-import subprocess
+import sys
+from pathlib import Path
 
-def run_script(path):
-    print(f"Ejecutando: {path}")
-    result = subprocess.run(["python", path], capture_output=True, text=True)
-    print(result.stdout)
-    if result.stderr:
-        print("STDERR:", result.stderr)
+# El flujo PIE es el grupo 'pie' del grafo común del ETL (ETL/ejecutar_flujo_etl.py):
+# 1. Descargar archivos originales (pie_descarga)
+# 2. Seleccionar los archivos homogéneos de cada año, sin convertirlos (pie_seleccion)
+# 3. (Opcional) Verificar cobertura anual (pie_cobertura)
+# 4. Procesar y unificar datos finales (pie_extraccion)
+# 5. Filtrar datos de PIE para eliminar registros de 2005 (pie_final)
+# Solo se ejecutan los pasos cuyas entradas han cambiado.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ejecutar_flujo_etl import main
 
 if __name__ == "__main__":
-    # 1. Descargar archivos originales
-    run_script("./ETL/PIE/scrap_liquidaciones.py")
-    # 2. Seleccionar, convertir y renombrar archivos homogéneos
-    run_script("./ETL/PIE/select_liquidaciones_regimen_general.py")
-    # 3. (Opcional) Verificar cobertura anual
-    run_script("./ETL/PIE/count_liquidaciones_by_year.py")
-    # 4. Procesar y unificar datos finales
-    run_script("./ETL/PIE/procesar_liquidacion_pie_final.py")
-    # 5. Filtrar datos de PIE para eliminar registros de 2005
-    run_script("./ETL/PIE/procesar_pie.py")
+    sys.exit(main(["pie", *sys.argv[1:]]))
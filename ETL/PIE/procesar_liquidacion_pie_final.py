@@ -6,16 +6,32 @@ utilizando un enfoque más directo para manejar las estructuras complejas de los
 """
 
 import os
+import sys
 import json
 import pandas as pd
 import numpy as np
+import shutil
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from lector_excel import read_sheet
 
 # Ignorar advertencias específicas para facilitar la lectura de la salida
 warnings.filterwarnings('ignore', category=pd.errors.DtypeWarning)
 warnings.filterwarnings('ignore', category=UserWarning)
 
+# Procesos en paralelo para leer los libros de liquidación (None = uno por CPU)
+MAX_WORKERS = None
+# Dataset Parquet particionado por año (año=2003/, año=2004/, ...)
+DATASET_PARQUET = 'pie_final_parquet'
+# Manifiesto año -> libro original que escribe select_liquidaciones_regimen_general.py
+MANIFIESTO_SELECCION = 'seleccion_liquidaciones.json'
+# Caché Parquet por hoja de los libros leídos (ver lector_excel.py)
+DIRECTORIO_CACHE_HOJAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_excel')
+
 def cargar_configuracion(ruta_config):
     """
     Carga la configuración para el script de extracción.
@@ -29,8 +45,67 @@ def cargar_configuracion(ruta_config):
     with open(ruta_config, 'r') as f:
         config = json.load(f)
     
+    # Los directorios relativos del config ('./PIE/...') son relativos a la carpeta ETL
+    directorio_etl = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for clave in ('directorio_entrada', 'directorio_salida'):
+        if not os.path.isabs(config[clave]):
+            config[clave] = os.path.normpath(os.path.join(directorio_etl, config[clave]))
+    
     return config
 
+def resolver_ruta_archivo(archivo, año, directorio_entrada):
+    """
+    Ruta del libro a leer para un año.
+    
+    Si el manifiesto de selección registra el año, se usa el libro original
+    (.xls o .xlsx) que indica; si no, el archivo del mapeo en el directorio de entrada.
+    
+    Args:
+        archivo: Nombre del archivo según el mapeo
+        año: Año del archivo
+        directorio_entrada: Directorio de entrada
+    
+    Returns:
+        Ruta del libro
+    """
+    ruta_manifiesto = os.path.join(directorio_entrada, MANIFIESTO_SELECCION)
+    if os.path.exists(ruta_manifiesto):
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+            seleccion = json.load(f)
+        if str(año) in seleccion:
+            ruta_original = os.path.normpath(os.path.join(directorio_entrada, seleccion[str(año)]))
+            if os.path.exists(ruta_original):
+                return ruta_original
+    
+    return os.path.join(directorio_entrada, archivo)
+
+def inferir_columnas_numericas(df_data):
+    """
+    Convierte a número las columnas cuyos valores no nulos son todos numéricos,
+    aunque la hoja los guarde como texto (p. ej. códigos '01', '001').
+    
+    Es la misma inferencia que hacía pandas al releer las hojas convertidas a
+    .xlsx, de modo que los códigos salen igual en todos los años ('1', no '01').
+    
+    Args:
+        df_data: Filas de datos (sin la fila de encabezado)
+    
+    Returns:
+        DataFrame con las columnas numéricas convertidas
+    """
+    df_data = df_data.copy()
+    for i in range(df_data.shape[1]):
+        columna = df_data.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(columna):
+            continue
+        numerica = pd.to_numeric(columna, errors='coerce')
+        if numerica.notna().sum() == columna.notna().sum():
+            # Enteros sin '.0' aunque la columna tenga huecos
+            if (numerica.dropna() % 1 == 0).all():
+                numerica = numerica.astype('Int64')
+            df_data.isetitem(i, numerica)
+    return df_data
+
 def procesar_archivo_directo(archivo, config_archivo, directorio_entrada):
     """
     Procesa un archivo específico según su configuración con un enfoque más directo.
@@ -58,17 +133,17 @@ def procesar_archivo_directo(archivo, config_archivo, directorio_entrada):
             print(f"  No se encontró hoja adecuada para procesar.")
             return pd.DataFrame()
     
-    ruta_archivo = os.path.join(directorio_entrada, archivo)
+    ruta_archivo = resolver_ruta_archivo(archivo, año, directorio_entrada)
     
     try:
-        # Leer el archivo con la configuración específica
-        df = pd.read_excel(ruta_archivo, sheet_name=hoja_variables, header=None)
+        # Leer solo la hoja configurada (desde la caché Parquet si el libro no ha cambiado)
+        df = read_sheet(ruta_archivo, hoja_variables, cache_dir=DIRECTORIO_CACHE_HOJAS)
         
         # Identificar la fila de encabezado
         if fila_encabezado >= 0 and fila_encabezado < len(df):
             # Usar la fila específica como encabezado
             headers = df.iloc[fila_encabezado].values
-            df_data = df.iloc[fila_encabezado+1:].copy()
+            df_data = inferir_columnas_numericas(df.iloc[fila_encabezado+1:])
             df_data.columns = headers
             
             # Crear un nuevo DataFrame con las columnas identificadas
@@ -149,12 +224,17 @@ def procesar_archivo_directo(archivo, config_archivo, directorio_entrada):
         print(f"  Error al procesar el archivo: {e}")
         return pd.DataFrame()
 
-def procesar_archivos(config):
+def procesar_archivos(config, max_workers=MAX_WORKERS):
     """
     Procesa todos los archivos según la configuración.
     
+    Cada libro se lee en un proceso distinto (la lectura de Excel es el cuello de
+    botella y no libera el GIL). Los DataFrames por año se recogen en el orden del
+    mapeo y se concatenan una sola vez al final.
+    
     Args:
         config: Configuración para el script de extracción
+        max_workers: Número máximo de procesos (None = uno por CPU; 1 = secuencial)
     
     Returns:
         DataFrame con todos los datos extraídos
@@ -166,19 +246,55 @@ def procesar_archivos(config):
     # Crear directorio de salida si no existe
     os.makedirs(directorio_salida, exist_ok=True)
     
-    # Inicializar DataFrame para almacenar resultados
-    df_final = pd.DataFrame()
+    if not mapeo:
+        return pd.DataFrame()
     
-    # Procesar cada archivo
-    for config_archivo in mapeo:
-        archivo = config_archivo['archivo']
-        df_archivo = procesar_archivo_directo(archivo, config_archivo, directorio_entrada)
-        
-        # Si se obtuvieron datos, añadir al DataFrame final
-        if not df_archivo.empty:
-            df_final = pd.concat([df_final, df_archivo], ignore_index=True)
+    archivos = [config_archivo['archivo'] for config_archivo in mapeo]
+    workers = min(len(mapeo), max_workers or os.cpu_count() or 1)
+    
+    # Procesar cada archivo (en paralelo si hay más de un proceso disponible)
+    if workers == 1:
+        resultados = [procesar_archivo_directo(archivo, config_archivo, directorio_entrada)
+                      for archivo, config_archivo in zip(archivos, mapeo)]
+    else:
+        print(f"Procesando {len(mapeo)} archivos con {workers} procesos en paralelo...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(procesar_archivo_directo, archivos, mapeo,
+                                       [directorio_entrada] * len(mapeo)))
+    
+    # Unir solo los archivos de los que se obtuvieron datos, con un único concat
+    dfs = [df_archivo for df_archivo in resultados if not df_archivo.empty]
+    if not dfs:
+        return pd.DataFrame()
+    
+    return pd.concat(dfs, ignore_index=True)
+
+def guardar_parquet_por_año(df, directorio_salida):
+    """
+    Guarda los datos como dataset Parquet particionado por año.
+    
+    El dataset se reescribe completo en cada ejecución para no mezclar
+    particiones de ejecuciones anteriores.
     
-    return df_final
+    Args:
+        df: DataFrame con los datos extraídos
+        directorio_salida: Directorio donde guardar el dataset
+    
+    Returns:
+        Ruta del dataset
+    """
+    ruta_dataset = os.path.join(directorio_salida, DATASET_PARQUET)
+    if os.path.isdir(ruta_dataset):
+        shutil.rmtree(ruta_dataset)
+    
+    # Las columnas de texto se guardan como string para que el esquema sea el mismo en todas las particiones
+    df_parquet = df.copy()
+    for col in df_parquet.columns:
+        if col != 'año' and not pd.api.types.is_numeric_dtype(df_parquet[col]):
+            df_parquet[col] = df_parquet[col].astype('string')
+    
+    df_parquet.to_parquet(ruta_dataset, partition_cols=['año'], index=False)
+    return ruta_dataset
 
 def guardar_resultados(df, directorio_salida):
     """
@@ -197,6 +313,13 @@ def guardar_resultados(df, directorio_salida):
     df.to_csv(ruta_csv, index=False)
     print(f"Datos guardados en CSV: {ruta_csv}")
     
+    # Guardar dataset Parquet particionado por año
+    try:
+        ruta_dataset = guardar_parquet_por_año(df, directorio_salida)
+        print(f"Datos guardados en Parquet (particionado por año): {ruta_dataset}")
+    except Exception as e:
+        print(f"Error al guardar Parquet: {e}")
+    
     # Guardar Excel (por años para evitar problemas de memoria)
     try:
         ruta_excel = os.path.join(directorio_salida, 'pie_final.xlsx')
@@ -239,7 +362,7 @@ def main():
     Función principal que ejecuta la extracción de datos.
     """
     # Cargar configuración
-    ruta_config = '/home/agmalaga/Documentos/GitHub/JUST-TESTING/src/PIE/config_extraccion.json'
+    ruta_config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config_extraccion.json')
     config = cargar_configuracion(ruta_config)
     
     print(f"Configuración cargada desde: {ruta_config}")
@@ -1,5 +1,13 @@
 import os
+import json
+import hashlib
+import argparse
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
 
 # Lista de URLs extraídas automáticamente
 URLS = [
@@ -28,17 +36,262 @@ URLS = [
 ]
 
 DEST_DIR = "./ETL/PIE/data/raw/finanzas/liquidaciones"
-os.makedirs(DEST_DIR, exist_ok=True)
 
-for url in URLS:
-    filename = url.split("/")[-1]
-    dest_path = os.path.join(DEST_DIR, filename)
-    print(f"Descargando {filename} ...")
+# Descargas simultáneas, timeout por petición y tamaño de bloque al escribir en disco
+MAX_DESCARGAS_SIMULTANEAS = 6
+TIMEOUT = 60
+TAMANO_BLOQUE = 1 << 16
+# Intentos por archivo; cada reintento continúa desde el .part con HTTP Range
+REINTENTOS = 3
+# Manifiesto con tamaño, ETag y SHA-256 de cada archivo descargado (en DEST_DIR)
+MANIFIESTO = "manifiesto_descargas.json"
+SUFIJO_PARCIAL = ".part"
+# Junto a cada .part se guarda (en un archivo oculto) el ETag o Last-Modified de la versión
+# con la que se empezó, para reanudar con If-Range solo si el remoto sigue siendo esa versión
+SUFIJO_VALIDADOR = ".part.validador"
+
+
+def sha256_archivo(ruta):
+    """SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def cargar_manifiesto(dest_dir):
+    """Manifiesto de descargas anteriores ({nombre_archivo: entrada}); vacío si no existe."""
+    ruta = os.path.join(dest_dir, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_manifiesto(dest_dir, manifiesto):
+    """Escribe el manifiesto mediante un temporal + rename (nunca queda a medias)."""
+    fd, tmp = tempfile.mkstemp(dir=dest_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dest_dir, MANIFIESTO))
+
+
+def crear_sesion(pool_size=MAX_DESCARGAS_SIMULTANEAS):
+    """`requests.Session` con un pool de conexiones del tamaño de las descargas simultáneas."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def consultar_remoto(session, url):
+    """
+    Metadatos del archivo remoto con una petición HEAD.
+
+    Returns:
+        dict con 'bytes' (Content-Length), 'etag' y 'last_modified' (None si el
+        servidor no los envía o la petición HEAD falla).
+    """
     try:
-        resp = requests.get(url, timeout=60)
+        resp = session.head(url, timeout=TIMEOUT, allow_redirects=True)
         resp.raise_for_status()
-        with open(dest_path, "wb") as f:
-            f.write(resp.content)
-        print(f"Guardado en {dest_path}")
-    except Exception as e:
-        print(f"Error descargando {url}: {e}")
+    except requests.RequestException:
+        return {"bytes": None, "etag": None, "last_modified": None}
+    longitud = resp.headers.get("Content-Length")
+    return {
+        "bytes": int(longitud) if longitud and longitud.isdigit() else None,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def esta_actualizado(ruta, entrada, remoto):
+    """
+    True si el archivo local coincide con la entrada del manifiesto y el remoto no ha cambiado.
+
+    El remoto se considera sin cambios si coincide el ETag (o, sin ETag, el
+    Last-Modified) y el tamaño. Sin ningún metadato remoto no se puede saber y
+    se vuelve a descargar.
+    """
+    if not entrada or not os.path.exists(ruta):
+        return False
+    if os.path.getsize(ruta) != entrada.get("bytes"):
+        return False
+    if remoto["etag"]:
+        mismo_remoto = remoto["etag"] == entrada.get("etag")
+    elif remoto["last_modified"]:
+        mismo_remoto = remoto["last_modified"] == entrada.get("last_modified")
+    else:
+        return False
+    if remoto["bytes"] is not None and remoto["bytes"] != entrada.get("bytes"):
+        return False
+    return mismo_remoto and sha256_archivo(ruta) == entrada.get("sha256")
+
+
+def ruta_validador(ruta):
+    """Archivo oculto con el validador del `.part` de `ruta` (los lectores de DEST_DIR ignoran los ocultos)."""
+    directorio, nombre = os.path.split(ruta)
+    return os.path.join(directorio, f".{nombre}{SUFIJO_VALIDADOR}")
+
+
+def leer_validador(ruta):
+    """Validador con el que se empezó el `.part` de `ruta`, o None si no se conoce."""
+    try:
+        with open(ruta_validador(ruta), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def descargar_archivo(session, url, ruta, remoto):
+    """
+    Descarga `url` en `ruta` escribiendo por bloques en `ruta.part`.
+
+    Si ya existe un `.part` de un intento anterior se pide solo lo que falta
+    (`Range`), condicionado a que el archivo remoto no haya cambiado desde que
+    se empezó el `.part` (`If-Range` con el ETag o Last-Modified guardado junto a
+    él). Si el servidor responde con el archivo completo (200) el `.part` se
+    reescribe desde el principio. Un `.part` sin validador guardado no se reanuda.
+
+    Returns:
+        Tupla (bytes descargados en esta llamada, cabeceras de la respuesta)
+    """
+    ruta_parcial = ruta + SUFIJO_PARCIAL
+    ya_descargado = os.path.getsize(ruta_parcial) if os.path.exists(ruta_parcial) else 0
+    validador = leer_validador(ruta) if ya_descargado else None
+
+    headers = {}
+    if validador:
+        headers["Range"] = f"bytes={ya_descargado}-"
+        headers["If-Range"] = validador
+
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as resp:
+        if resp.status_code == 416:
+            # El .part no encaja con el archivo remoto: empezar de cero en el siguiente intento
+            os.remove(ruta_parcial)
+            if os.path.exists(ruta_validador(ruta)):
+                os.remove(ruta_validador(ruta))
+            raise requests.HTTPError(f"Rango no válido para {url}; se descarta el archivo parcial")
+        resp.raise_for_status()
+        modo = "ab" if resp.status_code == 206 else "wb"
+        if modo == "wb":
+            # El .part se empieza de nuevo con la versión que envía el servidor
+            nuevo_validador = resp.headers.get("ETag") or resp.headers.get("Last-Modified")
+            if nuevo_validador:
+                with open(ruta_validador(ruta), "w", encoding="utf-8") as f:
+                    f.write(nuevo_validador)
+            elif os.path.exists(ruta_validador(ruta)):
+                os.remove(ruta_validador(ruta))
+        descargados = 0
+        with open(ruta_parcial, modo) as f:
+            for bloque in resp.iter_content(chunk_size=TAMANO_BLOQUE):
+                f.write(bloque)
+                descargados += len(bloque)
+        cabeceras = resp.headers
+
+    esperado = remoto["bytes"]
+    if esperado is not None and os.path.getsize(ruta_parcial) != esperado:
+        raise requests.HTTPError(
+            f"Descarga incompleta de {url}: {os.path.getsize(ruta_parcial)} de {esperado} bytes"
+        )
+    os.replace(ruta_parcial, ruta)
+    if os.path.exists(ruta_validador(ruta)):
+        os.remove(ruta_validador(ruta))
+    return descargados, cabeceras
+
+
+def procesar_url(session, url, dest_dir, entrada_previa, forzar=False):
+    """
+    Descarga una URL si hace falta (con reintentos que reanudan la descarga).
+
+    Returns:
+        Tupla (estado, entrada del manifiesto), con estado 'sin cambios' o 'descargado'
+    """
+    nombre = url.split("/")[-1]
+    ruta = os.path.join(dest_dir, nombre)
+    remoto = consultar_remoto(session, url)
+
+    if not forzar and esta_actualizado(ruta, entrada_previa, remoto):
+        return "sin cambios", entrada_previa
+
+    ultimo_error = None
+    for _ in range(REINTENTOS):
+        try:
+            _, cabeceras = descargar_archivo(session, url, ruta, remoto)
+            break
+        except (requests.RequestException, OSError) as e:
+            ultimo_error = e
+    else:
+        raise RuntimeError(f"Error descargando {url} tras {REINTENTOS} intentos: {ultimo_error}")
+
+    entrada = {
+        "url": url,
+        "bytes": os.path.getsize(ruta),
+        "sha256": sha256_archivo(ruta),
+        "etag": remoto["etag"] or cabeceras.get("ETag"),
+        "last_modified": remoto["last_modified"] or cabeceras.get("Last-Modified"),
+        "descargado": datetime.now().isoformat(timespec="seconds"),
+    }
+    return "descargado", entrada
+
+
+def descargar_liquidaciones(urls=URLS, dest_dir=DEST_DIR, max_workers=MAX_DESCARGAS_SIMULTANEAS,
+                            forzar=False):
+    """
+    Descarga en paralelo las URLs (como máximo `max_workers` a la vez) y actualiza el manifiesto.
+
+    El manifiesto se guarda tras cada archivo terminado, de modo que una
+    ejecución interrumpida conserva lo ya descargado.
+
+    Returns:
+        dict {nombre_archivo: estado} con 'descargado', 'sin cambios' o el error
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    manifiesto = cargar_manifiesto(dest_dir)
+    resultados = {}
+
+    session = crear_sesion(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {}
+        for url in urls:
+            nombre = url.split("/")[-1]
+            futuro = pool.submit(procesar_url, session, url, dest_dir, manifiesto.get(nombre), forzar)
+            futuros[futuro] = nombre
+
+        for futuro in as_completed(futuros):
+            nombre = futuros[futuro]
+            try:
+                estado, entrada = futuro.result()
+            except Exception as e:
+                resultados[nombre] = f"error: {e}"
+                print(f"Error en {nombre}: {e}")
+                continue
+            resultados[nombre] = estado
+            # Los resultados se recogen en este hilo: el manifiesto no necesita lock
+            manifiesto[nombre] = entrada
+            guardar_manifiesto(dest_dir, manifiesto)
+            print(f"{nombre}: {estado} ({entrada['bytes']} bytes)")
+
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Descarga los archivos de liquidación de la PIE.")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Descargar de nuevo aunque el archivo no haya cambiado")
+    parser.add_argument("--max-workers", type=int, default=MAX_DESCARGAS_SIMULTANEAS,
+                        help="Descargas simultáneas")
+    args = parser.parse_args()
+
+    resultados = descargar_liquidaciones(max_workers=args.max_workers, forzar=args.forzar)
+
+    estados = list(resultados.values())
+    print(f"\nDescargados: {estados.count('descargado')}, sin cambios: {estados.count('sin cambios')}, "
+          f"errores: {sum(e.startswith('error') for e in estados)}")
+    print(f"Manifiesto: {os.path.join(DEST_DIR, MANIFIESTO)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 import os
 import re
-import shutil
+import json
 from urllib.parse import unquote
-import pandas as pd
 
 SRC_DIR = "./ETL/PIE/data/raw/finanzas/liquidaciones"
 DST_DIR = "./ETL/PIE/data/raw/finanzas/liquidaciones/por_municipios_regimen_general/"
+# Manifiesto año -> libro original (ruta relativa a DST_DIR). Los libros no se
+# convierten ni se copian: procesar_liquidacion_pie_final.py lee directamente
+# las hojas configuradas de los originales (.xls o .xlsx).
+MANIFIESTO = "seleccion_liquidaciones.json"
 os.makedirs(DST_DIR, exist_ok=True)
 
 files = os.listdir(SRC_DIR)
 files = [f for f in files if not f.startswith(".~lock") and not f.startswith(".")]
+# Ignorar descargas a medias de scrap_liquidaciones.py
+files = [f for f in files if not f.endswith(".part")]
 
 selected = {}
 for fname in files:
@@ -29,23 +34,14 @@ if "2014" in selected and "LiquidacionVariable2014.xls" in files:
 if "2017" in selected and "LiquidacionVariables2017.xls" in files:
     selected["2017"] = "LiquidacionVariables2017.xls"
 
+seleccion = {}
 for year, fname in sorted(selected.items()):
     src_path = os.path.join(SRC_DIR, fname)
-    ext = os.path.splitext(fname)[1].lower()
-    dst_name = f"liquidacion_{year}.xlsx"
-    dst_path = os.path.join(DST_DIR, dst_name)
-    if ext == ".xls":
-        try:
-            xls = pd.ExcelFile(src_path, engine="xlrd")
-            with pd.ExcelWriter(dst_path, engine="openpyxl") as writer:
-                for sheet in xls.sheet_names:
-                    df = pd.read_excel(xls, sheet_name=sheet)
-                    df.to_excel(writer, sheet_name=sheet, index=False)
-            print(f"{year}: {fname} convertido y guardado como {dst_path}")
-        except Exception as e:
-            print(f"Error convirtiendo {fname}: {e}")
-    else:
-        shutil.copy2(src_path, dst_path)
-        print(f"{year}: {fname} copiado como {dst_path}")
+    seleccion[year] = os.path.relpath(src_path, DST_DIR)
+    print(f"{year}: {fname} seleccionado como liquidacion_{year}")
 
-print("\nArchivos seleccionados, convertidos a .xlsx y renombrados a 'liquidacion_AÑO.xlsx' en 'por_municipios_regimen_general'.")
+ruta_manifiesto = os.path.join(DST_DIR, MANIFIESTO)
+with open(ruta_manifiesto, "w", encoding="utf-8") as f:
+    json.dump(seleccion, f, ensure_ascii=False, indent=2)
+
+print(f"\nArchivos seleccionados ({len(seleccion)}) registrados en '{ruta_manifiesto}' sin convertirlos.")
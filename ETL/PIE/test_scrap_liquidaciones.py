@@ -0,0 +1,156 @@
+"""
+Pruebas de scrap_liquidaciones.py contra un servidor HTTP local que imita al de Hacienda
+(HEAD, ETag, Range / If-Range) y puede cortar una descarga a mitad.
+
+Ejecutar desde la raíz del repositorio:
+    $ python -m pytest ETL/PIE/test_scrap_liquidaciones.py
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import scrap_liquidaciones as scrap
+
+NOMBRE = "LiquidacionVariable2022.xlsx"
+CONTENIDO_V1 = bytes(range(256)) * 64  # 16 KiB
+CONTENIDO_V2 = bytes(reversed(range(256))) * 64
+
+
+class ServidorLiquidaciones:
+    """
+    Sirve un único archivo con su ETag. Registra cada petición como
+    (método, Range, If-Range, estado) y, si `cortar_tras` tiene valor, la siguiente
+    descarga completa se corta tras ese número de bytes.
+    """
+
+    def __init__(self, contenido, etag):
+        self.contenido = contenido
+        self.etag = etag
+        self.cortar_tras = None
+        self.peticiones = []
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self._responder(con_cuerpo=False)
+
+            def do_GET(self):
+                self._responder(con_cuerpo=True)
+
+            def _responder(self, con_cuerpo):
+                rango = self.headers.get("Range")
+                if_range = self.headers.get("If-Range")
+                datos = servidor.contenido
+                inicio = 0
+                # Range solo se atiende si el archivo sigue siendo la versión de If-Range
+                if con_cuerpo and rango and (if_range is None or if_range == servidor.etag):
+                    inicio = int(rango.removeprefix("bytes=").rstrip("-"))
+                estado = 206 if inicio else 200
+                servidor.peticiones.append((self.command, rango, if_range, estado))
+
+                self.send_response(estado)
+                self.send_header("ETag", servidor.etag)
+                self.send_header("Content-Length", str(len(datos) - inicio))
+                if estado == 206:
+                    self.send_header("Content-Range", f"bytes {inicio}-{len(datos) - 1}/{len(datos)}")
+                self.end_headers()
+                if not con_cuerpo:
+                    return
+                cuerpo = datos[inicio:]
+                if servidor.cortar_tras is not None and estado == 200:
+                    # Conexión cerrada a mitad: el cliente recibe menos bytes de los anunciados
+                    cuerpo = cuerpo[:servidor.cortar_tras]
+                    servidor.cortar_tras = None
+                self.wfile.write(cuerpo)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self.url = f"http://127.0.0.1:{self.http.server_port}/{NOMBRE}"
+
+    def gets(self):
+        return [p for p in self.peticiones if p[0] == "GET"]
+
+
+@pytest.fixture(autouse=True)
+def bloques_pequenos(monkeypatch):
+    # Lo recibido antes de un corte llega al .part por bloques completos
+    monkeypatch.setattr(scrap, "TAMANO_BLOQUE", 1000)
+
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorLiquidaciones(CONTENIDO_V1, '"v1"')
+    hilo = threading.Thread(target=servidor.http.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.http.shutdown()
+    servidor.http.server_close()
+
+
+def descargar(servidor, dest_dir, **kwargs):
+    return scrap.descargar_liquidaciones([servidor.url], str(dest_dir), max_workers=1, **kwargs)
+
+
+def test_reanuda_con_range_e_if_range_tras_un_corte(servidor, tmp_path):
+    servidor.cortar_tras = 5000
+
+    assert descargar(servidor, tmp_path) == {NOMBRE: "descargado"}
+
+    assert servidor.gets() == [
+        ("GET", None, None, 200),
+        ("GET", "bytes=5000-", '"v1"', 206),
+    ]
+    assert (tmp_path / NOMBRE).read_bytes() == CONTENIDO_V1
+    entrada = scrap.cargar_manifiesto(str(tmp_path))[NOMBRE]
+    assert entrada["sha256"] == scrap.sha256_archivo(str(tmp_path / NOMBRE))
+    assert entrada["etag"] == '"v1"'
+    assert sorted(p.name for p in tmp_path.iterdir()) == [NOMBRE, scrap.MANIFIESTO]
+
+
+def test_descarga_completa_si_el_etag_cambio_desde_el_corte(servidor, tmp_path, monkeypatch):
+    # Primera ejecución: se corta y no quedan reintentos; queda el .part de la versión v1
+    monkeypatch.setattr(scrap, "REINTENTOS", 1)
+    servidor.cortar_tras = 5000
+    assert descargar(servidor, tmp_path)[NOMBRE].startswith("error")
+    assert (tmp_path / (NOMBRE + scrap.SUFIJO_PARCIAL)).stat().st_size == 5000
+
+    # El archivo cambia en el servidor antes de la siguiente ejecución
+    servidor.contenido, servidor.etag = CONTENIDO_V2, '"v2"'
+    servidor.peticiones.clear()
+    assert descargar(servidor, tmp_path) == {NOMBRE: "descargado"}
+
+    # If-Range lleva el ETag de la versión del .part, así que el servidor responde 200 con v2
+    assert servidor.gets() == [("GET", "bytes=5000-", '"v1"', 200)]
+    assert (tmp_path / NOMBRE).read_bytes() == CONTENIDO_V2
+    assert scrap.cargar_manifiesto(str(tmp_path))[NOMBRE]["etag"] == '"v2"'
+
+
+def test_no_reanuda_un_part_sin_validador(servidor, tmp_path):
+    (tmp_path / (NOMBRE + scrap.SUFIJO_PARCIAL)).write_bytes(CONTENIDO_V2[:5000])
+
+    assert descargar(servidor, tmp_path) == {NOMBRE: "descargado"}
+
+    assert servidor.gets() == [("GET", None, None, 200)]
+    assert (tmp_path / NOMBRE).read_bytes() == CONTENIDO_V1
+
+
+def test_manifiesto_al_dia_evita_la_descarga(servidor, tmp_path):
+    assert descargar(servidor, tmp_path) == {NOMBRE: "descargado"}
+    servidor.peticiones.clear()
+
+    assert descargar(servidor, tmp_path) == {NOMBRE: "sin cambios"}
+
+    assert servidor.peticiones == [("HEAD", None, None, 200)]
+
+
+def test_vuelve_a_descargar_si_el_remoto_cambia(servidor, tmp_path):
+    assert descargar(servidor, tmp_path) == {NOMBRE: "descargado"}
+    servidor.contenido, servidor.etag = CONTENIDO_V2, '"v2"'
+
+    assert descargar(servidor, tmp_path) == {NOMBRE: "descargado"}
+
+    assert (tmp_path / NOMBRE).read_bytes() == CONTENIDO_V2
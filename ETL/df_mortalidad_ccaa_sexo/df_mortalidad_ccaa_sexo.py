@@ -24,21 +24,24 @@ Run from anywhere:
     $ python path/to/df_mortalidad_ccaa_sexo.py
 """
 
-import requests
 import pandas as pd
 import numpy as np
 import os
+import sys
 from pathlib import Path
 import io
 import warnings
 
+# Shared INE HTTP client lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from ine_client import INEClientError, get_shared_client
+
 # Suppress potential warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
 
 # --- Configuration ---
 INE_TABLE_CODE = "27154"
-INE_DATA_URL = f"https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{INE_TABLE_CODE}?nult=999"
 FINAL_OUTPUT_SUBFOLDER = "mortalidad_policyspace_es"
 
 # --- Helper Functions ---
@@ -58,13 +61,11 @@ def create_output_folder(base_dir: Path, folder_name: str) -> Path | None:
         print(f"❌ Error creating output folder '{output_path}': {e}")
         return None
 
-def download_ine_mortality_data(url: str, save_path: Path) -> pd.DataFrame | None:
-    """Downloads INE mortality data, saves it, and reads it into a DataFrame."""
-    print(f"Attempting to download INE mortality data from: {url}...")
+def download_ine_mortality_data(table_code: str, save_path: Path) -> pd.DataFrame | None:
+    """Downloads INE mortality data (through the shared INE client), saves it, and reads it into a DataFrame."""
+    print(f"Attempting to download INE mortality data (table {table_code})...")
     try:
-        response = requests.get(url, timeout=120)
-        response.raise_for_status()
-        csv_data = response.content.decode('utf-8')
+        csv_data = get_shared_client().get_table_csv(table_code)
 
         with open(save_path, "w", encoding="utf-8") as f:
             f.write(csv_data)
@@ -73,7 +74,7 @@ def download_ine_mortality_data(url: str, save_path: Path) -> pd.DataFrame | Non
         df = pd.read_csv(save_path, sep='\t', encoding='utf-8')
         print(f"Data successfully read into DataFrame from '{save_path.name}'.")
         return df
-    except requests.exceptions.RequestException as e:
+    except INEClientError as e:
         print(f"❌ Error downloading INE mortality data: {e}")
         return None
     except Exception as e:
@@ -258,7 +259,7 @@ def main():
     # ---
 
     # 1. Download INE Mortality Data
-    df_raw = download_ine_mortality_data(INE_DATA_URL, path_raw_ine_data)
+    df_raw = download_ine_mortality_data(INE_TABLE_CODE, path_raw_ine_data)
     if df_raw is None:
         print("❌ Exiting: Failed to download or read INE mortality data.")
         return
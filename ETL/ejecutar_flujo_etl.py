@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ejecutar_flujo_etl.py
+
+Flujo completo del ETL como un único grafo de tareas (ver flujo_dag.py).
+
+Objetivos (grupos): 'pie', 'georef', 'poblacion', 'idhm' y 'warehouse', o el
+nombre de cualquier tarea. Se ejecutan también sus dependencias, solo lo que
+no esté al día, y las ramas independientes en paralelo.
+
+Uso:
+    python ETL/ejecutar_flujo_etl.py                    # todo el grafo
+    python ETL/ejecutar_flujo_etl.py pie georef         # solo esos subflujos
+    python ETL/ejecutar_flujo_etl.py warehouse --forzar pie_descarga
+    python ETL/ejecutar_flujo_etl.py --listar
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from flujo_dag import AL_DIA, EJECUTADA, GrafoTareas, Tarea
+
+ETL_DIR = Path(__file__).resolve().parent
+REPO_DIR = ETL_DIR.parent
+
+RUTA_ESTADO = ETL_DIR / ".flujo_estado.json"
+DIRECTORIO_LOGS = ETL_DIR / ".flujo_logs"
+MAX_WORKERS = 4
+
+PIE_DIR = ETL_DIR / "PIE"
+LIQUIDACIONES_DIR = PIE_DIR / "data/raw/finanzas/liquidaciones"
+GEOREF_DIR = ETL_DIR / "GeoRef_Spain"
+POBLACION_DIR = ETL_DIR / "estimativas_pop"
+IDHM_DIR = ETL_DIR / "idhm_indice_desarrollo_humano_municipal"
+WAREHOUSE_DIR = REPO_DIR / "database 2"
+
+
+def construir_grafo():
+    """Grafo con las tareas de todos los subflujos del ETL."""
+    grafo = GrafoTareas(RUTA_ESTADO, DIRECTORIO_LOGS)
+
+    # --- PIE: liquidaciones de la participación en los ingresos del Estado ---
+    # Los scripts de PIE usan rutas relativas a la raíz del repositorio
+    manifiesto_descargas = LIQUIDACIONES_DIR / "manifiesto_descargas.json"
+    seleccion = LIQUIDACIONES_DIR / "por_municipios_regimen_general/seleccion_liquidaciones.json"
+    pie_final = LIQUIDACIONES_DIR / "preprocess/pie_final.csv"
+    pie_final_final = LIQUIDACIONES_DIR / "preprocess/pie_final_final.csv"
+
+    grafo.añadir(Tarea("pie_descarga", PIE_DIR / "scrap_liquidaciones.py",
+                       salidas=[manifiesto_descargas], cwd=REPO_DIR, grupo="pie"))
+    grafo.añadir(Tarea("pie_seleccion", PIE_DIR / "select_liquidaciones_regimen_general.py",
+                       entradas=[manifiesto_descargas], salidas=[seleccion], cwd=REPO_DIR, grupo="pie"))
+    grafo.añadir(Tarea("pie_cobertura", PIE_DIR / "count_liquidaciones_by_year.py",
+                       entradas=[seleccion], cwd=REPO_DIR, grupo="pie"))
+    # El manifiesto guarda el SHA-256 de cada libro: un libro vuelto a descargar cambia el
+    # manifiesto aunque la selección (año → ruta del libro) siga igual
+    grafo.añadir(Tarea("pie_extraccion", PIE_DIR / "procesar_liquidacion_pie_final.py",
+                       entradas=[seleccion, manifiesto_descargas, PIE_DIR / "config_extraccion.json", ETL_DIR / "lector_excel.py"],
+                       salidas=[pie_final], cwd=REPO_DIR, grupo="pie"))
+    grafo.añadir(Tarea("pie_final", PIE_DIR / "procesar_pie.py",
+                       entradas=[pie_final], salidas=[pie_final_final], cwd=REPO_DIR, grupo="pie"))
+
+    # --- GeoRef: geometrías y coordenadas de municipios y comunidades ---
+    geojson_municipios = GEOREF_DIR / "georef-spain-municipio.geojson"
+    geojson_comunidades = GEOREF_DIR / "georef-spain-comunidad-autonoma.geojson"
+    coordenadas_municipios = GEOREF_DIR / "municipios_coordenadas.csv"
+
+    grafo.añadir(Tarea("georef_descarga", GEOREF_DIR / "download_georef_spain.py",
+                       salidas=[geojson_municipios, geojson_comunidades], grupo="georef"))
+    grafo.añadir(Tarea("georef_coordenadas_municipios", GEOREF_DIR / "mapear_coordenadas.py",
+                       entradas=[geojson_municipios], salidas=[coordenadas_municipios], grupo="georef"))
+    grafo.añadir(Tarea("georef_coordenadas_comunidades", GEOREF_DIR / "mapear_coordenadas_comunidades.py",
+                       entradas=[geojson_comunidades], salidas=[GEOREF_DIR / "comunidades_coordenadas.csv"],
+                       grupo="georef"))
+    grafo.añadir(Tarea("georef_mapa_municipios", GEOREF_DIR / "visualizar_mapa_municipios.py",
+                       entradas=[coordenadas_municipios], salidas=[GEOREF_DIR / "mapa_municipios.html"],
+                       grupo="georef"))
+    grafo.añadir(Tarea("georef_mapa_poligonos_comunidades", GEOREF_DIR / "visualizar_mapa_poligonos_comunidades.py",
+                       entradas=[geojson_comunidades], salidas=[GEOREF_DIR / "mapa_poligonos_comunidades.html"],
+                       grupo="georef"))
+    grafo.añadir(Tarea("georef_mapa_poligonos_municipios", GEOREF_DIR / "visualizar_mapa_poligonos_municipios.py",
+                       entradas=[geojson_municipios], salidas=[GEOREF_DIR / "mapa_poligonos_municipios.html"],
+                       grupo="georef"))
+    topojson_municipios = GEOREF_DIR / "TopoJSON/georef-spain-municipio.topojson"
+    # Niveles simplificados de la pirámide de detalle (el de máximo detalle es topojson_municipios)
+    niveles_detalle = ["espana", "ccaa"]
+    topojson_niveles = [GEOREF_DIR / f"TopoJSON/georef-spain-municipio_{nivel}.topojson" for nivel in niveles_detalle]
+    mun_area = GEOREF_DIR / "capa_municipios/mun_area.csv"
+    grafo.añadir(Tarea("georef_topojson_municipios", GEOREF_DIR / "TopoJSON/convert_to_topojson.py",
+                       entradas=[geojson_municipios], salidas=[topojson_municipios, *topojson_niveles],
+                       grupo="georef"))
+    # Capa normalizada (GeoParquet + GeoJSON por nivel) que lee el mapa de densidad del dashboard
+    grafo.añadir(Tarea("georef_capa_municipios", GEOREF_DIR / "construir_capa_municipios.py",
+                       entradas=[topojson_municipios, *topojson_niveles],
+                       salidas=[GEOREF_DIR / "capa_municipios/municipios.parquet",
+                                GEOREF_DIR / "capa_municipios/municipios.geojson",
+                                *[GEOREF_DIR / f"capa_municipios/municipios_{nivel}.geojson" for nivel in niveles_detalle],
+                                mun_area],
+                       grupo="georef"))
+    # Teselas vectoriales (MBTiles) de municipios y CCAA que sirve dashboard/servidor_teselas.py
+    grafo.añadir(Tarea("georef_teselas_vectoriales", GEOREF_DIR / "construir_teselas_vectoriales.py",
+                       entradas=[geojson_municipios, geojson_comunidades],
+                       salidas=[GEOREF_DIR / "teselas/georef-spain.mbtiles"], grupo="georef"))
+
+    # --- Población: estimaciones municipales del INE ---
+    cifras_poblacion = POBLACION_DIR / "preprocesados/cifras_poblacion_municipio.csv"
+    grafo.añadir(Tarea("poblacion_estimaciones", POBLACION_DIR / "estimativas_pop_v2.py",
+                       salidas=[cifras_poblacion], grupo="poblacion"))
+
+    # --- IDHM: índice de desarrollo humano municipal ---
+    idhm_final = IDHM_DIR / "IRPFmunicipios_final_IDHM.csv"
+    grafo.añadir(Tarea("idhm", IDHM_DIR / "idhm_indice_desarrollo_humano_municipal.py",
+                       entradas=[IDHM_DIR / "diccionario25.xlsx", ETL_DIR / "tabla_vida.py",
+                                 ETL_DIR / "imputacion.py"],
+                       salidas=[idhm_final, IDHM_DIR / "idhm_2013_2022.csv"], grupo="idhm"))
+
+    # --- Warehouse: carga de todas las tablas en la base de datos SQLite (esquema de esquema_dw.py) ---
+    grafo.añadir(Tarea("warehouse_carga", WAREHOUSE_DIR / "etl_load_data.py",
+                       entradas=[
+                           WAREHOUSE_DIR / "esquema_dw.py",
+                           ETL_DIR / "tabla_equivalencias/data/df_equivalencias_municipio_CORRECTO.csv",
+                           ETL_DIR / "indicadores_fecundidad_municipio_provincias/codigos_ccaa_provincias.csv",
+                           ETL_DIR / "cifras_poblacion_municipio/cifras_poblacion_municipio.csv",
+                           ETL_DIR / "df_mortalidad_ccaa_sexo/df_mortalidad_final.csv",
+                           ETL_DIR / "distribucion_urbana/data_final/distribucion_urbana_municipios_2003_to_2022.csv",
+                           ETL_DIR / "empresas_municipio_actividad_principal/preprocesados/empresas_municipio_actividad_principal.csv",
+                           cifras_poblacion,
+                           idhm_final,
+                           ETL_DIR / "indicadores_fecundidad_municipio_provincias/df_total_interpolado_full_tasa_estandarizada.csv",
+                           ETL_DIR / "interest_data_ETL/imputados/interest_fixed_imputado.csv",
+                           ETL_DIR / "interest_data_ETL/imputados/interest_nominal_imputado.csv",
+                           ETL_DIR / "interest_data_ETL/imputados/interest_real_imputado.csv",
+                           ETL_DIR / "nivel_educativo_comunidades/data_final/nivel_educativo_comunidades_completo.csv",
+                           pie_final_final,
+                           mun_area,
+                       ],
+                       salidas=[WAREHOUSE_DIR / "datawarehouse_v2.db"], grupo="warehouse"))
+
+    return grafo
+
+
+def listar(grafo, objetivos=None):
+    """Muestra las tareas seleccionadas en orden de ejecución, con sus dependencias."""
+    deps = grafo.dependencias()
+    for nombre in grafo.seleccionar(objetivos):
+        tarea = grafo.tareas[nombre]
+        previas = ", ".join(sorted(deps[nombre])) or "-"
+        print(f"  [{tarea.grupo}] {nombre}  ({tarea.script.relative_to(REPO_DIR)})  <- {previas}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ejecuta el flujo del ETL como grafo de tareas.")
+    parser.add_argument("objetivos", nargs="*",
+                        help="Grupos (pie, georef, poblacion, idhm, warehouse) o tareas; por defecto, todo")
+    parser.add_argument("--forzar", nargs="*", metavar="TAREA",
+                        help="Ejecutar estas tareas/grupos aunque estén al día (sin nombres: todas)")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="Scripts simultáneos")
+    parser.add_argument("--listar", action="store_true", help="Mostrar el plan sin ejecutar nada")
+    args = parser.parse_args(argv)
+
+    grafo = construir_grafo()
+    if args.listar:
+        listar(grafo, args.objetivos)
+        return 0
+
+    forzar = True if args.forzar == [] else (args.forzar or ())
+    resultados = grafo.ejecutar(args.objetivos, max_workers=args.max_workers, forzar=forzar)
+    fallidas = [n for n, r in resultados.items() if r["estado"] not in (EJECUTADA, AL_DIA)]
+    if fallidas:
+        print(f"\n❌ El flujo terminó con errores en: {', '.join(fallidas)}")
+        return 1
+    print("\n✅ Flujo completado.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
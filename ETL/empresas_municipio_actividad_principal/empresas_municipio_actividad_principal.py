@@ -29,8 +29,13 @@ import numpy as np
 import os
 import io
 from pathlib import Path
+import sys
 import warnings
 
+# Shared ETL modules (ETL/imputacion.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from imputacion import fill_by_group
+
 # Suppress potential warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -294,9 +299,8 @@ def final_impute_by_mean(df_stage2_filtered: pd.DataFrame) -> pd.DataFrame | Non
     # Ensure 'Total' is numeric before mean calculation
     df_final_imputed['Total'] = pd.to_numeric(df_final_imputed['Total'], errors='coerce')
 
-    # Calculate mean per group, then use transform to broadcast and fillna
-    df_final_imputed['Total'] = df_final_imputed.groupby('municipio_code')['Total']\
-                                     .transform(lambda x: x.fillna(x.mean()))
+    # Fill with the mean of each municipality (grouped, without a Python call per group)
+    df_final_imputed, _ = fill_by_group(df_final_imputed, 'municipio_code', 'Total', passes=("mean",))
 
     # If a municipality had ALL NaNs for 'Total', its mean would be NaN.
     # In this case, after transform, 'Total' would still be NaN. Fill these with 0.
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_correct_outliers.py
+
+Parity check and benchmark of the vectorized `correct_outliers` in
+`estimativas_pop_v2.py` against the previous row-by-row implementation.
+
+The input is the numeric pivot (`preprocesados/df_pivot_numeric.csv`); if it
+does not exist it is rebuilt from the raw tables in `tablas_intermedias/`.
+Exits with status 1 if both implementations disagree.
+
+Run from anywhere:
+    $ python path/to/benchmark_correct_outliers.py [--repeat N]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import estimativas_pop_v2 as pop
+
+
+def correct_outliers_rowwise(df_numeric: pd.DataFrame, n_max_neighbors=5) -> pd.DataFrame:
+    """Previous row-by-row implementation of `correct_outliers` (reference for the parity check)."""
+    if df_numeric.empty:
+        return pd.DataFrame()
+
+
+    def detectar_outliers_fila(row_values):
+        # Exclude non-numeric if any slipped through, though convert_pivot_to_numeric should handle this
+        numeric_values = pd.to_numeric(row_values, errors='coerce').dropna()
+        if len(numeric_values) < 4: return pd.Series(False, index=row_values.index) # Need enough points for IQR
+        Q1 = numeric_values.quantile(0.25)
+        Q3 = numeric_values.quantile(0.75)
+        IQR = Q3 - Q1
+        if IQR == 0: return pd.Series(False, index=row_values.index) # Avoid issues if all values are same
+        lim_inf = Q1 - 1.5 * IQR
+        lim_sup = Q3 + 1.5 * IQR
+        # Ensure comparison is done with original numeric values
+        return (row_values < lim_inf) | (row_values > lim_sup)
+
+    def corregir_outliers_fila(row):
+        codigo = row['mun_code']
+        valores = row.drop('mun_code').copy()
+        index = valores.index
+        # Ensure the mask is calculated on the potentially non-numeric series before correction
+        outlier_mask = detectar_outliers_fila(valores)
+        outliers_idx = valores[outlier_mask].index
+
+        if not outliers_idx.empty:
+            # Create a working copy for modifications
+            valores_corregidos = valores.copy()
+            for idx_to_correct in outliers_idx:
+                pos = index.get_loc(idx_to_correct)
+                # Find nearest valid neighbors (not outliers themselves)
+                vecinos_validos = pd.Series(dtype=float) # Initialize empty series for neighbors
+                for n in range(1, n_max_neighbors + 1):
+                     # Get potential neighbors (indices)
+                     idx_left = index[max(0, pos - n)] if pos - n >= 0 else None
+                     idx_right = index[pos + n] if pos + n < len(index) else None
+
+                     # Check if left neighbor exists and is NOT an outlier
+                     if idx_left is not None and not outlier_mask.get(idx_left, True): # Default to True if index not in mask
+                          vecinos_validos = pd.concat([vecinos_validos, pd.Series({idx_left: valores[idx_left]})])
+
+                     # Check if right neighbor exists and is NOT an outlier
+                     if idx_right is not None and not outlier_mask.get(idx_right, True):
+                           vecinos_validos = pd.concat([vecinos_validos, pd.Series({idx_right: valores[idx_right]})])
+
+                     # If we have at least one valid neighbor, calculate mean and update the corrected value
+                     # Ensure neighbors are numeric before calculating mean
+                     numeric_neighbors = pd.to_numeric(vecinos_validos, errors='coerce').dropna()
+                     if not numeric_neighbors.empty:
+                          valores_corregidos[idx_to_correct] = numeric_neighbors.mean()
+                          break # Stop searching for more neighbors once replacement is done
+                     elif n == n_max_neighbors: # If max neighbors checked and none valid, keep original or set NaN? Keep original for now.
+                         pass # Keep original outlier value if no valid neighbors found
+
+
+            # Return the corrected series along with mun_code
+            return pd.concat([pd.Series({'mun_code': codigo}), valores_corregidos])
+        else:
+            # Return original row if no outliers found
+            return row
+
+    # Apply the correction row by row
+    df_corrected = df_numeric.apply(corregir_outliers_fila, axis=1)
+
+    return df_corrected
+
+
+def load_pivot_numeric() -> pd.DataFrame:
+    """Numeric pivot from 'preprocesados/', or rebuilt from the raw tables."""
+    script_dir = pop.get_script_directory()
+    path_pivot_numeric = script_dir / pop.PROCESSED_SUBFOLDER / "df_pivot_numeric.csv"
+    if path_pivot_numeric.exists():
+        print(f"Loading '{path_pivot_numeric.relative_to(script_dir)}'...")
+        return pd.read_csv(path_pivot_numeric)
+    tables_dir = script_dir / pop.INTERMEDIATE_TABLES_SUBFOLDER
+    df_processed = pop.preprocess_unified_data(pop.unify_ine_tables(tables_dir))
+    return pop.convert_pivot_to_numeric(pop.pivot_population_data(df_processed))
+
+def timed(func, df, repeat):
+    """Best wall time over `repeat` runs, and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per implementation (best time is reported).")
+    args = parser.parse_args()
+
+    df_numeric = load_pivot_numeric()
+    if df_numeric.empty:
+        print("❌ No input data available.")
+        sys.exit(1)
+    print(f"Input: {df_numeric.shape[0]} municipalities x {df_numeric.shape[1] - 1} years")
+
+    t_rowwise, expected = timed(correct_outliers_rowwise, df_numeric, args.repeat)
+    t_vector, result = timed(pop.correct_outliers, df_numeric, args.repeat)
+
+    try:
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-12, atol=0)
+    except AssertionError as e:
+        print(f"❌ Parity check failed:\n{e}")
+        sys.exit(1)
+    n_changed = int(((expected.to_numpy() != df_numeric.to_numpy()) & ~np.isnan(df_numeric.to_numpy())).sum())
+    print(f"✅ Parity check passed ({n_changed} cells corrected by both implementations).")
+    print(f"Row-by-row: {t_rowwise:.3f} s | Vectorized: {t_vector:.3f} s | Speedup: {t_rowwise / t_vector:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
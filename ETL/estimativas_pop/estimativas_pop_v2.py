@@ -15,8 +15,9 @@ without Google Colab dependencies.
 - Final output file: `cifras_poblacion_municipio.csv` (in `preprocesados/`).
 - Wraps execution logic in functions and a `main()` function.
 - Removes plotting code and verbose intermediate output.
-- Requires installation of: pandas, requests, beautifulsoup4
-  (pip install pandas requests beautifulsoup4)
+- Requires installation of: pandas, requests, beautifulsoup4, pyarrow
+  (pip install pandas requests beautifulsoup4 pyarrow)
+  pyarrow is only needed for the streaming unification (`STREAMING_UNIFY`).
 
 Run from anywhere:
     $ python path/to/estimativas_pop_v2.py
@@ -26,13 +27,21 @@ import requests
 import pandas as pd
 import numpy as np
 import os
+import sys
 import io
 import re
 import glob
+import json
+import hashlib
+from datetime import datetime
 from pathlib import Path
 from bs4 import BeautifulSoup
 import warnings
 
+# Shared INE HTTP client lives at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from ine_client import INEClient, INEClientError
+
 # Suppress potential warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -44,6 +53,16 @@ INE_POP_PAGE_URL = "https://www.ine.es/dynt3/inebase/es/index.htm?padre=525"
 # Define folder names
 PROCESSED_SUBFOLDER = "preprocesados"
 INTERMEDIATE_TABLES_SUBFOLDER = "tablas_intermedias" # New folder for raw tables
+# Per-table CSV download (the base URL can be pointed at a local HTTP stub)
+INE_TABLE_CSV_URL = "https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{code}?nult=999"
+MAX_CONCURRENT_DOWNLOADS = 8
+DOWNLOAD_TIMEOUT = 120
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+DOWNLOAD_MANIFEST_NAME = "manifest_descargas.json"
+# Unify + preprocess the tables chunk by chunk into a Parquet file instead of in memory
+STREAMING_UNIFY = True
+STREAM_CHUNK_ROWS = 200_000
+UNIFIED_PARQUET_NAME = "df_unido_preprocessed.parquet"
 
 # --- Helper Functions ---
 
@@ -97,36 +116,112 @@ def download_and_extract_links(url: str) -> pd.DataFrame:
         print(f"❌ Error parsing links page: {e}")
         return pd.DataFrame()
 
+def sha256_of_file(path: Path) -> str:
+    """SHA-256 of a file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_download_manifest(manifest_path: Path) -> dict:
+    """Reads the download manifest ({table_code: entry}); empty if missing or unreadable."""
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not read download manifest '{manifest_path.name}': {e}. Starting a new one.")
+        return {}
+
+def save_download_manifest(manifest_path: Path, manifest: dict):
+    """Writes the manifest atomically (temporary file + rename)."""
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def is_table_up_to_date(filename_path: Path, entry) -> bool:
+    """True if the file on disk matches the size and hash recorded in the manifest."""
+    if not entry or not filename_path.exists():
+        return False
+    if filename_path.stat().st_size != entry.get("bytes"):
+        return False
+    return sha256_of_file(filename_path) == entry.get("sha256")
+
+def table_manifest_entry(code: str, url_csv: str, filename_path: Path, download: dict) -> dict:
+    """Manifest entry of a freshly downloaded table (`download` is the result of INEClient.descargar)."""
+    return {
+        "table_code": code,
+        "url": url_csv,
+        "file": filename_path.name,
+        "bytes": download["bytes"],
+        "sha256": download["sha256"],
+        "etag": download.get("etag"),
+        "last_modified": download.get("last_modified"),
+        "downloaded_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+def make_download_client(max_workers: int = MAX_CONCURRENT_DOWNLOADS) -> INEClient:
+    """
+    INEClient for the table downloads (pooled session, retries with exponential backoff).
+    Its disk cache is disabled: the manifest already decides which tables to fetch, and
+    caching the bodies would keep a second copy of every table.
+    """
+    return INEClient(cache_dir=None, timeout=DOWNLOAD_TIMEOUT, max_workers=max_workers)
+
 # Modified to accept a specific directory for saving tables
-def download_ine_tables(df_links: pd.DataFrame, tables_save_directory: Path):
-    """Downloads individual INE CSV tables based on table codes into the specified directory."""
+def download_ine_tables(df_links: pd.DataFrame, tables_save_directory: Path,
+                        max_workers: int = MAX_CONCURRENT_DOWNLOADS, force: bool = False,
+                        url_template: str = INE_TABLE_CSV_URL, client: INEClient = None):
+    """
+    Downloads individual INE CSV tables based on table codes into the specified directory.
+
+    Tables are fetched concurrently (at most `max_workers` at a time) through an
+    `INEClient` (see `make_download_client`) and streamed to disk in chunks of
+    DOWNLOAD_CHUNK_SIZE bytes: each body goes to a `.part` file, hashed while it is
+    written, and is renamed into place once complete. A manifest
+    (`manifest_descargas.json`) records size, SHA-256, ETag and Last-Modified of every
+    table; tables whose file still matches the manifest are skipped unless `force` is True.
+    """
     if df_links.empty or not tables_save_directory.exists():
         print("❌ Cannot download tables: Missing links DataFrame or target save directory.")
         return False # Indicate failure
 
-    print(f"Downloading {len(df_links)} individual INE tables into '{tables_save_directory.name}' folder...")
-    success_count = 0
-    error_count = 0
-    for _, row in df_links.iterrows():
-        code = row['table_code']
-        url_csv = f"https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{code}?nult=999"
+    manifest_path = tables_save_directory / DOWNLOAD_MANIFEST_NAME
+    manifest = load_download_manifest(manifest_path)
+
+    pending = {}
+    skipped_count = 0
+    for code in df_links['table_code'].astype(str).unique():
         # Construct path within the specific tables directory
         filename_path = tables_save_directory / f"tabla_{code}.csv"
-        try:
-            response = requests.get(url_csv, timeout=120)
-            response.raise_for_status()
-            # Save directly using utf-8 encoding
-            with open(filename_path, "w", encoding="utf-8") as f:
-                f.write(response.content.decode('utf-8'))
-            success_count += 1
-        except requests.exceptions.RequestException as e:
-            print(f"  ❌ Error downloading table {code}: {e}")
-            error_count += 1
-        except Exception as e:
-            print(f"  ❌ Error saving table {code} to '{filename_path}': {e}")
+        if not force and is_table_up_to_date(filename_path, manifest.get(code)):
+            skipped_count += 1
+            continue
+        pending[url_template.format(code=code)] = (code, filename_path)
+
+    print(f"Downloading {len(pending)} individual INE tables into '{tables_save_directory.name}' folder "
+          f"({skipped_count} already up to date, up to {max_workers} concurrent downloads)...")
+    if client is None:
+        client = make_download_client(max_workers)
+    success_count = 0
+    error_count = 0
+    destinations = {url_csv: str(filename_path) for url_csv, (_, filename_path) in pending.items()}
+    downloads = client.iter_descargas(destinations, max_workers=max_workers, tam_bloque=DOWNLOAD_CHUNK_SIZE)
+    for url_csv, download in downloads:
+        code, filename_path = pending[url_csv]
+        if isinstance(download, INEClientError):
+            print(f"  ❌ Error downloading table {code}: {download}")
             error_count += 1
+            continue
+        # Saved after every table so an interrupted run keeps what it already fetched
+        manifest[code] = table_manifest_entry(code, url_csv, filename_path, download)
+        save_download_manifest(manifest_path, manifest)
+        success_count += 1
 
-    print(f"Finished downloading tables: {success_count} successful, {error_count} errors.")
+    print(f"Finished downloading tables: {success_count} successful, {skipped_count} skipped, {error_count} errors.")
     return error_count == 0 # Return True if all downloads were successful
 
 
@@ -145,7 +240,8 @@ def unify_ine_tables(tables_source_directory: Path) -> pd.DataFrame:
     for archivo_path in archivos:
         try:
             table_code = archivo_path.stem.split('_')[1] # Extract code from filename stem
-            df_temp = pd.read_csv(archivo_path, sep='\t', encoding='utf-8')
+            # Read as text: parsed as float, '28' or '5.150' lose digits once the thousands separator is stripped
+            df_temp = pd.read_csv(archivo_path, sep='\t', encoding='utf-8', dtype=str)
             df_temp['table_code'] = table_code
             lista_df.append(df_temp)
         except Exception as e:
@@ -159,6 +255,30 @@ def unify_ine_tables(tables_source_directory: Path) -> pd.DataFrame:
     print(f"Tables unified into a single DataFrame with {len(df_unido)} rows.")
     return df_unido
 
+def find_municipality_column(columns):
+    """Returns the municipality column (handles naming variations), or None if there are no columns."""
+    col_candidates = ["Municipios", "Código", "Municipio"] # Add more if needed
+    for candidate in col_candidates:
+        if candidate in columns:
+            return candidate
+    if len(columns) > 0:
+        muni_col = columns[0] # Fallback to first column
+        print(f"⚠️ Municipality column not explicitly found, using first column '{muni_col}'.")
+        return muni_col
+    return None
+
+def filter_total_and_extract_codes(df: pd.DataFrame, muni_col: str) -> pd.DataFrame:
+    """Keeps Sex='Total' rows and splits `muni_col` into numeric mun_code and Municipios_name."""
+    df = df[df['Sexo'] == 'Total'].copy()
+    # Split only on the first space, handle cases with no space or only code
+    split_data = df[muni_col].astype(str).str.split(" ", n=1, expand=True)
+    df['mun_code'] = pd.to_numeric(split_data[0], errors='coerce') # Ensure mun_code is numeric where possible
+    if 1 in split_data.columns:
+        df['Municipios_name'] = split_data[1].fillna('') # Fill NaN names with empty string
+    else:
+        df['Municipios_name'] = ''
+    return df
+
 def preprocess_unified_data(df_unified: pd.DataFrame) -> pd.DataFrame:
     """Filters unified data for Sex='Total' and extracts mun_code/name."""
     if df_unified.empty:
@@ -171,32 +291,14 @@ def preprocess_unified_data(df_unified: pd.DataFrame) -> pd.DataFrame:
         print("❌ Cannot filter by Sex: 'Sexo' column not found.")
         return pd.DataFrame()
 
-    df = df_unified[df_unified['Sexo'] == 'Total'].copy()
-
-    # Identify the municipality column (handle variations)
-    col_candidates = ["Municipios", "Código", "Municipio"] # Add more if needed
-    muni_col = None
-    for candidate in col_candidates:
-        if candidate in df.columns:
-            muni_col = candidate
-            break
-    if muni_col is None and len(df.columns) > 0:
-         muni_col = df.columns[0] # Fallback to first column
-         print(f"⚠️ Municipality column not explicitly found, using first column '{muni_col}'.")
-    elif muni_col is None:
-         print("❌ Cannot extract codes: No suitable municipality column found.")
-         return pd.DataFrame()
+    muni_col = find_municipality_column(list(df_unified.columns))
+    if muni_col is None:
+        print("❌ Cannot extract codes: No suitable municipality column found.")
+        return pd.DataFrame()
 
     # Extract code and name, handle potential errors
     try:
-        # Split only on the first space, handle cases with no space or only code
-        split_data = df[muni_col].astype(str).str.split(" ", n=1, expand=True)
-        df['mun_code'] = split_data[0]
-        df['Municipios_name'] = split_data[1].fillna('') # Fill NaN names with empty string
-        # Ensure mun_code is numeric where possible
-        df['mun_code'] = pd.to_numeric(df['mun_code'], errors='coerce')
-        # Optionally drop rows where mun_code could not be parsed if needed
-        # df.dropna(subset=['mun_code'], inplace=True)
+        df = filter_total_and_extract_codes(df_unified, muni_col)
     except Exception as e:
         print(f"❌ Error extracting mun_code/name from column '{muni_col}': {e}")
         return pd.DataFrame() # Return empty on error
@@ -207,6 +309,78 @@ def preprocess_unified_data(df_unified: pd.DataFrame) -> pd.DataFrame:
     print("Preprocessing finished.")
     return df
 
+def unify_and_preprocess_streaming(tables_source_directory: Path, output_path: Path,
+                                   chunksize: int = STREAM_CHUNK_ROWS) -> int:
+    """
+    Streaming equivalent of `unify_ine_tables` + `preprocess_unified_data`.
+
+    Each downloaded table is read in chunks of `chunksize` rows; every chunk is
+    filtered (Sex='Total'), gets mun_code/Municipios_name/table_code and is appended
+    as a row group to a single Parquet file, so peak memory depends on the chunk
+    size rather than on the number of tables. All columns are read as text, so
+    'Total' keeps its thousands separators until `pivot_population_data` cleans it.
+
+    Returns the number of rows written (0 if nothing could be unified).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("❌ Streaming unification requires pyarrow (pip install pyarrow).")
+        return 0
+
+    archivos = sorted(tables_source_directory.glob("tabla_*.csv"))
+    if not archivos:
+        print("❌ No downloaded tables found in the specified directory to unify.")
+        return 0
+
+    print(f"Unifying and preprocessing {len(archivos)} tables from '{tables_source_directory}' "
+          f"in chunks of {chunksize} rows...")
+    schema = pa.schema([
+        ("Municipios", pa.string()),
+        ("Sexo", pa.string()),
+        ("Periodo", pa.int64()),
+        ("Total", pa.string()),
+        ("table_code", pa.string()),
+        ("mun_code", pa.float64()),
+        ("Municipios_name", pa.string()),
+    ])
+    part_path = output_path.with_suffix(output_path.suffix + ".part")
+    total_rows = 0
+    files_ok = 0
+    try:
+        with pq.ParquetWriter(part_path, schema) as writer:
+            for archivo_path in archivos:
+                table_code = archivo_path.stem.split('_')[1] # Extract code from filename stem
+                try:
+                    # utf-8-sig drops the BOM the INE puts before the first header
+                    reader = pd.read_csv(archivo_path, sep='\t', encoding='utf-8-sig', dtype=str, chunksize=chunksize)
+                    muni_col = None
+                    for chunk in reader:
+                        if muni_col is None:
+                            if 'Sexo' not in chunk.columns:
+                                raise ValueError("'Sexo' column not found")
+                            muni_col = find_municipality_column(list(chunk.columns))
+                        chunk = filter_total_and_extract_codes(chunk, muni_col)
+                        chunk = chunk.rename(columns={muni_col: 'Municipios'})
+                        chunk['Periodo'] = pd.to_numeric(chunk['Periodo'], errors='coerce').astype('Int64')
+                        chunk['table_code'] = table_code
+                        writer.write_table(pa.Table.from_pandas(chunk[schema.names], schema=schema, preserve_index=False))
+                        total_rows += len(chunk)
+                    files_ok += 1
+                except Exception as e:
+                    print(f"⚠️ Error reading or processing file '{archivo_path.name}': {e}. Skipping.")
+        if files_ok == 0:
+            print("❌ Failed to read any tables for unification.")
+            return 0
+        os.replace(part_path, output_path)
+    finally:
+        if part_path.exists():
+            part_path.unlink()
+
+    print(f"Tables unified and preprocessed into '{output_path.name}' with {total_rows} rows ({files_ok} files).")
+    return total_rows
+
 def pivot_population_data(df_processed: pd.DataFrame) -> pd.DataFrame:
     """Pivots data to have years as columns and mun_code as index."""
     if df_processed.empty or 'mun_code' not in df_processed.columns or 'Periodo' not in df_processed.columns or 'Total' not in df_processed.columns:
@@ -248,75 +422,72 @@ def convert_pivot_to_numeric(df_pivot: pd.DataFrame) -> pd.DataFrame:
     return df_numeric
 
 
+def detect_outliers_iqr(values: np.ndarray) -> np.ndarray:
+    """
+    Row-wise IQR outlier mask for a 2-D (municipality x year) array.
+
+    Rows with fewer than 4 valid values or a zero IQR have no outliers; NaN
+    cells are never outliers.
+    """
+    n_valid = np.count_nonzero(~np.isnan(values), axis=1)
+    enough = n_valid >= 4 # Need enough points for IQR
+    # Linear-interpolated quantiles (same as pandas) from the sorted rows; NaNs sort last
+    ordenados = np.sort(values, axis=1)
+    filas = np.arange(len(values))
+
+    def cuantil(q):
+        pos = q * (np.maximum(n_valid, 1) - 1)
+        inf = np.floor(pos).astype(int)
+        sup = np.minimum(inf + 1, np.maximum(n_valid, 1) - 1)
+        return ordenados[filas, inf] + (pos - inf) * (ordenados[filas, sup] - ordenados[filas, inf])
+
+    q1, q3 = cuantil(0.25), cuantil(0.75)
+    iqr = q3 - q1
+    checked = enough & (iqr != 0) # Avoid issues if all values are same
+    lim_inf = (q1 - 1.5 * iqr)[:, None]
+    lim_sup = (q3 + 1.5 * iqr)[:, None]
+    with np.errstate(invalid='ignore'):
+        return ((values < lim_inf) | (values > lim_sup)) & checked[:, None]
+
 def correct_outliers(df_numeric: pd.DataFrame, n_max_neighbors=5) -> pd.DataFrame:
-    """Detects and corrects outliers using IQR and neighbor averaging."""
+    """
+    Detects and corrects outliers using IQR and neighbor averaging.
+
+    Works on the whole year matrix at once: each outlier is replaced by the mean
+    of the valid (non-NaN, non-outlier) original values at the smallest distance
+    n <= `n_max_neighbors` (left and/or right) where any exists; otherwise it is
+    kept as is.
+    """
     if df_numeric.empty:
         print("❌ Cannot correct outliers: Input numeric DataFrame is empty.")
         return pd.DataFrame()
 
     print("Detecting and correcting outliers...")
-
-    def detectar_outliers_fila(row_values):
-        # Exclude non-numeric if any slipped through, though convert_pivot_to_numeric should handle this
-        numeric_values = pd.to_numeric(row_values, errors='coerce').dropna()
-        if len(numeric_values) < 4: return pd.Series(False, index=row_values.index) # Need enough points for IQR
-        Q1 = numeric_values.quantile(0.25)
-        Q3 = numeric_values.quantile(0.75)
-        IQR = Q3 - Q1
-        if IQR == 0: return pd.Series(False, index=row_values.index) # Avoid issues if all values are same
-        lim_inf = Q1 - 1.5 * IQR
-        lim_sup = Q3 + 1.5 * IQR
-        # Ensure comparison is done with original numeric values
-        return (row_values < lim_inf) | (row_values > lim_sup)
-
-    def corregir_outliers_fila(row):
-        codigo = row['mun_code']
-        valores = row.drop('mun_code').copy()
-        index = valores.index
-        # Ensure the mask is calculated on the potentially non-numeric series before correction
-        outlier_mask = detectar_outliers_fila(valores)
-        outliers_idx = valores[outlier_mask].index
-
-        if not outliers_idx.empty:
-            # Create a working copy for modifications
-            valores_corregidos = valores.copy()
-            for idx_to_correct in outliers_idx:
-                pos = index.get_loc(idx_to_correct)
-                # Find nearest valid neighbors (not outliers themselves)
-                vecinos_validos = pd.Series(dtype=float) # Initialize empty series for neighbors
-                for n in range(1, n_max_neighbors + 1):
-                     # Get potential neighbors (indices)
-                     idx_left = index[max(0, pos - n)] if pos - n >= 0 else None
-                     idx_right = index[pos + n] if pos + n < len(index) else None
-
-                     # Check if left neighbor exists and is NOT an outlier
-                     if idx_left is not None and not outlier_mask.get(idx_left, True): # Default to True if index not in mask
-                          vecinos_validos = pd.concat([vecinos_validos, pd.Series({idx_left: valores[idx_left]})])
-
-                     # Check if right neighbor exists and is NOT an outlier
-                     if idx_right is not None and not outlier_mask.get(idx_right, True):
-                           vecinos_validos = pd.concat([vecinos_validos, pd.Series({idx_right: valores[idx_right]})])
-
-                     # If we have at least one valid neighbor, calculate mean and update the corrected value
-                     # Ensure neighbors are numeric before calculating mean
-                     numeric_neighbors = pd.to_numeric(vecinos_validos, errors='coerce').dropna()
-                     if not numeric_neighbors.empty:
-                          valores_corregidos[idx_to_correct] = numeric_neighbors.mean()
-                          break # Stop searching for more neighbors once replacement is done
-                     elif n == n_max_neighbors: # If max neighbors checked and none valid, keep original or set NaN? Keep original for now.
-                         pass # Keep original outlier value if no valid neighbors found
-
-
-            # Return the corrected series along with mun_code
-            return pd.concat([pd.Series({'mun_code': codigo}), valores_corregidos])
-        else:
-            # Return original row if no outliers found
-            return row
-
-    # Apply the correction row by row
-    df_corrected = df_numeric.apply(corregir_outliers_fila, axis=1)
-
-    print("Outlier correction process finished.")
+    year_cols = [col for col in df_numeric.columns if col != 'mun_code']
+    valores = df_numeric[year_cols].to_numpy(dtype=float)
+    outlier_mask = detect_outliers_iqr(valores)
+    valid = ~outlier_mask & ~np.isnan(valores)
+
+    corregidos = valores.copy()
+    pendientes = outlier_mask.copy()
+    n_cols = valores.shape[1]
+    for n in range(1, min(n_max_neighbors, n_cols - 1) + 1):
+        if not pendientes.any():
+            break
+        suma = np.zeros_like(valores)
+        cuenta = np.zeros(valores.shape, dtype=np.int8)
+        # Left neighbor at distance n (column j takes column j - n) and right neighbor (j + n)
+        for dst, src in ((np.s_[:, n:], np.s_[:, :-n]), (np.s_[:, :-n], np.s_[:, n:])):
+            suma[dst] += np.where(valid[src], valores[src], 0.0)
+            cuenta[dst] += valid[src]
+        corregir = pendientes & (cuenta > 0)
+        corregidos[corregir] = suma[corregir] / cuenta[corregir]
+        pendientes &= ~corregir
+
+    df_corrected = df_numeric.copy()
+    df_corrected[year_cols] = corregidos
+    print(f"Outlier correction process finished ({int(outlier_mask.sum())} outliers in "
+          f"{int(outlier_mask.any(axis=1).sum())} municipalities).")
     return df_corrected
 
 def impute_missing_values(df_corrected: pd.DataFrame, max_nan_threshold=6) -> pd.DataFrame:
@@ -406,22 +577,32 @@ def main():
     download_success = download_ine_tables(df_links, intermediate_tables_dir)
     # Proceed even if some downloads failed, unify what was downloaded
 
-    # 3. Unify Tables from 'tablas_intermedias'
-    df_unido = unify_ine_tables(intermediate_tables_dir)
-    if df_unido.empty:
-        print("❌ Exiting: Failed to unify downloaded tables.")
-        return
-    # Save unified table into 'preprocesados'
-    df_unido.to_csv(path_df_unido, index=False, encoding='utf-8')
-    print(f"Unified table saved to '{path_df_unido.relative_to(script_dir)}'")
-
-    # 4. Preprocess Unified Data
-    df_unido_preproc = preprocess_unified_data(df_unido)
-    if df_unido_preproc.empty:
-        print("❌ Exiting: Preprocessing failed.")
-        return
-    df_unido_preproc.to_csv(path_df_unido_preproc, index=False, encoding='utf-8')
-    print(f"Preprocessed data saved to '{path_df_unido_preproc.relative_to(script_dir)}'")
+    if STREAMING_UNIFY:
+        # 3-4. Unify and preprocess chunk by chunk into 'preprocesados/df_unido_preprocessed.parquet'
+        path_unido_parquet = preproc_dir / UNIFIED_PARQUET_NAME
+        if unify_and_preprocess_streaming(intermediate_tables_dir, path_unido_parquet) == 0:
+            print("❌ Exiting: Failed to unify downloaded tables.")
+            return
+        print(f"Preprocessed data saved to '{path_unido_parquet.relative_to(script_dir)}'")
+        # Only the columns needed for the pivot are loaded back
+        df_unido_preproc = pd.read_parquet(path_unido_parquet, columns=['mun_code', 'Periodo', 'Total'])
+    else:
+        # 3. Unify Tables from 'tablas_intermedias'
+        df_unido = unify_ine_tables(intermediate_tables_dir)
+        if df_unido.empty:
+            print("❌ Exiting: Failed to unify downloaded tables.")
+            return
+        # Save unified table into 'preprocesados'
+        df_unido.to_csv(path_df_unido, index=False, encoding='utf-8')
+        print(f"Unified table saved to '{path_df_unido.relative_to(script_dir)}'")
+
+        # 4. Preprocess Unified Data
+        df_unido_preproc = preprocess_unified_data(df_unido)
+        if df_unido_preproc.empty:
+            print("❌ Exiting: Preprocessing failed.")
+            return
+        df_unido_preproc.to_csv(path_df_unido_preproc, index=False, encoding='utf-8')
+        print(f"Preprocessed data saved to '{path_df_unido_preproc.relative_to(script_dir)}'")
 
     # 5. Pivot Data
     df_pivot = pivot_population_data(df_unido_preproc)
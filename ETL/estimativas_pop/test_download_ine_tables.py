@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of download_ine_tables against a local HTTP stub of the INE DATOS_TABLA endpoint.
+
+Run from the repository root:
+    $ python -m pytest ETL/estimativas_pop/test_download_ine_tables.py
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import estimativas_pop_v2 as pop
+
+
+class StubINE:
+    """Serves /csv/ES/DATOS_TABLA/{code} from `tables` and counts the requests per code."""
+
+    def __init__(self, tables):
+        self.tables = dict(tables)
+        self.hits = {}
+        self.failures = {}  # {code: number of 503 answers before serving the table}
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                code = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+                stub.hits[code] = stub.hits.get(code, 0) + 1
+                if stub.failures.get(code, 0) > 0:
+                    stub.failures[code] -= 1
+                    self._send(503, b"")
+                elif code in stub.tables:
+                    self._send(200, stub.tables[code], {"ETag": f'"{code}-v1"', "Last-Modified": LAST_MODIFIED})
+                else:
+                    self._send(404, b"")
+
+            def _send(self, status, body, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/csv")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url_template = (f"http://127.0.0.1:{self.server.server_port}"
+                             "/csv/ES/DATOS_TABLA/{code}?nult=999")
+
+    def total_hits(self):
+        return sum(self.hits.values())
+
+
+class ChunkSpy:
+    """Wraps a transport and records the size of every chunk streamed per URL."""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.chunks = {}
+
+    def get(self, url, headers=None, timeout=None):
+        return self.transport.get(url, headers=headers, timeout=timeout)
+
+    @contextmanager
+    def stream(self, url, headers=None, timeout=None, tam_bloque=None):
+        with self.transport.stream(url, headers=headers, timeout=timeout, tam_bloque=tam_bloque) as response:
+            sizes = self.chunks.setdefault(url.split("?", 1)[0].rsplit("/", 1)[-1], [])
+            yield response._replace(bloques=self._record(response.bloques, sizes))
+
+    @staticmethod
+    def _record(chunks, sizes):
+        for chunk in chunks:
+            sizes.append(len(chunk))
+            yield chunk
+
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+TABLES = {
+    "2854": "Municipios;Sexo;Periodo;Total\n01001 Alegría-Dulantzi;Total;2023;3.050\n".encode("utf-8"),
+    "2855": "Municipios;Sexo;Periodo;Total\n02001 Abengibre;Total;2023;760\n".encode("utf-8"),
+}
+
+
+@pytest.fixture
+def stub():
+    stub = StubINE(TABLES)
+    thread = threading.Thread(target=stub.server.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def download(stub, directory, client=None, **kwargs):
+    df_links = pd.DataFrame({"table_code": list(TABLES)})
+    client = client or pop.INEClient(cache_dir=None, timeout=5, max_retries=2, backoff=0)
+    return pop.download_ine_tables(df_links, directory, max_workers=2,
+                                   url_template=stub.url_template, client=client, **kwargs)
+
+
+def read_manifest(directory):
+    with open(directory / pop.DOWNLOAD_MANIFEST_NAME, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_downloads_tables_and_records_them_in_the_manifest(stub, tmp_path):
+    assert download(stub, tmp_path)
+
+    for code, body in TABLES.items():
+        assert (tmp_path / f"tabla_{code}.csv").read_bytes() == body
+    manifest = read_manifest(tmp_path)
+    assert set(manifest) == set(TABLES)
+    assert manifest["2854"]["bytes"] == len(TABLES["2854"])
+    assert manifest["2854"]["sha256"] == pop.sha256_of_file(tmp_path / "tabla_2854.csv")
+    assert manifest["2854"]["etag"] == '"2854-v1"'
+    assert manifest["2854"]["last_modified"] == LAST_MODIFIED
+    assert not list(tmp_path.glob("*.tmp"))
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_streams_the_body_to_disk_in_chunks(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(pop, "DOWNLOAD_CHUNK_SIZE", 16)
+    client = pop.INEClient(cache_dir=None, timeout=5, max_retries=2, backoff=0)
+    spy = client.transport = ChunkSpy(client.transport)
+
+    assert download(stub, tmp_path, client=client)
+
+    for code, body in TABLES.items():
+        sizes = spy.chunks[code]
+        assert len(sizes) == -(-len(body) // 16)
+        assert max(sizes) == 16 and sum(sizes) == len(body)
+        assert (tmp_path / f"tabla_{code}.csv").read_bytes() == body
+
+
+def test_skips_tables_whose_hash_is_unchanged(stub, tmp_path):
+    assert download(stub, tmp_path)
+    hits = stub.total_hits()
+
+    assert download(stub, tmp_path)
+
+    assert stub.total_hits() == hits
+
+
+def test_redownloads_table_whose_hash_changed(stub, tmp_path):
+    assert download(stub, tmp_path)
+    # Same size, different content: only the hash can tell it apart
+    tampered = tmp_path / "tabla_2855.csv"
+    tampered.write_bytes(TABLES["2855"].replace(b"760", b"999"))
+
+    assert download(stub, tmp_path)
+
+    assert stub.hits == {"2854": 1, "2855": 2}
+    assert tampered.read_bytes() == TABLES["2855"]
+
+
+def test_force_fetches_the_new_server_content(stub, tmp_path):
+    assert download(stub, tmp_path)
+    stub.tables["2854"] = TABLES["2854"].replace(b"3.050", b"3.112")
+
+    assert download(stub, tmp_path, force=True)
+
+    assert (tmp_path / "tabla_2854.csv").read_bytes() == stub.tables["2854"]
+    assert read_manifest(tmp_path)["2854"]["bytes"] == len(stub.tables["2854"])
+
+
+def test_retries_transient_server_errors(stub, tmp_path):
+    stub.failures["2854"] = 2
+
+    assert download(stub, tmp_path)
+
+    assert stub.hits["2854"] == 3
+    assert (tmp_path / "tabla_2854.csv").read_bytes() == TABLES["2854"]
+
+
+def test_reports_failure_and_keeps_manifest_clean_when_a_table_is_missing(stub, tmp_path):
+    del stub.tables["2855"]
+
+    assert not download(stub, tmp_path)
+
+    assert set(read_manifest(tmp_path)) == {"2854"}
+    assert not (tmp_path / "tabla_2855.csv").exists()
+    assert not list(tmp_path.glob("*.part"))
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+flujo_dag.py
+
+Grafo de tareas mínimo para orquestar los scripts del ETL.
+
+Cada `Tarea` es un script de Python con sus entradas y salidas declaradas. Las
+dependencias se deducen de ellas (una tarea depende de la que produce alguna
+de sus entradas) más las que se indiquen con `despues_de`.
+
+- Una tarea se omite si todas sus salidas existen y ni el script ni sus
+  entradas han cambiado desde la última ejecución correcta. Los cambios se
+  detectan por tamaño + mtime y, si el mtime cambió, por SHA-256 (un archivo
+  reescrito con el mismo contenido no obliga a repetir la tarea).
+- Las ramas independientes se ejecutan en paralelo (`max_workers` scripts a la
+  vez). Si una tarea falla, las que dependen de ella no se ejecutan, pero el
+  resto del grafo continúa.
+- La salida de cada script se guarda en `<logs>/<tarea>.log`; al final se
+  muestra un informe con el estado y la duración de cada paso.
+
+Uso:
+    from flujo_dag import GrafoTareas, Tarea
+    grafo = GrafoTareas(ruta_estado, directorio_logs)
+    grafo.añadir(Tarea("descarga", "descargar.py", salidas=["datos.csv"]))
+    grafo.añadir(Tarea("proceso", "procesar.py", entradas=["datos.csv"], salidas=["final.csv"]))
+    resultados = grafo.ejecutar(["proceso"], max_workers=4)
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+# Estados de una tarea en el informe
+EJECUTADA = "ejecutada"
+AL_DIA = "al día"
+FALLIDA = "fallida"
+BLOQUEADA = "bloqueada"
+
+LINEAS_LOG_ERROR = 20
+
+
+class Tarea:
+    """
+    Paso del flujo: un script con sus entradas y salidas.
+
+    Args:
+        nombre (str): Identificador único de la tarea.
+        script (str | Path): Script de Python a ejecutar (cuenta como entrada).
+        entradas (iterable): Archivos que lee el script.
+        salidas (iterable): Archivos que escribe el script.
+        despues_de (iterable): Nombres de tareas que deben terminar antes aunque
+            no compartan archivos.
+        cwd (str | Path): Directorio de trabajo del script (por defecto, el suyo).
+        args (iterable): Argumentos de línea de comandos para el script.
+        grupo (str): Nombre del subflujo (p. ej. 'pie') para seleccionarlo entero.
+    """
+
+    def __init__(self, nombre, script, entradas=(), salidas=(), despues_de=(), cwd=None,
+                 args=(), grupo=None):
+        self.nombre = nombre
+        self.script = Path(script)
+        self.entradas = [Path(ruta) for ruta in entradas]
+        self.salidas = [Path(ruta) for ruta in salidas]
+        self.despues_de = list(despues_de)
+        self.cwd = Path(cwd) if cwd else self.script.parent
+        self.args = [str(arg) for arg in args]
+        self.grupo = grupo
+
+    def __repr__(self):
+        return f"Tarea({self.nombre!r})"
+
+
+def sha256_archivo(ruta):
+    """SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def firma_archivo(ruta, previa=None):
+    """
+    Firma {'bytes', 'mtime_ns', 'sha256'} de un archivo (None si no existe).
+
+    Si tamaño y mtime coinciden con la firma `previa` se reutiliza su hash sin
+    volver a leer el archivo.
+    """
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    if previa and previa.get("bytes") == info.st_size and previa.get("mtime_ns") == info.st_mtime_ns:
+        return dict(previa)
+    return {"bytes": info.st_size, "mtime_ns": info.st_mtime_ns, "sha256": sha256_archivo(ruta)}
+
+
+def mismo_contenido(firma_a, firma_b):
+    """True si dos firmas corresponden al mismo contenido (el mtime no cuenta)."""
+    if firma_a is None or firma_b is None:
+        return firma_a is firma_b
+    return firma_a["bytes"] == firma_b["bytes"] and firma_a["sha256"] == firma_b["sha256"]
+
+
+class GrafoTareas:
+    """
+    Conjunto de tareas con su estado persistente.
+
+    Args:
+        ruta_estado (str | Path): JSON con las firmas de la última ejecución correcta de cada tarea.
+        directorio_logs (str | Path): Directorio para la salida de cada script.
+        python (str): Intérprete con el que se ejecutan los scripts.
+    """
+
+    def __init__(self, ruta_estado, directorio_logs, python=sys.executable):
+        self.ruta_estado = Path(ruta_estado)
+        self.directorio_logs = Path(directorio_logs)
+        self.python = python
+        self.tareas = {}
+
+    def añadir(self, tarea):
+        if tarea.nombre in self.tareas:
+            raise ValueError(f"Tarea duplicada: {tarea.nombre}")
+        self.tareas[tarea.nombre] = tarea
+        return tarea
+
+    # --- Estructura del grafo ---
+
+    def dependencias(self):
+        """{tarea: set de tareas de las que depende}, deducidas de entradas/salidas y `despues_de`."""
+        productor = {}
+        for tarea in self.tareas.values():
+            for salida in tarea.salidas:
+                if salida in productor:
+                    raise ValueError(f"{salida} es salida de {productor[salida]} y de {tarea.nombre}")
+                productor[salida] = tarea.nombre
+
+        deps = {}
+        for tarea in self.tareas.values():
+            previas = {productor[ruta] for ruta in tarea.entradas if ruta in productor}
+            for nombre in tarea.despues_de:
+                if nombre not in self.tareas:
+                    raise ValueError(f"{tarea.nombre}: tarea desconocida en despues_de: {nombre}")
+                previas.add(nombre)
+            previas.discard(tarea.nombre)
+            deps[tarea.nombre] = previas
+        return deps
+
+    def orden_topologico(self, nombres=None):
+        """Nombres de las tareas (todas o `nombres`) en un orden que respeta las dependencias."""
+        deps = self.dependencias()
+        nombres = list(self.tareas) if nombres is None else list(nombres)
+        orden, visitando, visitadas = [], set(), set()
+
+        def visitar(nombre):
+            if nombre in visitadas:
+                return
+            if nombre in visitando:
+                raise ValueError(f"Ciclo en el grafo de tareas en {nombre}")
+            visitando.add(nombre)
+            for previa in sorted(deps[nombre]):
+                visitar(previa)
+            visitando.discard(nombre)
+            visitadas.add(nombre)
+            orden.append(nombre)
+
+        for nombre in nombres:
+            visitar(nombre)
+        return orden
+
+    def seleccionar(self, objetivos=None):
+        """
+        Tareas necesarias para `objetivos` (nombres de tarea o de grupo), con
+        todas sus dependencias, en orden topológico. Sin objetivos, todo el grafo.
+        """
+        if not objetivos:
+            return self.orden_topologico()
+        nombres = []
+        for objetivo in objetivos:
+            if objetivo in self.tareas:
+                nombres.append(objetivo)
+                continue
+            del_grupo = [t.nombre for t in self.tareas.values() if t.grupo == objetivo]
+            if not del_grupo:
+                raise ValueError(f"Objetivo desconocido: {objetivo}")
+            nombres.extend(del_grupo)
+        return self.orden_topologico(nombres)
+
+    # --- Estado persistente ---
+
+    def cargar_estado(self):
+        if not self.ruta_estado.exists():
+            return {}
+        with open(self.ruta_estado, encoding="utf-8") as f:
+            return json.load(f)
+
+    def guardar_estado(self, estado):
+        self.ruta_estado.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.ruta_estado.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, self.ruta_estado)
+
+    def firmas_entradas(self, tarea, previas=None):
+        """Firmas del script y de las entradas de `tarea` (reutilizando hashes de `previas`)."""
+        previas = previas or {}
+        return {str(ruta): firma_archivo(ruta, previas.get(str(ruta)))
+                for ruta in [tarea.script, *tarea.entradas]}
+
+    def esta_al_dia(self, tarea, firmas, registro):
+        """True si la tarea ya se ejecutó con estas mismas entradas y sus salidas existen."""
+        if not registro or not all(ruta.exists() for ruta in tarea.salidas):
+            return False
+        anteriores = registro.get("entradas", {})
+        if set(anteriores) != set(firmas):
+            return False
+        return all(mismo_contenido(firmas[ruta], anteriores[ruta]) for ruta in firmas)
+
+    # --- Ejecución ---
+
+    def ejecutar_script(self, tarea):
+        """Ejecuta el script de `tarea`; devuelve (éxito, segundos). La salida va al log de la tarea."""
+        self.directorio_logs.mkdir(parents=True, exist_ok=True)
+        ruta_log = self.directorio_logs / f"{tarea.nombre}.log"
+        inicio = time.perf_counter()
+        with open(ruta_log, "w", encoding="utf-8") as log:
+            log.write(f"# {tarea.nombre}: {tarea.script} ({datetime.now().isoformat(timespec='seconds')})\n")
+            log.flush()
+            try:
+                proceso = subprocess.run([self.python, str(tarea.script), *tarea.args],
+                                         cwd=tarea.cwd, stdout=log, stderr=subprocess.STDOUT)
+                exito = proceso.returncode == 0
+            except OSError as e:
+                log.write(f"\nNo se pudo ejecutar el script: {e}\n")
+                exito = False
+        return exito, time.perf_counter() - inicio
+
+    def mostrar_error(self, tarea):
+        ruta_log = self.directorio_logs / f"{tarea.nombre}.log"
+        print(f"❌ {tarea.nombre} falló. Últimas líneas de {ruta_log}:")
+        with open(ruta_log, encoding="utf-8", errors="replace") as f:
+            for linea in f.readlines()[-LINEAS_LOG_ERROR:]:
+                print(f"    {linea.rstrip()}")
+
+    def ejecutar(self, objetivos=None, max_workers=4, forzar=()):
+        """
+        Ejecuta las tareas de `objetivos` (y sus dependencias) que no estén al día.
+
+        Args:
+            objetivos (iterable): Nombres de tarea o de grupo; None para todo el grafo.
+            max_workers (int): Scripts simultáneos como máximo.
+            forzar (iterable | bool): Tareas/grupos a ejecutar aunque estén al día
+                (True para todas).
+
+        Returns:
+            dict: {tarea: {'estado', 'segundos'}} en orden topológico.
+        """
+        seleccion = self.seleccionar(objetivos)
+        deps = self.dependencias()
+        if forzar is True:
+            forzadas = set(seleccion)
+        else:
+            # Forzar una tarea no fuerza sus dependencias (que se omiten si están al día)
+            forzar = set(forzar or ())
+            forzadas = {n for n in seleccion if n in forzar or self.tareas[n].grupo in forzar}
+
+        estado = self.cargar_estado()
+        resultados = {}
+        pendientes = list(seleccion)
+        en_curso = {}
+        inicio_total = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pendientes or en_curso:
+                for nombre in list(pendientes):
+                    previas = deps[nombre] & set(seleccion)
+                    if not previas <= set(resultados):
+                        continue
+                    pendientes.remove(nombre)
+                    tarea = self.tareas[nombre]
+                    if any(resultados[p]["estado"] in (FALLIDA, BLOQUEADA) for p in previas):
+                        resultados[nombre] = {"estado": BLOQUEADA, "segundos": 0.0}
+                        print(f"⏭️  {nombre}: no se ejecuta porque falló una dependencia")
+                        continue
+                    registro = estado.get(nombre)
+                    firmas = self.firmas_entradas(tarea, (registro or {}).get("entradas"))
+                    if nombre not in forzadas and self.esta_al_dia(tarea, firmas, registro):
+                        resultados[nombre] = {"estado": AL_DIA, "segundos": 0.0}
+                        print(f"✅ {nombre}: al día")
+                        continue
+                    print(f"▶️  {nombre}: {tarea.script.name}")
+                    en_curso[pool.submit(self.ejecutar_script, tarea)] = (nombre, firmas)
+
+                if not en_curso:
+                    continue
+                hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    nombre, firmas = en_curso.pop(futuro)
+                    exito, segundos = futuro.result()
+                    faltan = [str(ruta) for ruta in self.tareas[nombre].salidas if not ruta.exists()]
+                    if exito and faltan:
+                        # Un script que termina sin error pero no escribe sus salidas también es un fallo
+                        with open(self.directorio_logs / f"{nombre}.log", "a", encoding="utf-8") as log:
+                            log.write(f"\nEl script terminó sin generar: {', '.join(faltan)}\n")
+                        exito = False
+                    if exito:
+                        resultados[nombre] = {"estado": EJECUTADA, "segundos": segundos}
+                        estado[nombre] = {
+                            "entradas": firmas,
+                            "fin": datetime.now().isoformat(timespec="seconds"),
+                            "segundos": round(segundos, 2),
+                        }
+                        self.guardar_estado(estado)
+                        print(f"✔️  {nombre}: terminada en {segundos:.1f} s")
+                    else:
+                        resultados[nombre] = {"estado": FALLIDA, "segundos": segundos}
+                        self.mostrar_error(self.tareas[nombre])
+
+        resultados = {nombre: resultados[nombre] for nombre in seleccion}
+        informe(resultados, time.perf_counter() - inicio_total)
+        return resultados
+
+
+def informe(resultados, segundos_total):
+    """Muestra el estado y la duración de cada tarea."""
+    if not resultados:
+        return
+    ancho = max(len(nombre) for nombre in resultados)
+    print("\n--- Informe del flujo ---")
+    for nombre, resultado in resultados.items():
+        print(f"  {nombre:<{ancho}}  {resultado['estado']:<10} {resultado['segundos']:8.1f} s")
+    suma = sum(r["segundos"] for r in resultados.values())
+    print(f"  Tiempo total: {segundos_total:.1f} s (suma de pasos: {suma:.1f} s)")
@@ -18,9 +18,13 @@ without Google Colab dependencies.
   - `idhm_2013_2022.csv` (simplified format for modeling: year;cod_mun;idhm)
 - Wraps execution logic in functions and a `main()` function.
 - Removes plotting code and verbose intermediate output.
+- Every stage (downloads, PDF extraction, processing, indices) is cached in
+  `.cache_idhm/` as Parquet, keyed by a hash of its inputs and of the stage
+  code, so a re-run only recomputes the stages whose code or inputs changed.
+  Downloads are reused for `DOWNLOAD_MAX_AGE` seconds.
 
 Run from anywhere:
-    $ python path/to/idhm_indice_desarrollo_humano_municipal.py
+    $ python path/to/idhm_indice_desarrollo_humano_municipal.py [--no-cache] [--refresh-downloads]
 """
 
 import requests
@@ -29,10 +33,26 @@ import numpy as np
 import os
 import io
 import re
+import json
+import time
+import hashlib
+import inspect
+import argparse
 import warnings
 import pdfplumber
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import sys
+
+# Shared ETL modules (ETL/tabla_vida.py, ETL/imputacion.py)
+ETL_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ETL_DIR))
+from tabla_vida import life_expectancy_at_birth
+from imputacion import fill_by_group
+# Shared INE HTTP client (repository root)
+sys.path.insert(0, str(ETL_DIR.parent))
+from ine_client import INEClientError, get_shared_client
 
 # --- Configuration ---
 # Suppress PDFMiner logging noise
@@ -50,9 +70,16 @@ AEAT_IRPF_CSV_URL = (
 )
 INE_MUNI_CODES_URL = "https://www.ine.es/daco/daco42/codmun/diccionario25.xlsx"
 INE_MORTALITY_TABLE_CODE = "27154"
-INE_MORTALITY_URL = f"https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{INE_MORTALITY_TABLE_CODE}?nult=999"
 INE_EDUCATION_TABLE_CODE = "65289"
-INE_EDUCATION_URL = f"https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{INE_EDUCATION_TABLE_CODE}?nult=999"
+
+# Stage cache
+STAGE_CACHE_FOLDER = ".cache_idhm"
+STAGE_CACHE_VERSION = "1" # Bump to invalidate every cached stage (e.g. after changing a shared helper)
+DOWNLOAD_MAX_AGE = 7 * 24 * 3600 # Seconds a cached download is reused before fetching it again
+
+# PDF extraction: pages are split into contiguous ranges processed in parallel
+PDF_MAX_WORKERS = os.cpu_count() or 1
+PDF_MIN_PAGES_PER_SHARD = 4
 
 
 # --- Helper Functions ---
@@ -101,6 +128,27 @@ def download_csv_to_dataframe(url, save_path: Path, sep=";", decimal=",", encodi
         print(f"❌ An unexpected error occurred during download/read of {save_path.name}: {e}")
         return None
 
+def download_ine_table_to_dataframe(table_code, save_path: Path, sep="\t", decimal=",", encoding="utf-8"):
+    """Downloads an INE DATOS_TABLA CSV through the shared INE client, saves it, and reads it into a DataFrame."""
+    print(f"Attempting to download INE table {table_code}...")
+    try:
+        client = get_shared_client()
+        content = client.get(client.url_tabla_csv(table_code))
+        with open(save_path, "wb") as f:
+            f.write(content)
+        print(f"Raw data saved to '{save_path}'.")
+
+        df = pd.read_csv(save_path, sep=sep, decimal=decimal, encoding=encoding)
+        print(f"Data successfully read into DataFrame from '{save_path.name}'.")
+        return df
+
+    except INEClientError as e:
+        print(f"❌ Error downloading INE table {table_code}: {e}")
+        return None
+    except pd.errors.ParserError as e:
+         print(f"❌ Error parsing CSV file '{save_path}': {e}")
+         return None
+
 def download_excel_to_dataframe(url, save_path: Path, skiprows=None, timeout=120):
     """Downloads an Excel file from a URL, saves it, and reads it into a DataFrame."""
     print(f"Attempting to download Excel from: {url}...")
@@ -126,23 +174,238 @@ def download_excel_to_dataframe(url, save_path: Path, skiprows=None, timeout=120
         print(f"❌ An unexpected error occurred during download/read of {save_path.name}: {e}")
         return None
 
+# --- Stage Cache ---
+
+def fingerprint(value) -> str:
+    """Content hash of a stage input (DataFrame, bytes, file-like or plain value)."""
+    h = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        h.update(repr([(str(c), str(t)) for c, t in value.dtypes.items()]).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, io.BytesIO):
+        h.update(value.getvalue())
+    elif isinstance(value, (bytes, bytearray)):
+        h.update(value)
+    elif isinstance(value, (set, frozenset)):
+        # Set iteration order changes between runs (hash randomization)
+        h.update(repr(sorted(value, key=repr)).encode("utf-8"))
+    else:
+        h.update(repr(value).encode("utf-8"))
+    return h.hexdigest()
+
+def is_etl_object(obj) -> bool:
+    """True for functions/classes defined in the ETL scripts (not in the stdlib or installed packages)."""
+    module = sys.modules.get(getattr(obj, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    return path is not None and ETL_DIR in Path(path).resolve().parents
+
+def referenced_globals(func) -> dict:
+    """Module-level names read by `func`, including from its nested functions and comprehensions."""
+    names = set()
+    pending = [func.__code__]
+    while pending:
+        code = pending.pop()
+        names.update(code.co_names)
+        pending.extend(c for c in code.co_consts if inspect.iscode(c))
+    return {name: func.__globals__[name] for name in sorted(names) if name in func.__globals__}
+
+def code_fingerprint(*objects) -> str:
+    """
+    Hash of the source code of the given functions/modules and of the module-level
+    constants the functions read.
+
+    Raises:
+        RuntimeError: If a function calls an ETL function or class that is not among
+            `objects` (nor defined in one of the given modules): editing it would not
+            invalidate the cached stage, so it has to be declared in `deps`.
+    """
+    h = hashlib.sha256(STAGE_CACHE_VERSION.encode("utf-8"))
+    declared_modules = {obj for obj in objects if inspect.ismodule(obj)}
+    undeclared = []
+    for obj in objects:
+        try:
+            h.update(inspect.getsource(obj).encode("utf-8"))
+        except (OSError, TypeError):
+            # No source file available (e.g. interactive session): fall back to the bytecode
+            h.update(obj.__code__.co_code)
+        if not inspect.isfunction(obj):
+            continue
+        for name, value in referenced_globals(obj).items():
+            if inspect.ismodule(value):
+                continue
+            if inspect.isfunction(value) or inspect.isclass(value):
+                if (is_etl_object(value) and value not in objects
+                        and sys.modules.get(value.__module__) not in declared_modules):
+                    undeclared.append(f"{obj.__name__} -> {name}")
+            elif not callable(value):
+                h.update(f"{name}={fingerprint(value)}".encode("utf-8"))
+    if undeclared:
+        raise RuntimeError(f"Stage code calls undeclared functions (add them to deps): {', '.join(undeclared)}")
+    return h.hexdigest()
+
+class StageCache:
+    """
+    Content-addressed cache of pipeline stages.
+
+    `run(stage, func, *inputs)` returns `func(*inputs)`, storing the result in
+    `directory` under a key that hashes the stage name, the source code of `func`
+    (plus `deps`, which must list every ETL function it calls), the module-level
+    constants they read and every input. DataFrames are stored as Parquet (pickle if
+    Parquet cannot represent them) and bytes as `.bin`; `None` results are never
+    stored. Only the latest entry of each stage is kept.
+    """
+
+    def __init__(self, directory: Path, enabled=True, refresh_downloads=False):
+        self.directory = directory
+        self.enabled = enabled
+        self.refresh_downloads = refresh_downloads
+        self.hits = 0
+        self.misses = 0
+        if enabled:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def _key(self, stage, func, deps, inputs, kwargs):
+        h = hashlib.sha256(stage.encode("utf-8"))
+        h.update(code_fingerprint(func, *deps).encode("utf-8"))
+        for value in list(inputs) + sorted(kwargs.items()):
+            h.update(fingerprint(value).encode("utf-8"))
+        return h.hexdigest()[:20]
+
+    def _load(self, meta_path: Path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        data_path = self.directory / meta["file"]
+        if meta["format"] == "bin":
+            return data_path.read_bytes()
+        if meta["format"] == "pickle":
+            return pd.read_pickle(data_path)
+        df = pd.read_parquet(data_path)
+        df.columns = meta["columns"] # Restores non-string column names (e.g. education levels 1-7)
+        return df
+
+    def _store(self, stage, key, result):
+        base = f"{stage}-{key}"
+        if isinstance(result, (bytes, bytearray, io.BytesIO)):
+            data = result.getvalue() if isinstance(result, io.BytesIO) else bytes(result)
+            file_name, fmt = f"{base}.bin", "bin"
+            (self.directory / file_name).write_bytes(data)
+            columns = None
+        else:
+            columns = list(result.columns)
+            file_name, fmt = f"{base}.parquet", "parquet"
+            try:
+                result.rename(columns=str).to_parquet(self.directory / file_name, index=True)
+            except Exception:
+                # Mixed-type object columns are not representable in Parquet
+                file_name, fmt = f"{base}.pkl", "pickle"
+                result.to_pickle(self.directory / file_name)
+        meta = {"stage": stage, "key": key, "file": file_name, "format": fmt,
+                "columns": columns, "created": time.time()}
+        with open(self.directory / f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        # Keep only the latest entry of this stage
+        for old in self.directory.glob(f"{stage}-*"):
+            if not old.name.startswith(base):
+                old.unlink()
+
+    def run(self, stage, func, *inputs, deps=(), max_age=None, **kwargs):
+        """Runs (or loads from cache) one stage. `max_age` (seconds) bounds the reuse of download stages."""
+        if not self.enabled:
+            return func(*inputs, **kwargs)
+        key = self._key(stage, func, deps, inputs, kwargs)
+        meta_path = self.directory / f"{stage}-{key}.json"
+        if meta_path.exists():
+            age = time.time() - meta_path.stat().st_mtime
+            expired = max_age is not None and (self.refresh_downloads or age > max_age)
+            if not expired:
+                try:
+                    result = self._load(meta_path)
+                    self.hits += 1
+                    print(f"♻️ Stage '{stage}' loaded from cache.")
+                    return result
+                except Exception as e:
+                    print(f"⚠️ Could not read cached stage '{stage}': {e}. Recomputing.")
+        self.misses += 1
+        result = func(*inputs, **kwargs)
+        if result is not None:
+            try:
+                self._store(stage, key, result)
+                # Continue with the stored version so later stages hash the same data on every run
+                result = self._load(meta_path)
+            except Exception as e:
+                print(f"⚠️ Could not cache stage '{stage}': {e}")
+        return result
+
+def download_pdf_bytes(url, timeout=120):
+    """Downloads a PDF and returns its raw bytes (cacheable form of `download_pdf_content`)."""
+    pdf_io = download_pdf_content(url, timeout=timeout)
+    return pdf_io.getvalue() if pdf_io is not None else None
+
+# --- PDF Extraction (page-range shards) ---
+
+MUNI_VARIABLE_PATTERN = re.compile(r"^(MUNI_\d{1,3})\s+(.*)$")
+EQUIVALENCY_TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+
+def pdf_page_shards(n_pages, max_workers=PDF_MAX_WORKERS, min_pages=PDF_MIN_PAGES_PER_SHARD):
+    """Splits pages [0, n_pages) into at most `max_workers` contiguous (start, end) ranges."""
+    n_shards = max(1, min(max_workers, n_pages // max(min_pages, 1)))
+    bounds = np.linspace(0, n_pages, n_shards + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def map_pdf_shards(pdf_bytes, shard_func, max_workers=PDF_MAX_WORKERS):
+    """
+    Runs `shard_func(pdf_bytes, start, end)` over page ranges of the PDF, in a
+    process pool when there is more than one range, and returns the results in
+    page order.
+    """
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        n_pages = len(pdf.pages)
+    shards = pdf_page_shards(n_pages, max_workers)
+    if len(shards) <= 1:
+        return [shard_func(pdf_bytes, start, end) for start, end in shards]
+    print(f"  Processing {n_pages} PDF pages in {len(shards)} parallel shards...")
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        # map() yields in submission order, i.e. in page order
+        return list(pool.map(shard_func, [pdf_bytes] * len(shards),
+                             [start for start, _ in shards], [end for _, end in shards]))
+
+def _extract_muni_variables_from_pages(pdf_bytes, start, end):
+    """(variable, literal) records found in pages [start, end)."""
+    records = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages[start:end]:
+            text = page.extract_text()
+            if not text: continue
+            for line in text.splitlines():
+                match = MUNI_VARIABLE_PATTERN.match(line.strip())
+                if match:
+                    variable = match.group(1)
+                    literal = re.sub(r"\s{2,}", " ", match.group(2)).strip()
+                    records.append((variable, literal))
+    return records
+
+def _extract_equivalency_rows_from_pages(pdf_bytes, start, end):
+    """(first 'MUNI_DEF' header, data rows) of the equivalency tables in pages [start, end)."""
+    encabezado = None
+    filas = []
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        for page in pdf.pages[start:end]:
+            # Adjust settings for better table extraction if needed
+            tables = page.extract_tables(table_settings=EQUIVALENCY_TABLE_SETTINGS)
+            for table in tables:
+                if table and table[0] and table[0][0] == "MUNI_DEF":
+                    if encabezado is None:
+                        encabezado = table[0]
+                    filas.extend(row for row in table[1:] if row and row[0] != "MUNI_DEF")
+    return encabezado, filas
+
 def extract_muni_variable_mapping(pdf_io):
     """Extracts MUNI_XXX variable mappings from the AEAT help PDF."""
     if pdf_io is None: return None
     print("Extracting AEAT variable mappings from PDF...")
-    pattern = re.compile(r"^(MUNI_\d{1,3})\s+(.*)$")
-    records = []
     try:
-        with pdfplumber.open(pdf_io) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if not text: continue
-                for line in text.splitlines():
-                    match = pattern.match(line.strip())
-                    if match:
-                        variable = match.group(1)
-                        literal = re.sub(r"\s{2,}", " ", match.group(2)).strip()
-                        records.append((variable, literal))
+        shard_records = map_pdf_shards(pdf_io.getvalue(), _extract_muni_variables_from_pages)
+        records = [record for shard in shard_records for record in shard]
         df = (pd.DataFrame(records, columns=["Variable", "Literal"])
                 .assign(order=lambda d: d["Variable"].str.extract(r"_(\d+)").astype(int))
                 .sort_values("order")
@@ -191,9 +454,7 @@ def impute_and_clean_irpf_data(df_processed):
 
     # Impute temporally within each municipality
     impute_cols = ["population", "renta_bruta_total", "renta_disponible_total"]
-    for col in impute_cols:
-        # Use transform with lambda for imputation
-        df[col] = df.groupby("codigo_aeat")[col].transform(lambda s: s.ffill().bfill())
+    df, _ = fill_by_group(df, "codigo_aeat", impute_cols)
 
     # Recalculate per capita income after imputation
     df["renta_disponible_per_capita"] = np.where(
@@ -248,18 +509,11 @@ def extract_aeat_ine_equivalencies(pdf_io):
     """Extracts AEAT to INE code equivalencies from the AEAT help PDF."""
     if pdf_io is None: return None
     print("Extracting AEAT-INE equivalency table from PDF...")
-    filas_acumuladas = []
-    encabezado_ref = None
     try:
-        with pdfplumber.open(pdf_io) as pdf:
-            for page in pdf.pages:
-                # Adjust settings for better table extraction if needed
-                tables = page.extract_tables(table_settings={"vertical_strategy": "lines", "horizontal_strategy": "lines"})
-                for table in tables:
-                    if table and table[0] and table[0][0] == "MUNI_DEF":
-                        if encabezado_ref is None:
-                            encabezado_ref = table[0]
-                        filas_acumuladas.extend(row for row in table[1:] if row and row[0] != "MUNI_DEF")
+        shard_results = map_pdf_shards(pdf_io.getvalue(), _extract_equivalency_rows_from_pages)
+        # Merge in page order: header from the first shard that has one, rows concatenated
+        encabezado_ref = next((encabezado for encabezado, _ in shard_results if encabezado is not None), None)
+        filas_acumuladas = [fila for _, filas in shard_results for fila in filas]
 
         if not filas_acumuladas or encabezado_ref is None:
             print("❌ No table with header 'MUNI_DEF' found in PDF.")
@@ -404,50 +658,38 @@ def calculate_health_index(df_mortality):
     if df_mortality is None: return None
     print("Calculating Life Expectancy (EV0) and Health Index (I_salud)...")
 
-    def ev0_from_m(m_series):
-        # Life table calculation using m(x) rates
-        ages = list(m_series.index)
-        m_x = m_series.values
-        l, T = 100_000.0, 0.0
-        for i, age in enumerate(ages):
-            m = m_x[i]
-            if pd.isna(m): continue # Skip if m(x) is NaN
-            # Define n (interval width) and a (average years lived in interval by those dying)
-            if age == 0: n, a = 1, 0.3
-            elif age == 1: n, a = 4, 1.5
-            elif age < 85: n, a = 5, 2.5
-            else: # Final open interval (85+)
-                if m > 0: T += l / m # Estimate T_85
-                l = 0 # Everyone dies eventually
-                break
-            # Calculate q(x) from m(x)
-            q = (n * m) / (1 + (n - a) * m) if (1 + (n - a) * m) != 0 else 1.0 # Avoid division by zero
-            q = min(q, 1.0) # Probability cannot exceed 1
-            d = l * q
-            Lx = n * l - d * (n - a) # Person-years lived in interval
-            T += Lx
-            l -= d # Survivors to next age
-            if l <= 0: break # Stop if no survivors
-        return round(T / 100_000.0, 2) if T > 0 else 0 # EV0 = T_0 / l_0
-
-    rows = []
     # Ensure Periodo is integer for grouping
     df_mortality['Periodo'] = pd.to_numeric(df_mortality['Periodo'], errors='coerce')
     df_mortality.dropna(subset=['Periodo'], inplace=True)
     df_mortality['Periodo'] = df_mortality['Periodo'].astype(int)
 
-    for (ccaa, year), grp in df_mortality.groupby(["ccaa_code", "Periodo"]):
-        # Pivot and handle missing sex data by averaging
-        piv = grp.pivot(index="Edad", columns="Sexo", values="prob_mortalidad")
-        if "Hombres" not in piv.columns and "Mujeres" in piv.columns: piv["Hombres"] = piv["Mujeres"]
-        if "Mujeres" not in piv.columns and "Hombres" in piv.columns: piv["Mujeres"] = piv["Hombres"]
-        if "Hombres" not in piv.columns or "Mujeres" not in piv.columns: continue # Skip if no sex data
-
-        m_mean = piv.mean(axis=1).sort_index() # Average mortality rate m(x)
-        ev0 = ev0_from_m(m_mean)
-        rows.append({"CODAUTO": ccaa, "year": year, "EV0": ev0})
+    # Average mortality rate m(x) of both sexes (or the only one available) per CCAA/year/age
+    df_sexos = df_mortality[df_mortality["Sexo"].isin(["Hombres", "Mujeres"])]
+    m_mean = df_sexos.groupby(["ccaa_code", "Periodo", "Edad"])["prob_mortalidad"].mean()
+    if m_mean.empty:
+        print("❌ No mortality rates by sex available to calculate EV0.")
+        return None
 
-    ev = pd.DataFrame(rows)
+    # 3-D array CCAA x year x age for the vectorized life table
+    ccaa_codes = m_mean.index.get_level_values("ccaa_code").unique().sort_values()
+    years = m_mean.index.get_level_values("Periodo").unique().sort_values()
+    ages = m_mean.index.get_level_values("Edad").unique().sort_values()
+    cube = (
+        m_mean.unstack("Edad")
+        .reindex(index=pd.MultiIndex.from_product([ccaa_codes, years]), columns=ages)
+        .to_numpy()
+        .reshape(len(ccaa_codes), len(years), len(ages))
+    )
+    ev0 = life_expectancy_at_birth(cube, ages.to_numpy())
+
+    ev = pd.DataFrame({
+        "CODAUTO": np.repeat(ccaa_codes.to_numpy(), len(years)),
+        "year": np.tile(years.to_numpy(), len(ccaa_codes)),
+        "EV0": ev0.ravel().round(2),
+    })
+    # Keep only the CCAA/year combinations present in the data
+    present = m_mean.index.droplevel("Edad").unique()
+    ev = ev[pd.MultiIndex.from_arrays([ev["CODAUTO"], ev["year"]]).isin(present)].reset_index(drop=True)
     ev["I_salud"] = ((ev["EV0"] - 20) / 65).clip(0, 1) # Normalize and clip
     print("EV0 and I_salud calculated.")
     return ev
@@ -601,9 +843,16 @@ def calculate_idhm(df_final_panel):
 
 def main():
     """Main function to orchestrate the IDHM calculation workflow."""
+    parser = argparse.ArgumentParser(description="Calculates the municipal IDHM for Spain.")
+    parser.add_argument("--no-cache", action="store_true", help="Run every stage without reading or writing the stage cache.")
+    parser.add_argument("--refresh-downloads", action="store_true", help="Download the source files again even if cached ones are recent.")
+    args = parser.parse_args()
+
     print("--- Starting Municipal Human Development Index (IDHM) Calculation ---")
     script_dir = get_script_directory()
     print(f"Using script directory: {script_dir}")
+    cache = StageCache(script_dir / STAGE_CACHE_FOLDER, enabled=not args.no_cache,
+                       refresh_downloads=args.refresh_downloads)
 
     # --- Define file paths ---
     path_aeat_help_pdf = script_dir / "AEAT_AyudaCSV_AnuarioMunicipal.pdf" # Optional saving
@@ -632,24 +881,29 @@ def main():
 
     # === Part 1: AEAT Income Data Processing ===
     print("\n--- Part 1: Processing AEAT Income Data ---")
-    # Optional: Download and extract AEAT variable mapping
-    # pdf_content_help = download_pdf_content(AEAT_HELP_PDF_URL)
-    # df_var_map = extract_muni_variable_mapping(pdf_content_help)
+    # The AEAT help PDF is downloaded once and used for both the variable mapping and the equivalencies
+    pdf_help_bytes = cache.run("download_aeat_help_pdf", download_pdf_bytes, AEAT_HELP_PDF_URL,
+                               deps=(download_pdf_content,), max_age=DOWNLOAD_MAX_AGE)
+    # Optional: Extract AEAT variable mapping
+    # df_var_map = cache.run("aeat_variable_mapping", extract_muni_variable_mapping, io.BytesIO(pdf_help_bytes),
+    #                        deps=(map_pdf_shards, pdf_page_shards, _extract_muni_variables_from_pages))
     # if df_var_map is not None: df_var_map.to_csv(path_muni_var_map, index=False, encoding='utf-8')
 
     # Download and process IRPF data
-    df_aeat_raw = download_csv_to_dataframe(
+    df_aeat_raw = cache.run(
+        "download_aeat_irpf", download_csv_to_dataframe,
         AEAT_IRPF_CSV_URL, path_aeat_irpf_csv,
         sep=";", decimal=",", encoding="latin-1",
-        dtype={"MUNI_DEF": "int32", "EJER": "int16"} # Specify dtypes for faster read
+        dtype={"MUNI_DEF": "int32", "EJER": "int16"}, # Specify dtypes for faster read
+        max_age=DOWNLOAD_MAX_AGE,
     )
-    df_irpf_processed = process_aeat_irpf_data(df_aeat_raw)
+    df_irpf_processed = cache.run("irpf_processed", process_aeat_irpf_data, df_aeat_raw)
     if df_irpf_processed is not None: df_irpf_processed.to_csv(path_irpf_processed, index=False, encoding='utf-8')
 
-    df_irpf_imputed = impute_and_clean_irpf_data(df_irpf_processed)
+    df_irpf_imputed = cache.run("irpf_imputed", impute_and_clean_irpf_data, df_irpf_processed, deps=(fill_by_group,))
     if df_irpf_imputed is not None: df_irpf_imputed.to_csv(path_irpf_imputed, index=False, encoding='utf-8')
 
-    df_irpf_full_series = filter_full_series(df_irpf_imputed)
+    df_irpf_full_series = cache.run("irpf_full_series", filter_full_series, df_irpf_imputed)
     if df_irpf_full_series is not None: df_irpf_full_series.to_csv(path_irpf_full_series, index=False, encoding='utf-8')
     else:
         print("❌ Exiting: Failed to create full series income data.")
@@ -657,21 +911,25 @@ def main():
 
     # === Part 2: Code Mapping (AEAT -> INE) ===
     print("\n--- Part 2: Mapping AEAT to INE Codes ---")
-    # Download AEAT Help PDF again for equivalency table if not done yet
-    pdf_content_help_equiv = download_pdf_content(AEAT_HELP_PDF_URL)
-    df_equiv_raw = extract_aeat_ine_equivalencies(pdf_content_help_equiv)
+    # Equivalency table from the AEAT help PDF (downloaded in Part 1)
+    df_equiv_raw = None
+    if pdf_help_bytes is not None:
+        # Keyed by the PDF's SHA-256 and the extraction code: only re-extracted when either changes
+        df_equiv_raw = cache.run("aeat_ine_equivalencies_raw", extract_aeat_ine_equivalencies, io.BytesIO(pdf_help_bytes),
+                                 deps=(map_pdf_shards, pdf_page_shards, _extract_equivalency_rows_from_pages))
     if df_equiv_raw is not None: df_equiv_raw.to_csv(path_aeat_ine_equiv_raw, index=False, encoding='utf-8')
 
-    df_equiv_clean = clean_equivalency_table(df_equiv_raw)
+    df_equiv_clean = cache.run("aeat_ine_equivalencies_clean", clean_equivalency_table, df_equiv_raw)
     if df_equiv_clean is not None: df_equiv_clean.to_csv(path_aeat_ine_equiv_clean, index=False, encoding='utf-8')
 
     # Download and process INE codes dictionary
-    df_ine_raw_codes = download_excel_to_dataframe(INE_MUNI_CODES_URL, path_ine_muni_codes_excel, skiprows=1)
-    df_ine_codes = process_ine_municipality_codes(df_ine_raw_codes)
+    df_ine_raw_codes = cache.run("download_ine_muni_codes", download_excel_to_dataframe,
+                                 INE_MUNI_CODES_URL, path_ine_muni_codes_excel, skiprows=1, max_age=DOWNLOAD_MAX_AGE)
+    df_ine_codes = cache.run("ine_muni_codes", process_ine_municipality_codes, df_ine_raw_codes)
     if df_ine_codes is not None: df_ine_codes.to_csv(path_ine_muni_codes_csv, index=False, encoding='utf-8')
 
     # Perform the mapping
-    df_irpf_mapped = map_codes_and_names(df_irpf_full_series, df_equiv_clean, df_ine_codes)
+    df_irpf_mapped = cache.run("irpf_mapped", map_codes_and_names, df_irpf_full_series, df_equiv_clean, df_ine_codes)
     if df_irpf_mapped is not None: df_irpf_mapped.to_csv(path_irpf_mapped, index=False, encoding='utf-8')
     else:
         print("❌ Exiting: Failed to map INE codes to income data.")
@@ -679,14 +937,16 @@ def main():
 
     # === Part 3: Health Dimension (Mortality -> EV0 -> I_salud) ===
     print("\n--- Part 3: Processing Health Dimension ---")
-    df_mort_raw = download_csv_to_dataframe(
-        INE_MORTALITY_URL, path_ine_mortality_csv,
-        sep="\t", decimal=",", encoding="utf-8" # Note: INE uses TAB separator here
+    df_mort_raw = cache.run(
+        "download_ine_mortality", download_ine_table_to_dataframe,
+        INE_MORTALITY_TABLE_CODE, path_ine_mortality_csv,
+        max_age=DOWNLOAD_MAX_AGE,
     )
-    df_mort_processed = process_ine_mortality_data(df_mort_raw)
+    df_mort_processed = cache.run("mortality_processed", process_ine_mortality_data, df_mort_raw)
     if df_mort_processed is not None: df_mort_processed.to_csv(path_mortality_processed, index=False, encoding='utf-8')
 
-    df_health = calculate_health_index(df_mort_processed)
+    df_health = cache.run("health_index", calculate_health_index, df_mort_processed,
+                          deps=(sys.modules[life_expectancy_at_birth.__module__],))
     if df_health is not None: df_health.to_csv(path_health_index, index=False, encoding='utf-8')
     else:
         print("❌ Exiting: Failed to calculate health index.")
@@ -698,8 +958,7 @@ def main():
     if panel_with_health[['EV0', 'I_salud']].isna().any().any():
          print("⚠️ Warning: NaNs introduced when merging health index. Check CODAUTO/year matching.")
          # Optional: Impute missing health data (e.g., with national avg or ffill/bfill by CODAUTO)
-         panel_with_health['I_salud'] = panel_with_health.groupby('CODAUTO')['I_salud'].transform(lambda s: s.ffill().bfill())
-         panel_with_health['EV0'] = panel_with_health.groupby('CODAUTO')['EV0'].transform(lambda s: s.ffill().bfill())
+         panel_with_health, _ = fill_by_group(panel_with_health, 'CODAUTO', ['I_salud', 'EV0'])
          panel_with_health.dropna(subset=['I_salud'], inplace=True) # Drop if still NaN after imputation
 
     if panel_with_health is not None: panel_with_health.to_csv(path_panel_with_health, index=False, encoding='utf-8')
@@ -707,14 +966,15 @@ def main():
 
     # === Part 4: Education Dimension (Levels -> I_educ) ===
     print("\n--- Part 4: Processing Education Dimension ---")
-    df_edu_raw = download_csv_to_dataframe(
-        INE_EDUCATION_URL, path_ine_education_csv,
-        sep="\t", decimal=",", encoding="utf-8" # Note: INE uses TAB separator
+    df_edu_raw = cache.run(
+        "download_ine_education", download_ine_table_to_dataframe,
+        INE_EDUCATION_TABLE_CODE, path_ine_education_csv,
+        max_age=DOWNLOAD_MAX_AGE,
     )
-    df_edu_processed = process_ine_education_data(df_edu_raw)
+    df_edu_processed = cache.run("education_processed", process_ine_education_data, df_edu_raw)
     if df_edu_processed is not None: df_edu_processed.to_csv(path_education_processed, index=False, encoding='utf-8')
 
-    df_education = calculate_education_index(df_edu_processed)
+    df_education = cache.run("education_index", calculate_education_index, df_edu_processed)
     if df_education is not None: df_education.to_csv(path_education_index, index=False, encoding='utf-8')
     else:
         print("❌ Exiting: Failed to calculate education index.")
@@ -726,7 +986,7 @@ def main():
     if panel_with_education['I_educ'].isna().any().any():
         print("⚠️ Warning: NaNs found for I_educ after merge. Imputing by CODAUTO...")
         panel_with_education = panel_with_education.sort_values(["CODAUTO", "year"])
-        panel_with_education["I_educ"] = panel_with_education.groupby("CODAUTO")["I_educ"].transform(lambda s: s.ffill().bfill())
+        panel_with_education, _ = fill_by_group(panel_with_education, "CODAUTO", "I_educ")
         # If NaNs remain (e.g., a CODAUTO has no education data at all), consider dropping or alternative imputation
         panel_with_education.dropna(subset=['I_educ'], inplace=True)
 
@@ -735,13 +995,13 @@ def main():
 
     # === Part 5: Income Index and Final IDHM Calculation ===
     print("\n--- Part 5: Calculating Income Index and Final IDHM ---")
-    panel_with_income = calculate_income_index(panel_with_education)
+    panel_with_income = cache.run("income_index", calculate_income_index, panel_with_education)
     if panel_with_income is not None: panel_with_income.to_csv(path_panel_with_income, index=False, encoding='utf-8')
     else:
         print("❌ Exiting: Failed to calculate income index.")
         return
 
-    df_final_idhm = calculate_idhm(panel_with_income)
+    df_final_idhm = cache.run("idhm", calculate_idhm, panel_with_income)
 
     if df_final_idhm is not None:
         # Save the full final dataset
@@ -762,6 +1022,8 @@ def main():
         print("❌ Exiting: Failed to calculate final IDHM.")
         return
 
+    if cache.enabled:
+        print(f"Stage cache: {cache.hits} stages reused, {cache.misses} computed.")
     print("\n--- IDHM Calculation Script Finished Successfully ---")
 
 
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+imputacion.py
+
+Grouped imputation helpers shared by the ETL scripts.
+
+`fill_by_group` replaces the per-group
+`groupby(key)[col].transform(lambda s: s.ffill().bfill())` pattern (and the
+group-mean variant) with pandas' native grouped operations, for several
+columns at once, and reports how many cells each pass filled.
+
+Usage:
+    from imputacion import fill_by_group
+    df, filled = fill_by_group(df, "codigo_aeat", ["population", "renta_bruta_total"])
+"""
+
+import pandas as pd
+
+DEFAULT_PASSES = ("ffill", "bfill")
+SUPPORTED_PASSES = ("ffill", "bfill", "mean")
+
+
+def fill_by_group(df: pd.DataFrame, by, columns, passes=DEFAULT_PASSES, verbose=True):
+    """
+    Fills NaNs in `columns` within each group of `by`, applying `passes` in order.
+
+    Passes:
+        - "ffill": carry the last valid value forward (in the current row order).
+        - "bfill": carry the next valid value backward.
+        - "mean": use the mean of the group's valid values.
+
+    Each pass sees the result of the previous one, so ("ffill", "bfill") equals
+    `transform(lambda s: s.ffill().bfill())`. Rows whose group key is NaN are
+    left unchanged. Sort `df` beforehand if the fill direction matters.
+
+    Args:
+        df (pd.DataFrame): Input data (not modified).
+        by (str | list): Grouping column(s).
+        columns (str | list): Column(s) to fill.
+        passes (tuple): Passes to apply, in order.
+        verbose (bool): Print a one-line summary of the filled cells.
+
+    Returns:
+        tuple: (filled DataFrame, DataFrame of filled-cell counts indexed by
+        column with one column per pass).
+    """
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    unknown = [p for p in passes if p not in SUPPORTED_PASSES]
+    if unknown:
+        raise ValueError(f"Unsupported imputation pass(es): {unknown}. Use {SUPPORTED_PASSES}.")
+
+    out = df.copy()
+    # Group codes computed once (-1 for NaN keys, which are excluded from every pass)
+    codes = out.groupby(by, sort=False, dropna=True).ngroup()
+    valid_key = (codes >= 0).to_numpy()
+    codes = codes[valid_key]
+    filled = pd.DataFrame(0, index=columns, columns=list(passes), dtype="int64")
+
+    for fill_pass in passes:
+        current = out.loc[valid_key, columns]
+        grouped = current.groupby(codes, sort=False)
+        if fill_pass == "ffill":
+            result = grouped.ffill()
+        elif fill_pass == "bfill":
+            result = grouped.bfill()
+        else:
+            result = current.fillna(grouped.transform("mean"))
+        filled[fill_pass] = (current.isna() & result.notna()).sum()
+        out.loc[valid_key, columns] = result
+
+    if verbose:
+        per_pass = ", ".join(f"{p}: {int(filled[p].sum())}" for p in passes)
+        print(f"  Filled {int(filled.to_numpy().sum())} cells in {columns} by {by} ({per_pass}).")
+    return out, filled
@@ -184,79 +184,61 @@ def merge_with_geo_codes(df_data, df_codigos):
 
 
 def interpolate_data(df_clean_provincias):
-    """Performs linear interpolation for each province and year."""
+    """
+    Performs linear interpolation by single year of age for each province and year.
+
+    All (province, year) groups are handled at once: every age point emits the
+    ages up to the next point of its group (none if the next age is not greater),
+    and the last point of each group emits itself. Values follow
+    `np.linspace(t_start, t_end, num, endpoint=False)` within each segment.
+    """
     if df_clean_provincias is None:
         print("❌ Cannot interpolate, input DataFrame is missing.")
         return None
 
     print("Starting data interpolation by age for all province-year groups...")
-    interpolated_all = []
-    try:
-        # Use dropna=False to handle potential NaNs in grouping columns if any slipped through
-        grouped = df_clean_provincias.groupby(["provincias_name", "periodo"], dropna=False)
-        num_groups = grouped.ngroups
-    except KeyError as e:
-        print(f"❌ Interpolation failed: Missing column for grouping: {e}")
+    keys = ["provincias_name", "periodo"]
+    missing = [col for col in keys + ["edad_inicio", "total"] if col not in df_clean_provincias.columns]
+    if missing:
+        print(f"❌ Interpolation failed: Missing column for grouping: {missing}")
         return None
 
-    processed_groups = 0
-
-    for (provincia, periodo), grupo in grouped:
-        # Check for NaN in grouping keys
-        if pd.isna(provincia) or pd.isna(periodo):
-            print(f"  Skipping interpolation for group with NaN key: Provincia='{provincia}', Periodo='{periodo}'")
-            continue
-
-        processed_groups += 1
-        if processed_groups % 500 == 0: # Reduced frequency progress update
-             print(f"  Interpolating group {processed_groups}/{num_groups}...")
-
-        grupo_sorted = grupo.sort_values("edad_inicio").reset_index()
-        # Ensure 'total' is numeric before using it
-        grupo_sorted['total'] = pd.to_numeric(grupo_sorted['total'], errors='coerce')
-        # Drop rows where 'total' became NaN as they can't be interpolated
-        grupo_sorted.dropna(subset=['total'], inplace=True)
-
-        edad_inicio_pts = grupo_sorted["edad_inicio"].astype(int).values
-        total_inicio_pts = grupo_sorted["total"].values
-
-
-        if len(edad_inicio_pts) < 2:
-            if len(edad_inicio_pts) == 1: # Add single point if only one exists
-                 interpolated_all.append({
-                     "provincias_name": provincia, "periodo": periodo,
-                     "edad": edad_inicio_pts[0], "total_interpolado": total_inicio_pts[0]
-                 })
-            continue # Skip if less than 2 points
-
-        for i in range(len(edad_inicio_pts) - 1):
-            e_start, e_end = edad_inicio_pts[i], edad_inicio_pts[i + 1]
-            t_start, t_end = total_inicio_pts[i], total_inicio_pts[i + 1]
-
-            # Skip if start or end total is NaN
-            if pd.isna(t_start) or pd.isna(t_end):
-                print(f"  Skipping segment for {provincia} ({periodo}) due to NaN totals between ages {e_start}-{e_end}.")
-                continue
-
-            edades = np.arange(e_start, e_end)
-            num_points = len(edades)
-
-            if num_points > 0:
-                totales = np.linspace(t_start, t_end, num=num_points, endpoint=False)
-                for edad, total in zip(edades, totales):
-                    interpolated_all.append({
-                        "provincias_name": provincia, "periodo": periodo,
-                        "edad": edad, "total_interpolado": total
-                    })
-
-        # Add the last point explicitly, only if its total is not NaN
-        if len(edad_inicio_pts) > 0 and pd.notna(total_inicio_pts[-1]):
-             interpolated_all.append({
-                 "provincias_name": provincia, "periodo": periodo,
-                 "edad": edad_inicio_pts[-1], "total_interpolado": total_inicio_pts[-1]
-             })
-
-    df_total_interpolado = pd.DataFrame(interpolated_all)
+    puntos = df_clean_provincias[keys + ["edad_inicio", "total"]].copy()
+    nan_keys = puntos[keys].isna().any(axis=1)
+    if nan_keys.any():
+        print(f"  Skipping interpolation for {int(nan_keys.sum())} rows with NaN Provincia/Periodo.")
+        puntos = puntos[~nan_keys]
+    # Rows whose 'total' is not numeric can't be interpolated
+    puntos["total"] = pd.to_numeric(puntos["total"], errors="coerce")
+    puntos = puntos.dropna(subset=["total"])
+    if puntos.empty:
+        print("Interpolation finished. Generated 0 total rows.")
+        return pd.DataFrame(columns=keys + ["edad", "total_interpolado"])
+
+    # Same order as iterating the groupby and sorting each group by age
+    puntos = puntos.sort_values(keys + ["edad_inicio"], kind="mergesort")
+    edad = puntos["edad_inicio"].to_numpy().astype(int)
+    total = puntos["total"].to_numpy(dtype=float)
+    grupo = puntos.groupby(keys, sort=False).ngroup().to_numpy()
+
+    ultimo = np.ones(len(puntos), dtype=bool)
+    ultimo[:-1] = grupo[1:] != grupo[:-1]
+    edad_sig = np.roll(edad, -1)
+    total_sig = np.roll(total, -1)
+    # Ages generated by each point: its segment [edad, edad_sig) or, for the last point, itself
+    n_edades = np.where(ultimo, 1, np.maximum(edad_sig - edad, 0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        paso = np.where(ultimo | (n_edades == 0), 0.0, (total_sig - total) / np.maximum(n_edades, 1))
+
+    origen = np.repeat(np.arange(len(puntos)), n_edades)
+    k = np.arange(len(origen)) - np.repeat(np.cumsum(n_edades) - n_edades, n_edades)
+
+    df_total_interpolado = pd.DataFrame({
+        "provincias_name": puntos["provincias_name"].to_numpy()[origen],
+        "periodo": puntos["periodo"].to_numpy()[origen],
+        "edad": edad[origen] + k,
+        "total_interpolado": k * paso[origen] + total[origen],
+    })
     print(f"Interpolation finished. Generated {len(df_total_interpolado)} total rows.")
     return df_total_interpolado
 
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+lector_excel.py
+
+Excel sheet reader with a per-sheet Parquet cache, shared by the ETL scripts.
+
+`read_sheet` reads a single sheet of an .xls/.xlsx workbook as a raw grid
+(`header=None`, integer column labels) with the fastest available engine
+(calamine if `python-calamine` is installed, otherwise pandas' default
+xlrd/openpyxl), and stores it as `<cache_dir>/<key>.parquet`. The key is the
+SHA-256 of the workbook bytes, the sheet name and the engine, so a sheet is
+only parsed again when the file changes.
+
+Cached grids are Parquet-safe: columns that mix text and numbers (header rows
+above numeric data) are stored as text, with `str()` of each value. Callers
+that need numbers convert them with `pd.to_numeric`, as they did already.
+
+Usage:
+    from lector_excel import read_sheet
+    df = read_sheet("liquidacion_2020.xls", "Participación por Variables")
+"""
+
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+    ENGINE = "calamine"
+except ImportError:
+    ENGINE = None  # pandas picks xlrd (.xls) or openpyxl (.xlsx)
+
+CACHE_FOLDER = ".cache_excel"
+CACHE_VERSION = "1"
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    """SHA-256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sheet_cache_key(path, sheet, engine=ENGINE):
+    """Cache key of `sheet` in the workbook at `path` (content-addressed)."""
+    parts = [CACHE_VERSION, file_sha256(path), str(sheet), str(engine)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def to_parquet_safe(df):
+    """
+    Returns a copy of the raw grid that pyarrow can store.
+
+    Numeric and all-text columns are kept as they are; in columns mixing types
+    every non-null value becomes `str(value)`. Column labels become strings.
+    """
+    out = df.copy()
+    for col in out.columns:
+        serie = out[col]
+        if serie.dtype != object:
+            continue
+        valores = serie.dropna()
+        if valores.map(type).nunique() > 1:
+            out[col] = serie.map(lambda v: v if pd.isna(v) else str(v)).astype(object)
+    out.columns = [str(col) for col in out.columns]
+    return out
+
+
+def _write_parquet_atomic(df, path):
+    """Writes `df` to `path` through a temporary file + rename (safe across processes)."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def read_sheet(path, sheet, cache_dir=CACHE_FOLDER, use_cache=True, engine=ENGINE):
+    """
+    Reads one sheet of an Excel workbook as a raw grid, using the Parquet cache.
+
+    Args:
+        path (str): Path to the .xls/.xlsx workbook.
+        sheet (str | int): Sheet name (or position).
+        cache_dir (str): Cache directory (created if needed).
+        use_cache (bool): False to always parse the workbook (and not store it).
+        engine (str | None): pandas Excel engine; None for pandas' default.
+
+    Returns:
+        pd.DataFrame: Every cell of the sheet (`header=None`), with integer
+        column labels 0..n-1 and a RangeIndex.
+    """
+    if not use_cache:
+        return pd.read_excel(path, sheet_name=sheet, header=None, engine=engine)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{sheet_cache_key(path, sheet, engine)}.parquet")
+    if not os.path.exists(cache_path):
+        df = pd.read_excel(path, sheet_name=sheet, header=None, engine=engine)
+        _write_parquet_atomic(to_parquet_safe(df), cache_path)
+
+    # The grid is always returned from the cache so hits and misses look the same
+    df = pd.read_parquet(cache_path)
+    df.columns = range(df.shape[1])
+    return df
+
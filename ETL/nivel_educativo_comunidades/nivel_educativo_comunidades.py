@@ -25,10 +25,13 @@ import io
 import sys
 from pathlib import Path
 import warnings
-import requests
 import pandas as pd
 import matplotlib.pyplot as plt
 
+# Cliente HTTP compartido del INE (en la raíz del repositorio)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from ine_client import get_shared_client
+
 ###############################################################################
 # 0. Utilidades comunes                                                       #
 ###############################################################################
@@ -51,12 +54,11 @@ BRAZIL_URL = (
 )
 
 def load_brazil_reference(url: str = BRAZIL_URL) -> pd.DataFrame:
-    """Descarga el CSV brasileño y lo devuelve como DataFrame."""
+    """Descarga el CSV brasileño (con la sesión y la caché del cliente compartido) y lo devuelve como DataFrame."""
     print("\n📥 Descargando referencia de Brasil …", end=" ")
-    resp = requests.get(url, timeout=60)
-    resp.raise_for_status()
+    contenido = get_shared_client().get(url)
     print("ok")
-    return pd.read_csv(io.StringIO(resp.content.decode("utf-8")))
+    return pd.read_csv(io.StringIO(contenido.decode("utf-8")))
 
 
 ###############################################################################
@@ -66,12 +68,9 @@ def load_brazil_reference(url: str = BRAZIL_URL) -> pd.DataFrame:
 def download_ine_csv(table_code: str = "65289") -> Path:
     """Descarga la tabla TEM‑PUS del INE en formato CSV dentro de *data_final*."""
     out_dir = ensure_output_dir()
-    url = f"https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{table_code}?nult=999"
     print(f"📥 Descargando tabla INE {table_code} …", end=" ")
-    resp = requests.get(url, timeout=60)
-    resp.raise_for_status()
     csv_path = out_dir / f"tabla_{table_code}.csv"
-    csv_path.write_text(resp.content.decode("utf-8"), encoding="utf-8")
+    csv_path.write_text(get_shared_client().get_table_csv(table_code), encoding="utf-8")
     print("guardada →", csv_path.relative_to(csv_path.parent.parent))
     return csv_path
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+tabla_vida.py
+
+Vectorized abridged life tables (NumPy) shared by the ETL scripts.
+
+`life_table` takes an array of central death rates m(x) whose last axis is age
+(e.g. region x year x age) and returns q(x), l(x), d(x), L(x), T(x) and e(x)
+for every cell at once; `life_expectancy_at_birth` returns e(0) with the shape
+of the leading axes. The method is the one used so far in the IDHM script:
+
+- Age groups 0, 1-4, 5-9, ..., 80-84 with widths n = 1, 4, 5 and average years
+  lived by those dying a = 0.3, 1.5, 2.5.
+- q(x) = n*m / (1 + (n - a)*m), capped at 1 (1 if the denominator is 0).
+- The first age >= 85 with a known rate is the open interval: L = l / m (0 if
+  m <= 0) and everyone dies; later ages are ignored.
+- Ages whose m(x) is NaN are skipped (nobody dies and no years are lived there).
+
+Usage:
+    from tabla_vida import life_expectancy_at_birth
+    ev0 = life_expectancy_at_birth(m, ages)   # m: (..., n_ages), ages: (n_ages,)
+"""
+
+import numpy as np
+
+RADIX = 100_000.0
+OPEN_AGE = 85
+
+
+def interval_parameters(ages):
+    """Width n and average years lived by those dying a, for each age (NaN from OPEN_AGE on)."""
+    ages = np.asarray(ages)
+    n = np.select([ages == 0, ages == 1, ages < OPEN_AGE], [1.0, 4.0, 5.0], np.nan)
+    a = np.select([ages == 0, ages == 1, ages < OPEN_AGE], [0.3, 1.5, 2.5], np.nan)
+    return n, a
+
+
+def life_table(m, ages, radix=RADIX):
+    """
+    Abridged life table for every cell of `m`.
+
+    Args:
+        m (array-like): Central death rates, shape (..., n_ages); NaN = unknown.
+        ages (array-like): Starting age of each age group, shape (n_ages,),
+            sorted in ascending order.
+        radix (float): l(0).
+
+    Returns:
+        dict: 'q', 'l', 'd', 'L', 'T', 'e' arrays with the same shape as `m`.
+        l(x) is the number alive at the start of each group, and e(x) = T(x)/l(x)
+        (NaN where l(x) is 0 or the age is skipped/after the open interval).
+    """
+    m = np.asarray(m, dtype=float)
+    ages = np.asarray(ages)
+    if m.shape[-1] != len(ages):
+        raise ValueError(f"Last axis of m has {m.shape[-1]} ages, expected {len(ages)}")
+    if np.any(np.diff(ages) <= 0):
+        raise ValueError("Ages must be sorted in ascending order without duplicates")
+
+    n, a = interval_parameters(ages)
+    known = ~np.isnan(m)
+    # Open interval: first age >= OPEN_AGE with a known rate
+    candidates = known & (ages >= OPEN_AGE)
+    has_open = candidates.any(axis=-1)
+    open_idx = np.argmax(candidates, axis=-1)
+    is_open = np.zeros(m.shape, dtype=bool)
+    np.put_along_axis(is_open, open_idx[..., None], has_open[..., None], axis=-1)
+    after_open = np.cumsum(is_open, axis=-1) - is_open > 0
+    closed = known & (ages < OPEN_AGE) & ~after_open
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = 1 + (n - a) * m
+        q = np.where(denom != 0, (n * m) / denom, 1.0)
+    q = np.where(closed, np.minimum(q, 1.0), 0.0)
+    q = np.where(is_open, 1.0, q)
+
+    l = np.empty(m.shape)
+    d = np.empty(m.shape)
+    L = np.zeros(m.shape)
+    l_x = np.full(m.shape[:-1], float(radix))
+    # Survivors depend on the previous age group, so only the (short) age axis is iterated
+    for i in range(len(ages)):
+        l[..., i] = l_x
+        d[..., i] = l_x * q[..., i]
+        if ages[i] < OPEN_AGE:
+            L[..., i] = np.where(closed[..., i], n[i] * l_x - d[..., i] * (n[i] - a[i]), 0.0)
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                L[..., i] = np.where(is_open[..., i] & (m[..., i] > 0), l_x / m[..., i], 0.0)
+        l_x = l_x - d[..., i]
+
+    T = np.flip(np.cumsum(np.flip(L, axis=-1), axis=-1), axis=-1)
+    valid = (closed | is_open) & (l > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        e = np.where(valid, T / l, np.nan)
+    return {"q": q, "l": l, "d": d, "L": L, "T": T, "e": e}
+
+
+def life_expectancy_at_birth(m, ages, radix=RADIX):
+    """
+    e(0) for every cell of `m` (shape (..., n_ages)), as an array of shape m.shape[:-1].
+
+    Cells without any known rate (or with T(0) <= 0) get 0.
+    """
+    table = life_table(m, ages, radix)
+    # Sequential sum from the youngest age up (same rounding as accumulating T age by age)
+    total = np.cumsum(table["L"], axis=-1)[..., -1]
+    return np.where(total > 0, total / radix, 0.0)
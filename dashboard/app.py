@@ -16,8 +16,8 @@ st.set_page_config(
 )
 
 # Conexión a la Base de Datos
-DB_FILENAME = "datawarehouse.db"
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data base", DB_FILENAME)
+DB_FILENAME = "datawarehouse_v2.db"
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database 2", DB_FILENAME)
 
 @st.cache_resource
 def get_engine():
@@ -220,7 +220,7 @@ with tab3:
         def get_table_names(_engine):
             try:
                 with _engine.connect() as conn:
-                    return pd.read_sql_query("SELECT name FROM sqlite_master WHERE type='table';", conn)['name'].tolist()
+                    return pd.read_sql_query("SELECT name FROM sqlite_master WHERE type IN ('table', 'view') ORDER BY name;", conn)['name'].tolist()
             except Exception as e:
                 st.error(f"Error al obtener tablas: {e}")
                 return []
@@ -0,0 +1,130 @@
+import argparse
+import ast
+import copy
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Comprobación de paridad y benchmark de enrich_geojson_features (página del mapa de densidad)
+# frente al bucle anterior, que buscaba cada municipio con tooltip_data.loc[mun_code].
+# La página es un script de Streamlit y no se puede importar: la función se toma de su código.
+# Features: las del GeoJSON de --geojson o, por defecto, N_MUNICIPIOS sintéticas; los datos del
+# tooltip son sintéticos, sin N_SIN_DATOS de los códigos y con features sin mun_code.
+# Sale con código 1 si las propiedades (valores o tipos) o los recuentos difieren.
+#   python dashboard/benchmark_enriquecer_geojson.py [--geojson RUTA] [--repeat N]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGINA_DENSIDAD = os.path.join(BASE_DIR, "pages", "🗺️_Mapa_Interactivo_Densidad_Población.py")
+N_MUNICIPIOS = 8131
+N_SIN_DATOS = 50
+
+
+def cargar_funcion_pagina(nombre, ruta=PAGINA_DENSIDAD):
+    """Compila solo la función `nombre` del script de la página."""
+    with open(ruta, encoding="utf-8") as f:
+        arbol = ast.parse(f.read())
+    nodo = next((n for n in arbol.body if isinstance(n, ast.FunctionDef) and n.name == nombre), None)
+    if nodo is None:
+        raise LookupError(f"No se encontró {nombre} en {ruta}")
+    espacio = {'pd': pd}
+    exec(compile(ast.Module([nodo], type_ignores=[]), ruta, "exec"), espacio)
+    return espacio[nombre]
+
+
+def enriquecer_por_feature(features, tooltip_data):
+    """Implementación anterior: una búsqueda .loc y cuatro conversiones por municipio."""
+    enriquecidas = sin_mun_code = sin_datos = 0
+    for feature in features:
+        feature_mun_code = feature.get('properties', {}).get('mun_code')
+        if feature_mun_code:
+            if feature_mun_code in tooltip_data.index:
+                data_row = tooltip_data.loc[feature_mun_code]
+                feature['properties']['mun_name'] = data_row['mun_name']
+                feature['properties']['poblacion'] = float(data_row['poblacion']) if pd.notnull(data_row['poblacion']) else 0
+                feature['properties']['area_km2'] = round(float(data_row['area_km2']), 2) if pd.notnull(data_row['area_km2']) else 0
+                feature['properties']['densidad_poblacion'] = round(float(data_row['densidad_poblacion']), 2) if pd.notnull(data_row['densidad_poblacion']) else 0
+                enriquecidas += 1
+            else:
+                sin_datos += 1
+                feature['properties']['mun_name'] = feature.get('properties', {}).get('mun_name', 'Desconocido')
+                feature['properties']['poblacion'] = 0
+                feature['properties']['area_km2'] = 0
+                feature['properties']['densidad_poblacion'] = 0
+        else:
+            sin_mun_code += 1
+            feature['properties']['mun_name'] = feature.get('properties', {}).get('mun_name', 'Sin Código Mun.')
+            feature['properties']['poblacion'] = 0
+            feature['properties']['area_km2'] = 0
+            feature['properties']['densidad_poblacion'] = 0
+    return enriquecidas, sin_mun_code, sin_datos
+
+
+def cargar_features(ruta_geojson):
+    """Features (solo propiedades) del GeoJSON, o sintéticas si no se indica ninguno."""
+    if ruta_geojson:
+        with open(ruta_geojson, encoding="utf-8") as f:
+            features = json.load(f)['features']
+        return [{'type': 'Feature', 'properties': dict(f['properties']), 'geometry': None} for f in features]
+    return [{'type': 'Feature', 'properties': {'mun_code': f"{i:05d}", 'mun_name': f"Municipio {i}"}, 'geometry': None}
+            for i in range(1001, 1001 + N_MUNICIPIOS)]
+
+
+def datos_tooltip(features, rng):
+    """Tabla del tooltip (índice mun_code) para todos los códigos menos N_SIN_DATOS, con algún NaN."""
+    codigos = sorted({f['properties']['mun_code'] for f in features if f['properties'].get('mun_code')})
+    codigos = codigos[:-N_SIN_DATOS]
+    n = len(codigos)
+    df = pd.DataFrame({
+        'mun_code': codigos,
+        'mun_name': [f"Nombre {c}" for c in codigos],
+        'poblacion': rng.integers(0, 3_000_000, n).astype(float),
+        'area_km2': rng.random(n) * 1500,
+    }).set_index('mun_code')
+    df['densidad_poblacion'] = df['poblacion'] / df['area_km2']
+    df.iloc[::97, df.columns.get_loc('area_km2')] = np.nan
+    return df
+
+
+def medir(func, features, tooltip_data, repeat):
+    """Mejor tiempo de `repeat` ejecuciones (cada una sobre una copia de las features) y el último resultado."""
+    mejor = float("inf")
+    for _ in range(repeat):
+        copia = copy.deepcopy(features)
+        inicio = time.perf_counter()
+        recuentos = func(copia, tooltip_data)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, recuentos, copia
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y benchmark de enrich_geojson_features.")
+    parser.add_argument("--geojson", help="GeoJSON de municipios con 'mun_code' en las propiedades")
+    parser.add_argument("--repeat", type=int, default=5, help="Ejecuciones por implementación (se muestra la mejor).")
+    args = parser.parse_args()
+
+    enrich_geojson_features = cargar_funcion_pagina('enrich_geojson_features')
+    features = cargar_features(args.geojson)
+    # Features sin mun_code (ausente y vacío)
+    features[3]['properties'].pop('mun_code', None)
+    features[4]['properties']['mun_code'] = ''
+    tooltip_data = datos_tooltip(features, np.random.default_rng(0))
+    print(f"Entrada: {len(features)} features, {len(tooltip_data)} municipios con datos")
+
+    t_antes, recuentos_antes, antes = medir(enriquecer_por_feature, features, tooltip_data, args.repeat)
+    t_despues, recuentos_despues, despues = medir(enrich_geojson_features, features, tooltip_data, args.repeat)
+
+    tipos = lambda fs: [{k: type(v) for k, v in f['properties'].items()} for f in fs]
+    if recuentos_antes != recuentos_despues or antes != despues or tipos(antes) != tipos(despues):
+        print(f"❌ Los resultados difieren (recuentos {recuentos_antes} frente a {recuentos_despues}).")
+        sys.exit(1)
+    print(f"✅ Paridad comprobada: propiedades y tipos idénticos; recuentos {recuentos_despues}.")
+    print(f"Por feature (.loc): {t_antes * 1000:.0f} ms | enrich_geojson_features: {t_despues * 1000:.0f} ms | "
+          f"aceleración: {t_antes / t_despues:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pandas as pd
+
+# Consultas al data warehouse (database 2/datawarehouse_v2.db) compartidas por las páginas del dashboard.
+# Los nombres de tabla y de columna no se pueden pasar como parámetros SQL: antes de interpolarlos
+# en la consulta se comprueba que estén declarados en el esquema del warehouse (database 2/esquema_dw.py).
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "database 2"))
+from esquema_dw import ESQUEMA, quote  # noqa: E402
+
+
+def columnas_declaradas(table_name):
+    """Columnas que esquema_dw.ESQUEMA declara para `table_name` (ValueError si la tabla no está declarada)."""
+    if table_name not in ESQUEMA:
+        raise ValueError(f"La tabla '{table_name}' no está declarada en esquema_dw.ESQUEMA")
+    return ESQUEMA[table_name]['columnas']
+
+
+def read_latest_year(_engine, table_name, columns=None):
+    """
+    Filas del último año de la tabla (todas las columnas, o solo `columns`); el MAX(year) y el filtro
+    usan su índice compuesto que empieza por year.
+
+    Raises:
+        ValueError: Si la tabla no está en esquema_dw.ESQUEMA, no declara `year` o alguna de
+            `columns` no está declarada.
+    """
+    declaradas = columnas_declaradas(table_name)
+    if 'year' not in declaradas:
+        raise ValueError(f"La tabla '{table_name}' no tiene columna year")
+    no_declaradas = [c for c in columns or [] if c not in declaradas]
+    if no_declaradas:
+        raise ValueError(f"Columnas no declaradas en '{table_name}': {no_declaradas}")
+
+    select = ", ".join(quote(c) for c in columns) if columns else "*"
+    tabla = quote(table_name)
+    query = f"SELECT {select} FROM {tabla} WHERE year = (SELECT MAX(year) FROM {tabla})"
+    return pd.read_sql_query(query, _engine)
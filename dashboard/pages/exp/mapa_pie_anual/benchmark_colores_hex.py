@@ -0,0 +1,191 @@
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+
+import branca.colormap as branca_cm
+import folium
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+
+from generar_mapa_pie import cargar_municipios, color_sin_datos, colores_hex, generar_mapa
+
+# Comprobación de paridad y benchmark de colores_hex (generar_mapa_pie.py) frente a la
+# style_function anterior, que reconstruía la escala YlGnBu_09 (con el mínimo y el máximo
+# de la columna) y llamaba a colormap(valor) para cada municipio.
+# Datos: datos_pie_mapa_<año>.csv de esta carpeta, con la misma transformación log10(valor + 1)
+# que generar_mapa, más casos límite (umbrales de la escala, NaN, escala de un único valor).
+# También mide generar_mapa completo (capa GeoJson + HTML) con la style_function anterior y con
+# la actual, y comprueba que cada municipio reciba el mismo fillColor. Geometrías: las del GeoJSON de
+# --geojson o, por defecto, una cuadrícula sintética con un cuadrado por municipio del CSV del año
+# más N_SIN_DATOS municipios sin datos (el GeoJSON del repositorio puede ser un puntero de Git LFS).
+# Sale con código 1 si algún color difiere.
+#   python dashboard/pages/exp/mapa_pie_anual/benchmark_colores_hex.py [--repeat N] [--anio AÑO] [--geojson RUTA]
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+N_SIN_DATOS = 50
+
+
+def colores_por_municipio(valores):
+    """Implementación anterior: escala y colormap(valor) recalculados en cada llamada a style_function."""
+    return [
+        branca_cm.linear.YlGnBu_09.scale(valores.min(), valores.max())(valor) if pd.notna(valor) else color_sin_datos
+        for valor in valores
+    ]
+
+
+def colores_vectorizados(valores):
+    colormap = branca_cm.linear.YlGnBu_09.scale(valores.min(), valores.max())
+    return list(colores_hex(colormap, valores))
+
+
+def cargar_valores():
+    """{año: Serie log10(valor_mapa + 1)} de los CSV de datos de los mapas anuales."""
+    series = {}
+    for ruta in sorted(glob.glob(os.path.join(CURRENT_DIR, "datos_pie_mapa_*.csv"))):
+        año = os.path.basename(ruta).removeprefix("datos_pie_mapa_").removesuffix(".csv")
+        df = pd.read_csv(ruta, dtype={'mun_code': str})
+        series[año] = np.log10(df['valor_mapa'].fillna(0) + 1)
+    return series
+
+
+def casos_limite():
+    """Valores que ejercitan las ramas de branca: umbrales exactos, extremos, NaN y escala constante."""
+    umbrales = pd.Series(branca_cm.linear.YlGnBu_09.scale(0, 8).index, dtype=float)
+    return {
+        'umbrales': pd.concat([umbrales, pd.Series([np.nan, 0.5, 7.999])], ignore_index=True),
+        'escala_constante': pd.Series([3.0, 3.0, np.nan]),
+    }
+
+
+class GeoJsonEstiloPorMunicipio(folium.GeoJson):
+    """folium.GeoJson con la style_function anterior de generar_mapa: escala y colormap(valor) en cada feature."""
+
+    def __init__(self, data, *args, **kwargs):
+        columna = 'valor_mapa_log' if 'valor_mapa_log' in data.columns else 'valor_mapa'
+        estilo = kwargs['style_function']
+
+        def style_function(feature):
+            valor = feature['properties'][columna]
+            return {
+                **estilo(feature),
+                'fillColor': branca_cm.linear.YlGnBu_09.scale(
+                    data[columna].min(),
+                    data[columna].max()
+                )(valor) if pd.notna(valor) else color_sin_datos,
+            }
+
+        kwargs['style_function'] = style_function
+        super().__init__(data, *args, **kwargs)
+
+
+def municipios_sinteticos(codigos):
+    """GeoDataFrame con un cuadrado por código, en una cuadrícula sobre la península."""
+    n = len(codigos)
+    return gpd.GeoDataFrame(
+        {'mun_code': codigos, 'mun_name': [f"Municipio {c}" for c in codigos],
+         'prov_name': 'Provincia', 'acom_name': 'Comunidad'},
+        geometry=[box(-9 + (i % 90) * 0.12, 36 + (i // 90) * 0.09,
+                      -9 + (i % 90) * 0.12 + 0.1, 36 + (i // 90) * 0.09 + 0.08) for i in range(n)],
+        crs=4326,
+    )
+
+
+def medir_generar_mapa(gdf_municipios, df_pie, anio, clase_geojson, ruta_html, repeat):
+    """Mejor tiempo de generar_mapa con `clase_geojson` como folium.GeoJson, y el fillColor de cada feature."""
+    capas = []
+
+    def crear_capa(*args, **kwargs):
+        capa = clase_geojson(*args, **kwargs)
+        capas.append(capa)
+        return capa
+
+    original = folium.GeoJson
+    folium.GeoJson = crear_capa
+    try:
+        mejor = float("inf")
+        for _ in range(repeat):
+            inicio = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                generar_mapa(gdf_municipios, df_pie, anio, ruta_html)
+            mejor = min(mejor, time.perf_counter() - inicio)
+    finally:
+        folium.GeoJson = original
+    # El HTML solo guarda los estilos distintos: se comparan los de cada feature de la última capa
+    capa = capas[-1]
+    return mejor, [capa.style_function(feature)['fillColor'] for feature in capa.data['features']]
+
+
+def medir(func, valores, repeat):
+    """Mejor tiempo de `repeat` ejecuciones y el último resultado."""
+    mejor = float("inf")
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        resultado = func(valores)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y benchmark de colores_hex frente a colormap(valor).")
+    parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones por implementación (se muestra la mejor).")
+    parser.add_argument("--anio", help="Año del CSV con el que se mide generar_mapa (por defecto, el último).")
+    parser.add_argument("--geojson", help="GeoJSON de municipios para generar_mapa (por defecto, geometrías sintéticas).")
+    args = parser.parse_args()
+
+    # Comprobación directa del caso de la revisión: escala de un único valor
+    esperado = branca_cm.linear.YlGnBu_09.scale(3, 3)(3)
+    obtenido = colores_hex(branca_cm.linear.YlGnBu_09.scale(3, 3), [3.0])[0]
+    if obtenido != esperado:
+        print(f"❌ scale(3, 3) en x=3: {obtenido} (branca: {esperado})")
+        sys.exit(1)
+
+    casos = {**casos_limite(), **cargar_valores()}
+    total_antes = total_despues = 0.0
+    for nombre, valores in casos.items():
+        t_antes, antes = medir(colores_por_municipio, valores, args.repeat)
+        t_despues, despues = medir(colores_vectorizados, valores, args.repeat)
+        distintos = [i for i, (a, b) in enumerate(zip(antes, despues)) if a != b]
+        if distintos:
+            i = distintos[0]
+            print(f"❌ {nombre}: {len(distintos)} colores distintos (p. ej. valor {valores.iloc[i]}: "
+                  f"{despues[i]} frente a {antes[i]})")
+            sys.exit(1)
+        total_antes += t_antes
+        total_despues += t_despues
+        print(f"  {nombre}: {len(valores)} valores, antes {t_antes:.3f} s | después {t_despues:.4f} s")
+
+    print(f"✅ Paridad comprobada en {len(casos)} casos.")
+    print(f"Total antes: {total_antes:.3f} s | después: {total_despues:.3f} s | "
+          f"aceleración: {total_antes / total_despues:.0f}x")
+
+    # --- generar_mapa completo ---
+    anio = args.anio or max(a for a in casos if a.isdigit())
+    df_pie = pd.read_csv(os.path.join(CURRENT_DIR, f"datos_pie_mapa_{anio}.csv"), dtype={'mun_code': str})
+    if args.geojson:
+        gdf_municipios = cargar_municipios(args.geojson)
+    else:
+        codigos = sorted(df_pie['mun_code']) + [f"X{i:04d}" for i in range(N_SIN_DATOS)]
+        gdf_municipios = municipios_sinteticos(codigos)
+    with tempfile.TemporaryDirectory() as tmp:
+        t_antes, estilos_antes = medir_generar_mapa(gdf_municipios, df_pie, anio, GeoJsonEstiloPorMunicipio,
+                                                    os.path.join(tmp, "antes.html"), args.repeat)
+        t_despues, estilos_despues = medir_generar_mapa(gdf_municipios, df_pie, anio, folium.GeoJson,
+                                                        os.path.join(tmp, "despues.html"), args.repeat)
+    if estilos_antes != estilos_despues:
+        distintos = sum(a != b for a, b in zip(estilos_antes, estilos_despues))
+        print(f"❌ generar_mapa {anio}: {distintos} municipios con distinto fillColor.")
+        sys.exit(1)
+    print(f"✅ generar_mapa {anio} ({len(estilos_despues)} municipios): mismo fillColor en cada uno.")
+    print(f"generar_mapa antes: {t_antes:.2f} s | después: {t_despues:.2f} s | "
+          f"aceleración: {t_antes / t_despues:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
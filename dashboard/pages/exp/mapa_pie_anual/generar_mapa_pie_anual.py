@@ -0,0 +1,215 @@
+import json
+import sqlite3
+
+import branca.colormap as branca_cm
+import numpy as np
+import pandas as pd
+import topojson as tp
+
+from explorar_pie import COLUMNAS_MAPA, TARGET_COLUMN, preparar_datos_mapa
+from generar_mapa_pie import cargar_municipios, geojson_path, map_location, map_zoom_start
+
+# Un único mapa para todos los años: la geometría (TopoJSON) se guarda una sola vez
+# y los valores de cada año van en una tabla compacta; el slider recolorea en el navegador.
+
+# --- Configuración ---
+# db_path es relativo al CWD (raíz del proyecto) desde donde se llama este script.
+db_path = 'database 2/datawarehouse_v2.db'
+output_map_filename = 'mapa_pie_municipios.html'
+
+PROPIEDADES_MUNICIPIO = ['mun_code', 'mun_name', 'prov_name', 'acom_name']
+# Mismos parámetros que ETL/GeoRef_Spain/TopoJSON/convert_to_topojson.py
+SIMPLIFICATION_TOLERANCE = 0.0001
+QUANTIZATION = 1e5
+DECIMALES_VALOR = 2
+
+# Escala de color de los mapas por año (YlGnBu_09 de branca, sobre log10(valor + 1))
+COLORES_ESCALA = [branca_cm.linear.YlGnBu_09.rgb_hex_str(v) for v in branca_cm.linear.YlGnBu_09.index]
+COLOR_SIN_DATOS = 'lightgray'
+
+
+def construir_topologia(gdf_municipios):
+    """TopoJSON de los municipios (objeto 'municipios') solo con las propiedades que usa el mapa."""
+    columnas = [c for c in PROPIEDADES_MUNICIPIO if c in gdf_municipios.columns]
+    gdf = gdf_municipios[columnas + [gdf_municipios.geometry.name]]
+    if gdf.crs is not None and gdf.crs != "EPSG:4326":
+        gdf = gdf.to_crs("EPSG:4326")
+    topo = tp.Topology(
+        gdf,
+        object_name="municipios",
+        prequantize=QUANTIZATION,
+        toposimplify=SIMPLIFICATION_TOLERANCE,
+    )
+    return json.loads(topo.to_json())
+
+
+def construir_tabla_valores(datos_por_año):
+    """
+    Tabla compacta de valores PIE por año.
+
+    Args:
+        datos_por_año: dict {año: DataFrame con 'mun_code' y 'valor_mapa'} (ver preparar_datos_mapa)
+
+    Returns:
+        dict {"años": [...], "valores": {año: {mun_code: valor}}, "dominios": {año: [min, max]}}
+        donde los dominios son los de log10(valor + 1) de cada año.
+    """
+    valores, dominios = {}, {}
+    for year in sorted(datos_por_año):
+        df = datos_por_año[year].dropna(subset=['valor_mapa'])
+        df = df[df['valor_mapa'] >= 0]
+        if df.empty:
+            continue
+        serie = df.set_index(df['mun_code'].astype(str))['valor_mapa'].round(DECIMALES_VALOR)
+        valores[str(year)] = serie.to_dict()
+        log_valores = np.log10(serie + 1)
+        dominios[str(year)] = [float(log_valores.min()), float(log_valores.max())]
+    return {"años": [int(y) for y in valores], "valores": valores, "dominios": dominios}
+
+
+def _json_para_script(obj):
+    """JSON compacto que se puede incrustar en un <script> sin cerrarlo."""
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).replace('</', '<\\/')
+
+
+def generar_mapa_anual(gdf_municipios, datos_por_año, output_map_path):
+    """Genera el HTML único con la geometría compartida y el selector de año."""
+    topologia = construir_topologia(gdf_municipios)
+    tabla = construir_tabla_valores(datos_por_año)
+    if not tabla["años"]:
+        raise ValueError("No hay valores PIE para ningún año")
+
+    html = (PLANTILLA_HTML
+            .replace('__TOPOLOGIA__', _json_para_script(topologia))
+            .replace('__TABLA__', _json_para_script(tabla))
+            .replace('__COLORES__', json.dumps(COLORES_ESCALA))
+            .replace('__COLOR_SIN_DATOS__', COLOR_SIN_DATOS)
+            .replace('__CENTRO__', json.dumps(map_location))
+            .replace('__ZOOM__', str(map_zoom_start)))
+    with open(output_map_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    print(f"Mapa con {len(tabla['años'])} años guardado en: {output_map_path}")
+    return tabla["años"]
+
+
+PLANTILLA_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.css"/>
+<script src="https://cdn.jsdelivr.net/npm/leaflet@1.9.3/dist/leaflet.js"></script>
+<script src="https://cdn.jsdelivr.net/npm/topojson-client@3/dist/topojson-client.min.js"></script>
+<style>
+    html, body, #mapa { width: 100%; height: 100%; margin: 0; padding: 0; }
+    .panel { background: white; padding: 6px 10px; border-radius: 4px; box-shadow: 0 1px 4px rgba(0,0,0,0.3);
+             font: 13px sans-serif; }
+    .panel input[type=range] { width: 220px; vertical-align: middle; }
+    .leyenda-barra { width: 220px; height: 10px; margin: 4px 0; }
+    .leyenda-extremos { display: flex; justify-content: space-between; }
+</style>
+</head>
+<body>
+<div id="mapa"></div>
+<script>
+    const topologia = __TOPOLOGIA__;
+    const tabla = __TABLA__;
+    const colores = __COLORES__;
+    const colorSinDatos = '__COLOR_SIN_DATOS__';
+
+    const formato = new Intl.NumberFormat('es-ES', {maximumFractionDigits: 2});
+    const anios = tabla['años'];
+    let anio = anios[anios.length - 1];
+
+    const mapa = L.map('mapa', {preferCanvas: true}).setView(__CENTRO__, __ZOOM__);
+    L.tileLayer('https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png', {
+        attribution: '&copy; OpenStreetMap contributors &copy; CARTO', subdomains: 'abcd', maxZoom: 20
+    }).addTo(mapa);
+
+    // Interpolación lineal entre los colores de la escala (como branca.LinearColormap)
+    function hexARgb(hex) { return [1, 3, 5].map(i => parseInt(hex.substr(i, 2), 16)); }
+    const rgbEscala = colores.map(hexARgb);
+    function colorEscala(t) {
+        t = Math.min(1, Math.max(0, t));
+        const pos = t * (rgbEscala.length - 1), i = Math.min(Math.floor(pos), rgbEscala.length - 2), f = pos - i;
+        const c = rgbEscala[i].map((v, k) => Math.round(v + f * (rgbEscala[i + 1][k] - v)));
+        return 'rgb(' + c.join(',') + ')';
+    }
+    function valor(codigo) { return tabla.valores[anio][codigo]; }
+    function color(codigo) {
+        const v = valor(codigo);
+        if (v === undefined || v === null) { return colorSinDatos; }
+        const [min, max] = tabla.dominios[anio];
+        return colorEscala(max > min ? (Math.log10(v + 1) - min) / (max - min) : 1);
+    }
+    function estilo(feature) {
+        return {fillColor: color(feature.properties.mun_code), color: 'black', weight: 0.5, fillOpacity: 0.7};
+    }
+    function texto(props) {
+        const v = valor(props.mun_code);
+        return '<b>Municipio:</b> ' + props.mun_name +
+            '<br><b>PIE ' + anio + ' (Valor Original):</b> ' + (v === undefined ? 'sin datos' : formato.format(v)) +
+            '<br><b>Cód. Municipio:</b> ' + props.mun_code +
+            (props.prov_name ? '<br><b>Provincia:</b> ' + props.prov_name : '') +
+            (props.acom_name ? '<br><b>CCAA:</b> ' + props.acom_name : '');
+    }
+
+    const capa = L.geoJSON(topojson.feature(topologia, topologia.objects.municipios), {
+        style: estilo,
+        onEachFeature: function (feature, layer) {
+            layer.bindTooltip(() => texto(feature.properties), {sticky: true});
+            layer.on('mouseover', () => layer.setStyle({weight: 2, fillOpacity: 0.8}));
+            layer.on('mouseout', () => layer.setStyle({weight: 0.5, fillOpacity: 0.7}));
+        }
+    }).addTo(mapa);
+
+    // --- Selector de año y leyenda ---
+    const panel = L.control({position: 'topright'});
+    panel.onAdd = function () {
+        const div = L.DomUtil.create('div', 'panel');
+        div.innerHTML =
+            '<b>Año: <span id="anio"></span></b><br>' +
+            '<input id="selector" type="range" min="0" max="' + (anios.length - 1) + '" step="1">' +
+            '<div>Log10 (Total Participación Variables PIE + 1)</div>' +
+            '<div class="leyenda-barra" style="background: linear-gradient(to right, ' + colores.join(',') + ')"></div>' +
+            '<div class="leyenda-extremos"><span id="leyenda-min"></span><span id="leyenda-max"></span></div>' +
+            '<div><span style="background:' + colorSinDatos + '">&nbsp;&nbsp;&nbsp;&nbsp;</span> Sin datos</div>';
+        L.DomEvent.disableClickPropagation(div);
+        L.DomEvent.disableScrollPropagation(div);
+        return div;
+    };
+    panel.addTo(mapa);
+
+    function actualizar() {
+        document.getElementById('anio').textContent = anio;
+        const [min, max] = tabla.dominios[anio];
+        document.getElementById('leyenda-min').textContent = min.toFixed(2);
+        document.getElementById('leyenda-max').textContent = max.toFixed(2);
+        capa.setStyle(estilo);
+    }
+    const selector = document.getElementById('selector');
+    selector.value = anios.indexOf(anio);
+    selector.addEventListener('input', () => { anio = anios[Number(selector.value)]; actualizar(); });
+    actualizar();
+</script>
+</body>
+</html>
+"""
+
+
+def main():
+    print(f"Cargando datos de PIE desde: {db_path}")
+    conn = sqlite3.connect(db_path)
+    try:
+        df_pie = pd.read_sql_query(f"SELECT {', '.join(COLUMNAS_MAPA)} FROM PIE", conn)
+    finally:
+        conn.close()
+
+    datos_por_año = {int(year): preparar_datos_mapa(df, TARGET_COLUMN) for year, df in df_pie.groupby('year')}
+    gdf_municipios = cargar_municipios(geojson_path)
+    generar_mapa_anual(gdf_municipios, datos_por_año, output_map_filename)
+    print("Proceso completado.")
+
+
+if __name__ == "__main__":
+    main()
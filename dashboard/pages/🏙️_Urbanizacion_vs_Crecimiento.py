@@ -2,8 +2,13 @@ import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine
 import os
+import sys
 import plotly.express as px
 
+# Consultas compartidas al data warehouse (dashboard/consultas_dw.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from consultas_dw import read_latest_year  # noqa: E402
+
 st.set_page_config(page_title="Urbanización y Crecimiento Poblacional", page_icon="🏙️")
 
 st.title("🏙️ Urbanización y Crecimiento Poblacional")
@@ -14,8 +19,8 @@ st.markdown(
     """
 )
 
-DB_FILENAME = "datawarehouse.db"
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data base", DB_FILENAME)
+DB_FILENAME = "datawarehouse_v2.db"
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database 2", DB_FILENAME)
 
 @st.cache_resource
 def get_engine():
@@ -35,9 +40,10 @@ def load_data(_engine):
     if not _engine:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
     try:
-        df_urb = pd.read_sql_table('distribucion_urbana', _engine)
-        df_pop = pd.read_sql_table('cifras_poblacion_municipio', _engine)
-        df_idh = pd.read_sql_table('idhm_indice_desarrollo_humano_municipal', _engine)
+        # Solo se usa el último año de cada tabla: se filtra en SQL en lugar de leerlas enteras
+        df_urb = read_latest_year(_engine, 'distribucion_urbana')
+        df_pop = read_latest_year(_engine, 'cifras_poblacion_municipio_anual', ['mun_code', 'year', 'poblacion'])
+        df_idh = read_latest_year(_engine, 'idhm_indice_desarrollo_humano_municipal')
         st.subheader("Vista previa de urbanización")
         st.dataframe(df_urb.head())
         st.subheader("Vista previa de población")
@@ -56,19 +62,11 @@ if engine:
         st.header("Relación entre urbanización, crecimiento poblacional e IDH")
         # Usar el último año disponible en urbanización y población
         latest_year_urb = df_urb['year'].max()
-        latest_year_pop = max([int(c) for c in df_pop.columns if c.isdigit()])
-        latest_year_idh = df_idh['year'].max()
-
-        df_urb_latest = df_urb[df_urb['year'] == latest_year_urb].copy()
-
-        # Normalizar mun_code de población a string sin decimales
-        df_pop_latest = df_pop[['mun_code', str(latest_year_pop)]].copy()
-        df_pop_latest['mun_code'] = df_pop_latest['mun_code'].astype(float).astype(int).astype(str)
-        df_pop_latest = df_pop_latest.rename(columns={str(latest_year_pop): 'poblacion'})
+        df_urb_latest = df_urb.copy()
 
-        # Normalizar mun_code de IDH a string
-        df_idh_latest = df_idh[df_idh['year'] == latest_year_idh][['mun_code', 'IDHM']].copy()
-        df_idh_latest['mun_code'] = df_idh_latest['mun_code'].astype(str)
+        # mun_code ya viene como texto de 5 dígitos en todas las tablas del data warehouse
+        df_pop_latest = df_pop[['mun_code', 'poblacion']].copy()
+        df_idh_latest = df_idh[['mun_code', 'IDHM']].copy()
 
         # Merge
         df_merged = pd.merge(df_urb_latest, df_pop_latest, on='mun_code', how='inner')
@@ -2,8 +2,13 @@ import streamlit as st
 import pandas as pd
 from sqlalchemy import create_engine
 import os
+import sys
 import plotly.express as px
 
+# Consultas compartidas al data warehouse (dashboard/consultas_dw.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from consultas_dw import read_latest_year  # noqa: E402
+
 st.set_page_config(page_title="Empresas y Desarrollo Humano", page_icon="🏢")
 
 st.title("🏢 Relación entre Empresas y Desarrollo Humano Municipal")
@@ -14,8 +19,8 @@ st.markdown(
     """
 )
 
-DB_FILENAME = "datawarehouse.db"
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data base", DB_FILENAME)
+DB_FILENAME = "datawarehouse_v2.db"
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database 2", DB_FILENAME)
 
 @st.cache_resource
 def get_engine():
@@ -35,8 +40,9 @@ def load_data(_engine):
     if not _engine:
         return pd.DataFrame(), pd.DataFrame()
     try:
-        df_emp = pd.read_sql_table('empresas_municipio_actividad_principal', _engine)
-        df_idh = pd.read_sql_table('idhm_indice_desarrollo_humano_municipal', _engine)
+        # Solo se usa el último año de cada tabla: se filtra en SQL en lugar de leerlas enteras
+        df_emp = read_latest_year(_engine, 'empresas_municipio_actividad_principal')
+        df_idh = read_latest_year(_engine, 'idhm_indice_desarrollo_humano_municipal')
         st.subheader("Vista previa de empresas por municipio")
         st.dataframe(df_emp.head())
         st.subheader("Vista previa de IDH municipal")
@@ -54,8 +60,8 @@ if engine:
         # Usar el último año disponible en ambas tablas
         latest_year_emp = df_emp['year'].max()
         latest_year_idh = df_idh['year'].max()
-        df_emp_latest = df_emp[df_emp['year'] == latest_year_emp].copy()
-        df_idh_latest = df_idh[df_idh['year'] == latest_year_idh].copy()
+        df_emp_latest = df_emp.copy()
+        df_idh_latest = df_idh.copy()
 
         # Unir por código de municipio
         df_merged = pd.merge(
@@ -8,8 +8,8 @@ st.set_page_config(page_title="Nuevo Informe: Población Municipal", page_icon="
 st.title("👥 Nuevo Informe: Análisis de Población Municipal")
 st.markdown("Este informe muestra datos y visualizaciones sobre la población, revisando los datos y el merge antes de mostrar resultados.")
 
-DB_FILENAME = "datawarehouse.db"
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data base", DB_FILENAME)
+DB_FILENAME = "datawarehouse_v2.db"
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database 2", DB_FILENAME)
 
 @st.cache_resource
 def get_engine():
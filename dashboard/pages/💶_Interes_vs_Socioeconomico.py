@@ -14,8 +14,8 @@ st.markdown(
     """
 )
 
-DB_FILENAME = "datawarehouse.db"
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data base", DB_FILENAME)
+DB_FILENAME = "datawarehouse_v2.db"
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database 2", DB_FILENAME)
 
 @st.cache_resource
 def get_engine():
@@ -13,8 +13,8 @@ st.set_page_config(page_title="Informes Guardados", page_icon="📂")
 st.title("📂 Informes Guardados")
 st.markdown("Carga y visualiza las configuraciones de informes guardadas.")
 
-DB_FILENAME = "datawarehouse.db"
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data base", DB_FILENAME)
+DB_FILENAME = "datawarehouse_v2.db"
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "database 2", DB_FILENAME)
 REPORTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "saved_reports.json")
 
 @st.cache_resource
@@ -2,11 +2,13 @@ import streamlit as st
 import pandas as pd
 import geopandas as gpd
 import folium
+from branca.colormap import StepColormap
+from branca.utilities import color_brewer
 from streamlit_folium import st_folium
 import sqlite3
 import os
+import sys
 import json # Ensure json is imported
-from topojson import Topology # MODIFIED: Import Topology directly
 import numpy as np # ADDED: Import NumPy
 
 # Configuración de la página
@@ -16,18 +18,47 @@ st.title("Mapa Interactivo de Densidad de Población Municipal")
 
 # --- Rutas a los archivos ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DB_PATH = os.path.join(BASE_DIR, "data base", "datawarehouse.db")
-# GEOJSON_PATH = os.path.join(BASE_DIR, "ETL", "GeoRef_Spain", "georef-spain-municipio.geojson") # Old path
-TOPOJSON_PATH = os.path.join(BASE_DIR, "ETL", "GeoRef_Spain", "TopoJSON", "georef-spain-municipio.topojson") # New path to TopoJSON
+DB_PATH = os.path.join(BASE_DIR, "database 2", "datawarehouse_v2.db")
+# Capa municipal prearmada por ETL/GeoRef_Spain/construir_capa_municipios.py (códigos, nombres, CCAA/provincia y área)
+CAPA_MUNICIPIOS_DIR = os.path.join(BASE_DIR, "ETL", "GeoRef_Spain", "capa_municipios")
+CAPA_PARQUET_PATH = os.path.join(CAPA_MUNICIPIOS_DIR, "municipios.parquet")
+CAPA_GEOJSON_PATH = os.path.join(CAPA_MUNICIPIOS_DIR, "municipios.geojson")
+# GeoJSON del mapa por nivel de detalle (pirámide de ETL/GeoRef_Spain/TopoJSON/convert_to_topojson.py):
+# España completa -> 'espana', solo CCAA -> 'ccaa', provincias -> máximo detalle
+MAP_DETAIL_GEOJSON_PATHS = {
+    'espana': os.path.join(CAPA_MUNICIPIOS_DIR, "municipios_espana.geojson"),
+    'ccaa': os.path.join(CAPA_MUNICIPIOS_DIR, "municipios_ccaa.geojson"),
+    'provincia': CAPA_GEOJSON_PATH,
+}
+
+# Teselas vectoriales de municipios y CCAA (ETL/GeoRef_Spain/construir_teselas_vectoriales.py) servidas
+# en local por dashboard/servidor_teselas.py: si se activan (MAPA_TESELAS_VECTORIALES=1) y existen, el mapa
+# las usa en lugar de incrustar el GeoJSON
+# y el coroplético se une por mun_code en el navegador.
+sys.path.insert(0, os.path.join(BASE_DIR, "dashboard"))
+from servidor_teselas import ACTIVAR_TESELAS, MBTILES_PATH, CapaTeselasMunicipios, iniciar_en_segundo_plano  # noqa: E402
 
 
 # --- Funciones de carga de datos ---
+# Tabla larga (mun_code, year, poblacion) creada por el loader del data warehouse.
+# Si la BD es anterior y solo tiene la tabla ancha, se usa esta última.
+POP_LONG_TABLE = "cifras_poblacion_municipio_anual"
+
+def has_long_population_table(conn):
+    """Indica si la BD tiene la tabla de población en formato largo."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (POP_LONG_TABLE,))
+    return cursor.fetchone() is not None
+
 @st.cache_data
 def get_available_years(_conn):
     """Obtiene los años disponibles de la tabla de población."""
     try:
-        # Intenta obtener información de las columnas de la tabla de población
         cursor = _conn.cursor()
+        if has_long_population_table(_conn):
+            cursor.execute(f"SELECT DISTINCT year FROM {POP_LONG_TABLE} ORDER BY year DESC")
+            return [str(row[0]) for row in cursor.fetchall()]
+        # Intenta obtener información de las columnas de la tabla de población
         cursor.execute("PRAGMA table_info(cifras_poblacion_municipio)")
         columns_info = cursor.fetchall()
         # Filtra las columnas que son años (numéricas) y las ordena
@@ -39,10 +70,14 @@ def get_available_years(_conn):
 
 @st.cache_data
 def load_population_data(_conn, selected_year_str):
-    """Carga datos de población para un año específico directamente de cifras_poblacion_municipio."""
+    """Carga datos de población para un año específico de cifras_poblacion_municipio."""
     try:
-        query_poblacion = f"SELECT mun_code, `{selected_year_str}` AS poblacion FROM cifras_poblacion_municipio WHERE `{selected_year_str}` IS NOT NULL"
-        df_pop = pd.read_sql_query(query_poblacion, _conn)
+        if has_long_population_table(_conn):
+            query_poblacion = f"SELECT mun_code, poblacion FROM {POP_LONG_TABLE} WHERE year = ?"
+            df_pop = pd.read_sql_query(query_poblacion, _conn, params=(int(selected_year_str),))
+        else:
+            query_poblacion = f"SELECT mun_code, `{selected_year_str}` AS poblacion FROM cifras_poblacion_municipio WHERE `{selected_year_str}` IS NOT NULL"
+            df_pop = pd.read_sql_query(query_poblacion, _conn)
         
         df_pop['mun_code'] = df_pop['mun_code'].astype(str).str.split('.').str[0].str.zfill(5)
         df_pop['poblacion'] = pd.to_numeric(df_pop['poblacion'], errors='coerce').fillna(0)
@@ -55,231 +90,147 @@ def load_population_data(_conn, selected_year_str):
         st.error(f"Un error inesperado ocurrió al cargar datos de población: {e}")
         return pd.DataFrame()
 
+# Área de cada municipio (km²), calculada una sola vez en el ETL (ver ETL/GeoRef_Spain/construir_capa_municipios.py)
+AREA_TABLE = "mun_area"
+
 @st.cache_data
-def load_spatial_data(path):
+def load_area_data(_conn):
+    """Carga la tabla de áreas municipales como Series area_km2 indexada por mun_code (None si la BD no la tiene)."""
+    try:
+        cursor = _conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (AREA_TABLE,))
+        if cursor.fetchone() is None:
+            return None
+        df_area = pd.read_sql_query(f"SELECT mun_code, area_km2 FROM {AREA_TABLE}", _conn)
+        df_area['mun_code'] = df_area['mun_code'].astype(str).str.split('.').str[0].str.zfill(5)
+        return df_area.drop_duplicates(subset=['mun_code']).set_index('mun_code')['area_km2']
+    except sqlite3.Error as e:
+        st.error(f"Error al cargar la tabla de áreas municipales: {e}")
+        return None
+
+def spatial_data_version(*paths):
+    """Fechas de modificación de la capa municipal; forman parte de la clave de caché."""
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+@st.cache_data
+def load_spatial_data(parquet_path, version):
     """
-    Carga los datos espaciales TopoJSON.
-    Retorna un GeoDataFrame procesado (para fusiones y tooltips) y 
-    un diccionario GeoJSON FeatureCollection (para la capa Choropleth) 
-    con códigos municipales estandarizados.
+    Carga la capa municipal prearmada (ver ETL/GeoRef_Spain/construir_capa_municipios.py).
+    Retorna un GeoDataFrame (mun_code, mun_name, prov_name, acom_name, area_km2, geometry) para
+    fusiones, filtros y tooltips.
+    `version` solo sirve para invalidar la caché cuando se regenera la capa.
     """
-    # t_start_func = time.time() # REMOVED
     try:
-        if not os.path.exists(path):
-            st.error(f"Archivo TopoJSON no encontrado en la ruta: {path}")
-            return None, None
-
-        # 1. Cargar TopoJSON como diccionario Python para modificación y uso en Choropleth
-        # t_before_json_load = time.time() # REMOVED
-        with open(path, 'r', encoding='utf-8') as f:
-            topo_data_dict = json.load(f)
-        # st.write(f"[load_spatial_data] Diccionario TopoJSON cargado en {time.time() - t_before_json_load:.2f}s") # REMOVED
-
-        # 2. Cargar con GeoPandas para crear el GeoDataFrame (para fusionar, tooltips, cálculo de área)
-        # t_before_gdf_load = time.time() # REMOVED
-        gdf = gpd.read_file(path)
-        # st.write(f"[load_spatial_data] GeoDataFrame cargado desde TopoJSON en {time.time() - t_before_gdf_load:.2f}s. Columnas iniciales: {gdf.columns.tolist()[:10]}...") # REMOVED
-
-        # 3. Manejo de CRS para GDF
-        # t_before_crs = time.time() # REMOVED
-        if gdf.crs is None:
-            gdf.set_crs("EPSG:4326", inplace=True)
-        elif gdf.crs != "EPSG:4326":
-            gdf = gdf.to_crs("EPSG:4326")
-        # st.write(f"[load_spatial_data] Manejo de CRS completado en {time.time() - t_before_crs:.2f}s") # REMOVED
-
-        # 4. Identificar el nombre original de la columna del código municipal en GDF (y, por lo tanto, en las propiedades de TopoJSON)
-        code_col_options = ['mun_code', 'ine.ine_cod_municipio', 'natcode', 'cartodb_id']
-        mun_code_col_original_name = None
-        for col in code_col_options:
-            if col in gdf.columns:
-                mun_code_col_original_name = col
-                break
-        
-        if not mun_code_col_original_name:
-            st.error(f"No se pudo encontrar una columna de código municipal adecuada en el TopoJSON. Columnas disponibles: {gdf.columns.tolist()}")
-            return None, None 
-        # st.write(f"[load_spatial_data] Columna de código municipal original identificada como: '{mun_code_col_original_name}'") # REMOVED
-
-        # 5. Estandarizar mun_code en el GDF (para fusionar con datos de población)
-        # t_before_gdf_mun_code_std = time.time() # REMOVED
-        temp_standardized_col_name = "__temp_standardized_mun_code__"
-        if pd.api.types.is_numeric_dtype(gdf[mun_code_col_original_name]):
-            gdf[temp_standardized_col_name] = gdf[mun_code_col_original_name].astype(float).astype(int).astype(str).str.zfill(5)
-        else:
-            gdf[temp_standardized_col_name] = gdf[mun_code_col_original_name].astype(str).str.split('.').str[0].str.zfill(5)
-        
-        if 'mun_code' in gdf.columns and 'mun_code' != mun_code_col_original_name:
-            gdf.drop(columns=['mun_code'], inplace=True) 
-        if mun_code_col_original_name != temp_standardized_col_name and mun_code_col_original_name in gdf.columns: 
-             gdf.drop(columns=[mun_code_col_original_name], inplace=True) 
-        gdf.rename(columns={temp_standardized_col_name: 'mun_code'}, inplace=True)
-        # st.write(f"[load_spatial_data] Estandarización de 'mun_code' en GDF completada en {time.time() - t_before_gdf_mun_code_std:.2f}s. GDF tiene ahora {len(gdf)} filas.") # REMOVED
-
-        # 6. Estandarizar códigos y nombre de propiedad EN EL DICCIONARIO TOPOJSON
-        # t_before_dict_mun_code_std = time.time() # REMOVED
-        object_key = "municipios" 
-        if 'objects' not in topo_data_dict or object_key not in topo_data_dict.get('objects', {}):
-            if 'objects' in topo_data_dict and isinstance(topo_data_dict['objects'], dict):
-                 potential_keys = list(topo_data_dict['objects'].keys())
-                 if potential_keys:
-                     object_key = potential_keys[0] 
-                     # st.warning(f"[load_spatial_data] Clave de objeto TopoJSON '{object_key}' no encontrada. Usando la primera clave disponible: '{object_key}'") # REMOVED
-                 else:
-                     st.error("[load_spatial_data] No se encontraron objetos en el TopoJSON.")
-                     return None, None 
-            else:
-                st.error("[load_spatial_data] Estructura de TopoJSON inválida: falta 'objects' o no es un diccionario.")
-                return None, None 
-        # else: # REMOVED
-            # st.write(f"[load_spatial_data] Usando clave de objeto TopoJSON: '{object_key}'") # REMOVED
-
-        if 'geometries' not in topo_data_dict.get('objects', {}).get(object_key, {}):
-            st.error(f"La capa de objetos '{object_key}' en TopoJSON no contiene 'geometries'.")
-            return None, None 
-
-        geometries = topo_data_dict['objects'][object_key]['geometries']
-        # st.write(f"[load_spatial_data] Total de geometrías encontradas en TopoJSON ('{object_key}'): {len(geometries)}") # REMOVED
-
-        num_features_processed_dict = 0
-        num_features_missing_properties = 0
-        num_features_properties_is_none = 0
-
-        for i, feature in enumerate(geometries):
-            if 'properties' not in feature:
-                num_features_missing_properties += 1
-                continue 
-            
-            if feature.get('properties') is None:
-                num_features_properties_is_none +=1
-                continue 
-
-            if mun_code_col_original_name in feature['properties']:
-                raw_code = feature['properties'][mun_code_col_original_name]
-                raw_code_str = str(raw_code)
-                standardized_code = raw_code_str.split('.')[0].zfill(5)
-                feature['properties']['mun_code'] = standardized_code 
-                if mun_code_col_original_name != 'mun_code': 
-                    del feature['properties'][mun_code_col_original_name]
-                num_features_processed_dict += 1
-        
-        if num_features_missing_properties > 0:
-            st.warning(f"[load_spatial_data] {num_features_missing_properties} características no tenían la clave 'properties'.")
-        if num_features_properties_is_none > 0:
-            st.warning(f"[load_spatial_data] {num_features_properties_is_none} características tenían 'properties' establecido a None.")
-
-        # st.write(f"[load_spatial_data] Estandarización de 'mun_code' en diccionario TopoJSON completada en {time.time() - t_before_dict_mun_code_std:.2f}s. {num_features_processed_dict} características procesadas.") # REMOVED
-
-        # 6.1 Convertir el TopoJSON modificado (o su capa relevante) a GeoJSON FeatureCollection
-        # t_before_topo_to_geojson = time.time() # REMOVED
-        geojson_feature_collection = None
-        if topo_data_dict and 'objects' in topo_data_dict and object_key in topo_data_dict['objects']:
-            try:
-                topology_instance = Topology(topo_data_dict, object_name=object_key)
-                converted_geojson = topology_instance.to_geojson() 
-                
-                # st.write(f"[load_spatial_data] TopoJSON layer '{object_key}' conversion attempt with Topology class took {time.time() - t_before_topo_to_geojson:.2f}s") # REMOVED
-
-                if isinstance(converted_geojson, str):
-                    try:
-                        geojson_feature_collection = json.loads(converted_geojson)
-                        # st.write("[load_spatial_data] Conversión de cadena JSON a diccionario GeoJSON exitosa.") # REMOVED
-                    except json.JSONDecodeError as e_json:
-                        st.error(f"[load_spatial_data] Error al decodificar la cadena GeoJSON: {e_json}")
-                        geojson_feature_collection = topo_data_dict 
-                elif isinstance(converted_geojson, dict):
-                    geojson_feature_collection = converted_geojson 
-                    # st.write("[load_spatial_data] Conversion returned a dictionary directly.") # REMOVED
-                else:
-                    st.warning(f"[load_spatial_data] Topology().to_geojson() returned an unexpected type: {type(converted_geojson)}. Fallback.")
-                    geojson_feature_collection = topo_data_dict 
-
-                if isinstance(geojson_feature_collection, dict) and geojson_feature_collection.get('type') == 'FeatureCollection':
-                    num_features = len(geojson_feature_collection.get('features', []))
-                    # st.write(f"[load_spatial_data] Successfully processed/loaded GeoJSON FeatureCollection. Number of features: {num_features}") # REMOVED
-                    if num_features == 0 and len(topo_data_dict.get('objects', {}).get(object_key, {}).get('geometries', [])) > 0:
-                        st.warning("[load_spatial_data] GeoJSON FeatureCollection tiene 0 características, pero el TopoJSON original tenía geometrías. Verifique la conversión.")
-                elif geojson_feature_collection is not topo_data_dict: 
-                    st.warning(f"[load_spatial_data] Processed data is not a valid GeoJSON FeatureCollection dictionary. Type: {type(geojson_feature_collection)}. Will attempt to use TopoJSON dict directly if this was the result of conversion.")
-                    if not isinstance(geojson_feature_collection, dict): 
-                         geojson_feature_collection = topo_data_dict 
-            
-            except Exception as e_topo_convert:
-                st.error(f"[load_spatial_data] Error al convertir la capa TopoJSON '{object_key}' a GeoJSON usando Topology().to_geojson(): {e_topo_convert}")
-                st.exception(e_topo_convert) 
-                geojson_feature_collection = topo_data_dict 
-                st.warning("[load_spatial_data] Fallback: Se usará el diccionario TopoJSON modificado directamente para Folium.")
-        else:
-            st.error("[load_spatial_data] No se pudo encontrar la capa de objetos para convertir a GeoJSON. Se usará el diccionario TopoJSON original si está disponible.")
-            geojson_feature_collection = topo_data_dict 
-
-        if geojson_feature_collection is None: 
-             st.error("[load_spatial_data] geojson_feature_collection es None después del intento de conversión. Fallback a topo_data_dict.")
-             geojson_feature_collection = topo_data_dict
-
-
-        # 7. Estandarizar mun_name en GDF
-        # t_before_gdf_mun_name_std = time.time() # REMOVED
-        name_col_options = ['mun_name', 'nameunit', 'nombre']
-        mun_name_col_original = None
-        for col in name_col_options:
-            if col in gdf.columns:
-                mun_name_col_original = col
-                break
-        if mun_name_col_original:
-            if mun_name_col_original != 'mun_name': 
-                if 'mun_name' in gdf.columns: 
-                    gdf.drop(columns=['mun_name'], inplace=True)
-                gdf.rename(columns={mun_name_col_original: 'mun_name'}, inplace=True)
-        elif 'mun_code' in gdf.columns: 
-            gdf['mun_name'] = gdf['mun_code']
-        # st.write(f"[load_spatial_data] Estandarización de 'mun_name' en GDF completada en {time.time() - t_before_gdf_mun_name_std:.2f}s") # REMOVED
-        
-        # 8. Validar geometrías en GDF
-        # t_before_gdf_geom_val = time.time() # REMOVED
-        initial_gdf_rows = len(gdf)
-        gdf = gdf[gdf.is_valid & ~gdf.is_empty] 
-        rows_after_validation = len(gdf)
-        # st.write(f"[load_spatial_data] Validación de geometría GDF completada en {time.time() - t_before_gdf_geom_val:.2f}s. Filas antes: {initial_gdf_rows}, Filas después: {rows_after_validation}") # REMOVED
-        if gdf.empty:
-            st.warning("El GeoDataFrame está vacío después de la validación de geometría.")
-            return gdf, geojson_feature_collection 
-
-        # 9. Seleccionar y retornar columnas necesarias del GDF
-        gdf_cols_to_return = ['mun_code', 'geometry']
-        
-        if 'mun_name' in gdf.columns:
-            gdf_cols_to_return.append('mun_name')
-        elif 'mun_code' in gdf.columns: 
-            gdf['mun_name'] = gdf['mun_code'] 
-            gdf_cols_to_return.append('mun_name')
-
-        if 'prov_name' in gdf.columns:
-            gdf_cols_to_return.append('prov_name')
-        if 'acom_code' in gdf.columns: 
-            gdf_cols_to_return.append('acom_code')
-        if 'acom_name' in gdf.columns:
-            gdf_cols_to_return.append('acom_name')
-
-        gdf_cols_to_return = list(dict.fromkeys(gdf_cols_to_return))
-
-        missing_cols = [col for col in gdf_cols_to_return if col not in gdf.columns]
-        if missing_cols:
-            st.error(f"Columnas GDF faltantes después del procesamiento: {missing_cols}. Columnas disponibles: {gdf.columns.tolist()}")
-            safe_cols = [col for col in ['mun_code', 'geometry'] if col in gdf.columns]
-            if not safe_cols: 
-                 return None, geojson_feature_collection
-            final_gdf = gdf[safe_cols]
-        else:
-            final_gdf = gdf[gdf_cols_to_return]
-        
-        # st.write(f"[load_spatial_data] Finalizando. GDF final con {len(final_gdf)} filas y columnas: {final_gdf.columns.tolist()}. Tiempo total de la función: {time.time() - t_start_func:.2f}s") # REMOVED
-        return final_gdf, geojson_feature_collection 
+        if not os.path.exists(parquet_path):
+            st.error(f"Capa municipal no encontrada: {parquet_path}. Ejecute 'python ETL/GeoRef_Spain/construir_capa_municipios.py' para generarla.")
+            return None
+        return gpd.read_parquet(parquet_path, memory_map=True)
 
     except Exception as e:
-        st.error(f"Error crítico al cargar o procesar datos espaciales: {e}")
-        st.exception(e) 
-        return None, None
+        st.error(f"Error crítico al cargar los datos espaciales: {e}")
+        st.exception(e)
+        return None
+
+@st.cache_resource
+def start_vector_tile_server(mbtiles_path):
+    """Arranca una sola vez el servidor local de teselas. Devuelve la URL de las teselas, o None si no hay MBTiles."""
+    if not os.path.exists(mbtiles_path):
+        return None
+    try:
+        return iniciar_en_segundo_plano(mbtiles_path)
+    except OSError as e:
+        st.warning(f"No se pudo iniciar el servidor local de teselas ({e}). Se usará el GeoJSON.")
+        return None
+
+def vector_tile_values(scope_gdf, data_gdf, bins, colors, nan_color):
+    """
+    {mun_code: [color, población, área, densidad]} de los municipios del ámbito seleccionado,
+    para colorear las teselas en el navegador. El color se asigna por intervalos como en folium.Choropleth;
+    los municipios sin datos de población reciben `nan_color`.
+    """
+    df = scope_gdf[['mun_code']].drop_duplicates().merge(
+        data_gdf[['mun_code', 'poblacion', 'area_km2', 'densidad_poblacion']], on='mun_code', how='left')
+    densidad = df['densidad_poblacion'].to_numpy(dtype=float)
+    edges = np.asarray(bins, dtype=float)
+    edges[-1] = np.nextafter(edges[-1], np.inf)
+    color_index = np.clip(np.digitize(densidad, edges) - 1, 0, len(colors) - 1)
+    color = np.where(np.isnan(densidad), nan_color, np.asarray(colors, dtype=object)[color_index])
+
+    columnas = [df['poblacion'].round(0), df['area_km2'].round(2), df['densidad_poblacion'].round(2)]
+    columnas = [c.astype(object).where(c.notna(), None) for c in columnas]
+    return {code: list(row) for code, *row in zip(df['mun_code'], color, *columnas)}
+
+def select_map_detail_level(selected_acom, selected_prov):
+    """Nivel de detalle de la geometría según el ámbito seleccionado en la barra lateral."""
+    if selected_prov:
+        return 'provincia'
+    if selected_acom:
+        return 'ccaa'
+    return 'espana'
+
+def map_geojson_path(detail_level):
+    """GeoJSON del nivel pedido, o el de máximo detalle si ese nivel no se ha generado."""
+    path = MAP_DETAIL_GEOJSON_PATHS.get(detail_level, CAPA_GEOJSON_PATH)
+    return path if os.path.exists(path) else CAPA_GEOJSON_PATH
+
+@st.cache_data
+def load_map_geojson(geojson_path, version):
+    """Carga el GeoJSON FeatureCollection de la capa Choropleth (una sola lectura por archivo y versión)."""
+    try:
+        if not os.path.exists(geojson_path):
+            st.error(f"GeoJSON de la capa municipal no encontrado: {geojson_path}. Ejecute 'python ETL/GeoRef_Spain/construir_capa_municipios.py' para generarlo.")
+            return None
+        with open(geojson_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    except Exception as e:
+        st.error(f"Error crítico al cargar el GeoJSON del mapa: {e}")
+        st.exception(e)
+        return None
+
+def enrich_geojson_features(features, tooltip_data):
+    """
+    Escribe los campos del tooltip (mun_name, poblacion, area_km2, densidad_poblacion)
+    en las propiedades de cada feature del GeoJSON.
+
+    Los datos se alinean con el orden de las features en una sola operación
+    (`reindex` por mun_code) y se recorren como listas, sin búsquedas `.loc`
+    por feature. Las features sin mun_code o sin datos reciben 0 en los campos
+    numéricos y conservan su nombre.
+
+    Returns:
+        (enriquecidas, sin_mun_code, mun_code_sin_datos)
+    """
+    properties = [feature['properties'] for feature in features]
+    codes = [props.get('mun_code') or None for props in properties]
+    known_codes = set(tooltip_data.index)
+    found = [code in known_codes for code in codes]
+    aligned = tooltip_data.reindex(codes)
+
+    names = aligned['mun_name'].tolist()
+    # Los valores nulos quedan como 0 entero (no 0.0), igual que en las features sin datos
+    poblacion = [0 if pd.isna(v) else v for v in aligned['poblacion'].astype(float).tolist()]
+    area_km2 = [0 if pd.isna(v) else round(v, 2) for v in aligned['area_km2'].astype(float).tolist()]
+    densidad = [0 if pd.isna(v) else round(v, 2) for v in aligned['densidad_poblacion'].astype(float).tolist()]
+
+    missing_code = not_found = 0
+    for props, code, ok, name, pob, area, dens in zip(properties, codes, found, names, poblacion, area_km2, densidad):
+        if ok:
+            props['mun_name'] = name
+            props['poblacion'] = pob
+            props['area_km2'] = area
+            props['densidad_poblacion'] = dens
+            continue
+        if code:
+            not_found += 1
+            props['mun_name'] = props.get('mun_name', 'Desconocido')
+        else:
+            missing_code += 1
+            props['mun_name'] = props.get('mun_name', 'Sin Código Mun.')
+        props['poblacion'] = 0
+        props['area_km2'] = 0
+        props['densidad_poblacion'] = 0
+    return len(properties) - missing_code - not_found, missing_code, not_found
 
 # --- Conexión a la base de datos ---
 try:
@@ -300,15 +251,12 @@ selected_year = st.sidebar.selectbox("Seleccione Año:", available_years)
 # t_spatial_and_filter_load_start = time.time() # REMOVED
 
 # t_spatial_load_start = time.time() # REMOVED
-gdf_municipalities, geojson_feature_collection_for_map = load_spatial_data(TOPOJSON_PATH)
+gdf_municipalities = load_spatial_data(CAPA_PARQUET_PATH, spatial_data_version(CAPA_PARQUET_PATH))
 # st.write(f"Datos espaciales (load_spatial_data) completados en {time.time() - t_spatial_load_start:.2f}s.") # REMOVED
 
-if gdf_municipalities is None or geojson_feature_collection_for_map is None:
+if gdf_municipalities is None:
     st.warning("No se pudieron cargar los datos espaciales necesarios para los filtros y el mapa.")
-    if gdf_municipalities is None:
-        st.info("Detalle: El GeoDataFrame de municipios no se cargó correctamente.")
-    if geojson_feature_collection_for_map is None:
-        st.info("Detalle: El GeoJSON FeatureCollection para el mapa no se generó/procesó correctamente.")
+    st.info("Detalle: El GeoDataFrame de municipios no se cargó correctamente.")
     st.stop()
 
 # st.write(f"Forma de gdf_municipalities ANTES de filtros CCAA/Prov: {gdf_municipalities.shape if gdf_municipalities is not None else 'N/A'}") # REMOVED
@@ -344,6 +292,27 @@ if gdf_municipalities_original_for_filters is not None and not gdf_municipalitie
             # st.write(f"GDF filtrado por Provincias: {selected_prov}. Filas restantes: {len(gdf_municipalities)}") # REMOVED
     else:
         st.sidebar.warning("Columna 'prov_name' no disponible para filtro de Provincia.")
+else:
+    st.sidebar.info("Datos espaciales iniciales no disponibles o vacíos para mostrar filtros de CCAA/Provincia.")
+
+# --- Teselas vectoriales o GeoJSON del mapa con el nivel de detalle del ámbito seleccionado ---
+# Solo con MAPA_TESELAS_VECTORIALES=1: el navegador tiene que llegar al servidor de teselas (ver servidor_teselas.py)
+vector_tiles_url = start_vector_tile_server(MBTILES_PATH) if ACTIVAR_TESELAS else None
+use_vector_tiles = vector_tiles_url is not None
+geojson_feature_collection_for_map = None
+if use_vector_tiles:
+    st.sidebar.caption("Geometría del mapa: teselas vectoriales locales (solo se descargan las visibles)")
+else:
+    map_detail_level = select_map_detail_level(selected_acom, selected_prov)
+    map_geojson_file = map_geojson_path(map_detail_level)
+    geojson_feature_collection_for_map = load_map_geojson(map_geojson_file, spatial_data_version(map_geojson_file))
+    if geojson_feature_collection_for_map is None:
+        st.warning("No se pudieron cargar los datos espaciales necesarios para el mapa.")
+        st.info("Detalle: El GeoJSON FeatureCollection para el mapa no se generó/procesó correctamente.")
+        st.stop()
+    if os.path.exists(map_geojson_file):
+        st.sidebar.caption(f"Geometría del mapa: {os.path.basename(map_geojson_file)} "
+                           f"({os.path.getsize(map_geojson_file) / 1e6:.1f} MB antes de filtrar)")
 
     if selected_acom or selected_prov:
         # st.write(f"Forma de gdf_municipalities DESPUÉS de filtros CCAA/Prov: {gdf_municipalities.shape if gdf_municipalities is not None else 'N/A'}") # REMOVED
@@ -363,8 +332,6 @@ if gdf_municipalities_original_for_filters is not None and not gdf_municipalitie
             st.warning("gdf_municipalities está vacío después de los filtros CCAA/Prov, el mapa estará vacío.")
             if geojson_feature_collection_for_map and 'features' in geojson_feature_collection_for_map:
                  geojson_feature_collection_for_map['features'] = [] 
-else:
-    st.sidebar.info("Datos espaciales iniciales no disponibles o vacíos para mostrar filtros de CCAA/Provincia.")
 
 # st.write(f"Carga de datos espaciales y definición de filtros geográficos completada en {time.time() - t_spatial_and_filter_load_start:.2f}s") # REMOVED
 
@@ -399,24 +366,15 @@ if merged_gdf.empty:
 
 # st.write(f"Unión de datos y cálculos iniciales completados en {time.time() - t_main_processing_start:.2f}s") # REMOVED
 
-# --- Cálculo de Área y Densidad ---
-# st.write("--- Iniciando Cálculo de Área y Densidad ---") # REMOVED
-# t_area_calc_start = time.time() # REMOVED
-try:
-    # st.write("Reproyectando GDF para cálculo de área (EPSG:25830)...") # REMOVED
-    # t_reproject_start = time.time() # REMOVED
-    merged_gdf_projected = merged_gdf.to_crs(epsg=25830)
-    # st.write(f"Reproyección completada en {time.time() - t_reproject_start:.2f}s") # REMOVED
-    merged_gdf['area_km2'] = merged_gdf_projected.area / 1_000_000  
-except Exception as e:
-    st.error(f"Error al calcular el área con EPSG:25830: {e}. Intentando con el área original (puede ser menos precisa).")
-    merged_gdf['area_km2'] = merged_gdf.area * 10000 # Esto es una aproximación muy burda y probablemente incorrecta. Considerar eliminar o mejorar.
-# st.write(f"Cálculo de 'area_km2' completado.") # REMOVED
-
-merged_gdf['densidad_poblacion'] = merged_gdf['poblacion'] / merged_gdf['area_km2']
-merged_gdf['densidad_poblacion'].fillna(0, inplace=True) 
-merged_gdf.loc[merged_gdf['area_km2'] == 0, 'densidad_poblacion'] = 0 
-merged_gdf.replace([float('inf'), float('-inf')], 0, inplace=True) 
+# --- Cálculo de Densidad ---
+# El área no cambia entre años: se toma de la tabla 'mun_area' del data warehouse (o, si la BD
+# no la tiene, de la capa municipal), sin reproyectar geometrías en cada ejecución.
+area_por_municipio = load_area_data(conn)
+if area_por_municipio is not None:
+    merged_gdf['area_km2'] = merged_gdf['mun_code'].map(area_por_municipio).fillna(merged_gdf['area_km2'])
+
+area_valida = merged_gdf['area_km2'].where(merged_gdf['area_km2'] > 0)
+merged_gdf['densidad_poblacion'] = (merged_gdf['poblacion'] / area_valida).fillna(0)
 # st.write(f"Cálculo de 'densidad_poblacion' completado.") # REMOVED
 # st.write(f"Cálculo de Área y Densidad completado en {time.time() - t_area_calc_start:.2f}s") # REMOVED
 
@@ -445,42 +403,19 @@ if merged_gdf['mun_code'].duplicated().any():
 
 tooltip_data = merged_gdf.set_index('mun_code')[tooltip_cols].copy() 
 
-if geojson_feature_collection_for_map and 'features' in geojson_feature_collection_for_map:
-    # st.write(f"Número de características en GeoJSON ANTES del enriquecimiento: {len(geojson_feature_collection_for_map['features'])}") # REMOVED
-    enriched_feature_count = 0
-    features_missing_mun_code_in_props = 0
-    features_mun_code_not_in_tooltip_data = 0
-
-    for feature in geojson_feature_collection_for_map['features']:
-        feature_mun_code = feature.get('properties', {}).get('mun_code')
-        if feature_mun_code:
-            if feature_mun_code in tooltip_data.index:
-                data_row = tooltip_data.loc[feature_mun_code]
-                feature['properties']['mun_name'] = data_row['mun_name']
-                feature['properties']['poblacion'] = float(data_row['poblacion']) if pd.notnull(data_row['poblacion']) else 0
-                feature['properties']['area_km2'] = round(float(data_row['area_km2']), 2) if pd.notnull(data_row['area_km2']) else 0
-                feature['properties']['densidad_poblacion'] = round(float(data_row['densidad_poblacion']), 2) if pd.notnull(data_row['densidad_poblacion']) else 0
-                enriched_feature_count += 1
-            else:
-                features_mun_code_not_in_tooltip_data +=1
-                feature['properties']['mun_name'] = feature.get('properties', {}).get('mun_name', 'Desconocido') 
-                feature['properties']['poblacion'] = 0
-                feature['properties']['area_km2'] = 0
-                feature['properties']['densidad_poblacion'] = 0
-        else:
-            features_missing_mun_code_in_props += 1
-            feature['properties']['mun_name'] = feature.get('properties', {}).get('mun_name', 'Sin Código Mun.')
-            feature['properties']['poblacion'] = 0
-            feature['properties']['area_km2'] = 0
-            feature['properties']['densidad_poblacion'] = 0
-
-    # st.write(f"Características GeoJSON enriquecidas: {enriched_feature_count}") # REMOVED
-    if features_missing_mun_code_in_props > 0:
-        st.warning(f"{features_missing_mun_code_in_props} características en GeoJSON no tenían 'mun_code' en sus propiedades.")
-    if features_mun_code_not_in_tooltip_data > 0:
-        st.warning(f"{features_mun_code_not_in_tooltip_data} características en GeoJSON tenían un 'mun_code' no encontrado en los datos de tooltip (merged_gdf).")
-else:
-    st.warning("No se pudo enriquecer GeoJSON: 'features' no encontrado o geojson_feature_collection_for_map es None.")
+# Con teselas vectoriales los tooltips se arman en el navegador a partir de vector_tile_values
+if not use_vector_tiles:
+    if geojson_feature_collection_for_map and 'features' in geojson_feature_collection_for_map:
+        enriched_feature_count, features_missing_mun_code_in_props, features_mun_code_not_in_tooltip_data = \
+            enrich_geojson_features(geojson_feature_collection_for_map['features'], tooltip_data)
+
+        # st.write(f"Características GeoJSON enriquecidas: {enriched_feature_count}") # REMOVED
+        if features_missing_mun_code_in_props > 0:
+            st.warning(f"{features_missing_mun_code_in_props} características en GeoJSON no tenían 'mun_code' en sus propiedades.")
+        if features_mun_code_not_in_tooltip_data > 0:
+            st.warning(f"{features_mun_code_not_in_tooltip_data} características en GeoJSON tenían un 'mun_code' no encontrado en los datos de tooltip (merged_gdf).")
+    else:
+        st.warning("No se pudo enriquecer GeoJSON: 'features' no encontrado o geojson_feature_collection_for_map es None.")
 
 # st.write(f"Enriquecimiento de GeoJSON completado en {time.time() - t_enrich_geojson_start:.2f}s") # REMOVED
 
@@ -488,7 +423,7 @@ else:
 # st.write("--- Iniciando Creación del Mapa Folium ---") # REMOVED
 # t_map_creation_start = time.time() # REMOVED
 
-if merged_gdf.empty or geojson_feature_collection_for_map is None or not geojson_feature_collection_for_map.get('features'):
+if merged_gdf.empty or (not use_vector_tiles and (geojson_feature_collection_for_map is None or not geojson_feature_collection_for_map.get('features'))):
     st.info(f"No hay datos suficientes para mostrar el mapa para el año {selected_year} con los filtros aplicados. Por favor, ajuste los filtros o seleccione otro año.")
     # st.write(f"Debug: merged_gdf empty: {merged_gdf.empty}, geojson_feature_collection_for_map is None: {geojson_feature_collection_for_map is None}") # REMOVED
     if geojson_feature_collection_for_map is not None:
@@ -536,47 +471,58 @@ elif bins[0] == bins[-1]: # Si todos los valores son iguales y no cero
 
 # st.write(f"Bins para leyenda: {bins}") # REMOVED
 
-try:
-    choropleth = folium.Choropleth(
-        geo_data=geojson_feature_collection_for_map, # Usar el GeoJSON FeatureCollection
+if use_vector_tiles:
+    colors = color_brewer("YlOrRd", n=len(bins) - 1)
+    CapaTeselasMunicipios(
+        vector_tiles_url,
+        valores=vector_tile_values(gdf_municipalities, merged_gdf, bins, colors, nan_color="lightgray"),
+        campos=['Población:', 'Área (km²):', 'Densidad (hab/km²):'],
         name="Densidad de Población",
-        data=merged_gdf,
-        columns=["mun_code", "densidad_poblacion"],
-        key_on="feature.properties.mun_code", # Clave en el GeoJSON
-        fill_color="YlOrRd",
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name="Densidad de Población (hab/km²)",
-        bins=bins, 
-        highlight=True,
-        nan_fill_color="lightgray", # Color para municipios sin datos
-        nan_fill_opacity=0.4
     ).add_to(m)
-
-    folium.GeoJsonTooltip(
-        fields=['mun_name', 'poblacion', 'area_km2', 'densidad_poblacion'],
-        aliases=['Municipio:', 'Población:', 'Área (km²):', 'Densidad (hab/km²):'],
-        localize=True,
-        sticky=False,
-        labels=True,
-        style="""
-            background-color: #F0EFEF;
-            border: 2px solid black;
-            border-radius: 3px;
-            box-shadow: 3px;
-        """
-    ).add_to(choropleth.geojson)
-
-except ValueError as ve:
-    st.error(f"Error al crear la capa Choropleth: {ve}")
-    st.info("Esto puede ocurrir si no hay suficientes variaciones en los datos de densidad para los 'bins' definidos, o si los datos espaciales no se cargaron correctamente.")
-    st.info(f"Detalles: merged_gdf tiene {len(merged_gdf)} filas. geojson_feature_collection_for_map tiene {len(geojson_feature_collection_for_map.get('features', [])) if geojson_feature_collection_for_map else 'N/A'} características.")
-    # st.dataframe(merged_gdf[['mun_code', 'densidad_poblacion']].head()) # REMOVED
-    st.stop()
-except Exception as e_choropleth:
-    st.error(f"Un error inesperado ocurrió al crear el mapa Choropleth: {e_choropleth}")
-    st.exception(e_choropleth)
-    st.stop()
+    StepColormap(colors, index=bins, vmin=bins[0], vmax=bins[-1],
+                 caption="Densidad de Población (hab/km²)").add_to(m)
+else:
+    try:
+        choropleth = folium.Choropleth(
+            geo_data=geojson_feature_collection_for_map, # Usar el GeoJSON FeatureCollection
+            name="Densidad de Población",
+            data=merged_gdf,
+            columns=["mun_code", "densidad_poblacion"],
+            key_on="feature.properties.mun_code", # Clave en el GeoJSON
+            fill_color="YlOrRd",
+            fill_opacity=0.7,
+            line_opacity=0.2,
+            legend_name="Densidad de Población (hab/km²)",
+            bins=bins, 
+            highlight=True,
+            nan_fill_color="lightgray", # Color para municipios sin datos
+            nan_fill_opacity=0.4
+        ).add_to(m)
+
+        folium.GeoJsonTooltip(
+            fields=['mun_name', 'poblacion', 'area_km2', 'densidad_poblacion'],
+            aliases=['Municipio:', 'Población:', 'Área (km²):', 'Densidad (hab/km²):'],
+            localize=True,
+            sticky=False,
+            labels=True,
+            style="""
+                background-color: #F0EFEF;
+                border: 2px solid black;
+                border-radius: 3px;
+                box-shadow: 3px;
+            """
+        ).add_to(choropleth.geojson)
+
+    except ValueError as ve:
+        st.error(f"Error al crear la capa Choropleth: {ve}")
+        st.info("Esto puede ocurrir si no hay suficientes variaciones en los datos de densidad para los 'bins' definidos, o si los datos espaciales no se cargaron correctamente.")
+        st.info(f"Detalles: merged_gdf tiene {len(merged_gdf)} filas. geojson_feature_collection_for_map tiene {len(geojson_feature_collection_for_map.get('features', [])) if geojson_feature_collection_for_map else 'N/A'} características.")
+        # st.dataframe(merged_gdf[['mun_code', 'densidad_poblacion']].head()) # REMOVED
+        st.stop()
+    except Exception as e_choropleth:
+        st.error(f"Un error inesperado ocurrió al crear el mapa Choropleth: {e_choropleth}")
+        st.exception(e_choropleth)
+        st.stop()
 
 
 folium.LayerControl().add_to(m)
@@ -595,7 +541,7 @@ if conn:
 st.markdown("---")
 st.markdown("#### Notas:")
 st.markdown("- La densidad de población se calcula como `población / área_km2`.")
-st.markdown("- El área se calcula reproyectando las geometrías a EPSG:25830 (ETRS89 / UTM Zone 30N). Esto es más preciso para la península. Las islas pueden tener ligeras distorsiones.")
+st.markdown("- El área se calcula una sola vez en el ETL (`ETL/GeoRef_Spain/construir_capa_municipios.py`, tabla `mun_area`) reproyectando las geometrías a EPSG:25830 (ETRS89 / UTM Zone 30N); los municipios de Canarias se proyectan en su huso, REGCAN95 / UTM Zone 28N (EPSG:4083).")
 st.markdown("- Los municipios sin datos de población para el año seleccionado o sin geometría válida no se muestran.")
 
 # Código original comentado para referencia (mapa de puntos simulados)
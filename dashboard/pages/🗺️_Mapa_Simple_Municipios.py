@@ -3,6 +3,7 @@ import folium
 import geopandas as gpd
 from streamlit_folium import st_folium
 import os
+import sys
 import pandas as pd # Added import
 import json # Added import
 
@@ -14,13 +15,35 @@ st.markdown("Este mapa muestra los polígonos de los municipios de España direc
 
 # --- Constantes ---\n# Updated to TopoJSON
 TOPOJSON_FILENAME = "georef-spain-municipio.topojson"
-TOPOJSON_PATH = os.path.join(
+TOPOJSON_DIR = os.path.join(
     os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
     "ETL",
     "GeoRef_Spain",
     "TopoJSON", # Added TopoJSON directory
-    TOPOJSON_FILENAME
 )
+TOPOJSON_PATH = os.path.join(TOPOJSON_DIR, TOPOJSON_FILENAME)
+# El mapa muestra España completa a zoom 6: se usa el nivel 'espana' de la pirámide de
+# convert_to_topojson.py si existe, o el TopoJSON de máximo detalle en su defecto.
+TOPOJSON_ESPANA_PATH = os.path.join(TOPOJSON_DIR, "georef-spain-municipio_espana.topojson")
+MAP_TOPOJSON_PATH = TOPOJSON_ESPANA_PATH if os.path.exists(TOPOJSON_ESPANA_PATH) else TOPOJSON_PATH
+
+# Teselas vectoriales (ETL/GeoRef_Spain/construir_teselas_vectoriales.py) servidas en local por
+# dashboard/servidor_teselas.py: si se activan (MAPA_TESELAS_VECTORIALES=1) y existen, el mapa las usa
+# en lugar del TopoJSON
+DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DASHBOARD_DIR)
+from servidor_teselas import ACTIVAR_TESELAS, MBTILES_PATH, CapaTeselasMunicipios, iniciar_en_segundo_plano  # noqa: E402
+
+@st.cache_resource
+def start_vector_tile_server(mbtiles_path):
+    """Arranca una sola vez el servidor local de teselas. Devuelve la URL de las teselas, o None si no hay MBTiles."""
+    if not os.path.exists(mbtiles_path):
+        return None
+    try:
+        return iniciar_en_segundo_plano(mbtiles_path)
+    except OSError as e:
+        st.warning(f"No se pudo iniciar el servidor local de teselas ({e}). Se usará el TopoJSON.")
+        return None
 
 # --- Funciones de Carga de Datos ---\n@st.cache_data
 def load_spatial_data(path): # Renamed function
@@ -77,8 +100,22 @@ def load_spatial_data(path): # Renamed function
         st.error(f"Error al cargar o procesar el archivo TopoJSON: {e}")
         return None
 
+# --- Teselas vectoriales ---
+# Solo con MAPA_TESELAS_VECTORIALES=1: el navegador tiene que llegar al servidor de teselas (ver servidor_teselas.py)
+vector_tiles_url = start_vector_tile_server(MBTILES_PATH) if ACTIVAR_TESELAS else None
+if vector_tiles_url:
+    st.subheader("Visualización del Mapa de Municipios (teselas vectoriales)")
+    m = folium.Map(location=[40.416775, -3.703790], zoom_start=6, tiles="cartodbpositron")
+    CapaTeselasMunicipios(vector_tiles_url, color_sin_valor='#FFEDA0',
+                          name="Municipios de España (teselas vectoriales)").add_to(m)
+    st_folium(m, width=None, height=700, use_container_width=True)
+    st.caption("Pasa el ratón sobre un municipio para ver su nombre y código. "
+               "Las teselas se sirven en local y solo se descargan las visibles.")
+    st.sidebar.info("Mapa de prueba de las teselas vectoriales de municipios y CCAA servidas en local.")
+    st.stop()
+
 # --- Cargar Datos ---
-gdf_municipios = load_spatial_data(TOPOJSON_PATH) # Updated function call and path variable
+gdf_municipios = load_spatial_data(MAP_TOPOJSON_PATH) # Updated function call and path variable
 
 if gdf_municipios is not None and not gdf_municipios.empty:
     st.subheader("Visualización del Mapa de Municipios (desde TopoJSON)") # Updated subheader
@@ -102,7 +139,7 @@ if gdf_municipios is not None and not gdf_municipios.empty:
 
     try:
         # Leer el contenido del archivo TopoJSON
-        with open(TOPOJSON_PATH, 'r', encoding='utf-8') as f:
+        with open(MAP_TOPOJSON_PATH, 'r', encoding='utf-8') as f:
             topojson_data = json.load(f)
 
         folium.TopoJson(
@@ -133,17 +170,18 @@ if gdf_municipios is not None and not gdf_municipios.empty:
 
         # Mostrar el mapa en Streamlit
         st_folium(m, width=None, height=700, use_container_width=True)
-        st.caption("Pasa el ratón sobre un municipio para ver su nombre y código.")
+        st.caption("Pasa el ratón sobre un municipio para ver su nombre y código. "
+                   f"Geometría: {os.path.basename(MAP_TOPOJSON_PATH)} ({os.path.getsize(MAP_TOPOJSON_PATH) / 1e6:.1f} MB).")
 
     except Exception as e:
         st.error(f"Error al generar la capa TopoJson para Folium: {e}") # Updated message
         st.error("Esto podría deberse a problemas con el object_path, los nombres de las columnas para los tooltips o con los datos de geometría.")
         st.error(f"Columnas disponibles en gdf_municipios (usadas para inferir propiedades de tooltip): {gdf_municipios.columns.tolist()}")
         st.error(f"Campos seleccionados para tooltip: {tooltip_fields}")
-        st.error(f"Asegúrate de que el archivo TopoJSON en '{TOPOJSON_PATH}' es válido y que el object_path 'objects.municipios' es correcto.")
+        st.error(f"Asegúrate de que el archivo TopoJSON en '{MAP_TOPOJSON_PATH}' es válido y que el object_path 'objects.municipios' es correcto.")
 
 else:
     st.warning("No se pudieron cargar los datos geoespaciales de los municipios o el archivo está vacío.")
-    st.info(f"Ruta intentada para el TopoJSON: {TOPOJSON_PATH}") # Updated message
+    st.info(f"Ruta intentada para el TopoJSON: {MAP_TOPOJSON_PATH}") # Updated message
 
 st.sidebar.info("Este es un mapa de prueba para verificar la carga y visualización de polígonos municipales desde un archivo TopoJSON.") # Updated sidebar info
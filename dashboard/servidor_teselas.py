@@ -0,0 +1,246 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from folium.plugins import VectorGridProtobuf
+from folium.template import Template
+
+# Servidor local de las teselas vectoriales de municipios y CCAA generadas por
+# ETL/GeoRef_Spain/construir_teselas_vectoriales.py (MBTiles), y capa Folium que las consume.
+#   GET /{z}/{x}/{y}.pbf  -> tesela (gzip); 204 si no hay tesela en esa posición
+#   GET /metadata.json    -> metadatos del MBTiles
+# Las páginas de mapas lo arrancan en segundo plano (iniciar_en_segundo_plano); también
+# puede ejecutarse solo: python dashboard/servidor_teselas.py
+#
+# Las teselas las pide el navegador, no Streamlit: con el servidor en 127.0.0.1 solo se ven si el
+# navegador corre en la misma máquina. Por eso los mapas solo las usan si se activan
+# (MAPA_TESELAS_VECTORIALES=1); por defecto siguen incrustando el GeoJSON/TopoJSON.
+# En un despliegue remoto, además de activarlas:
+#   MAPA_TESELAS_HOST  interfaz en la que escucha el servidor (p. ej. 0.0.0.0)
+#   MAPA_TESELAS_PORT  puerto (8765 por defecto)
+#   MAPA_TESELAS_URL   URL base con la que el navegador llega al servidor (p. ej. https://mapas.ejemplo.es/teselas)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MBTILES_PATH = os.path.join(BASE_DIR, "ETL", "GeoRef_Spain", "teselas", "georef-spain.mbtiles")
+ACTIVAR_TESELAS = os.environ.get("MAPA_TESELAS_VECTORIALES", "").strip().lower() in ("1", "true", "si", "sí", "yes")
+HOST = os.environ.get("MAPA_TESELAS_HOST", "127.0.0.1")
+PORT = int(os.environ.get("MAPA_TESELAS_PORT", "8765"))
+URL_PUBLICA = os.environ.get("MAPA_TESELAS_URL") or None
+MAX_NATIVE_ZOOM = 10  # MAX_ZOOM de construir_teselas_vectoriales.py, si el MBTiles no indica el suyo
+
+RUTA_TESELA = re.compile(r"^/(\d+)/(\d+)/(\d+)\.pbf$")
+
+
+class ArchivoMBTiles:
+    """Lectura de teselas de un MBTiles (conexión de solo lectura por petición, así se ve al momento un MBTiles regenerado)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _consultar(self, sql, parametros=()):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            return conn.execute(sql, parametros).fetchall()
+        finally:
+            conn.close()
+
+    def tesela(self, z, x, y):
+        """Datos (gzip) de la tesela XYZ, o None. MBTiles guarda las filas en esquema TMS."""
+        filas = self._consultar(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, 2 ** z - 1 - y))
+        return filas[0][0] if filas else None
+
+    def metadatos(self):
+        metadatos = dict(self._consultar("SELECT name, value FROM metadata"))
+        if 'json' in metadatos:
+            metadatos.update(json.loads(metadatos.pop('json')))
+        return metadatos
+
+
+def zoom_maximo(mbtiles_path=MBTILES_PATH):
+    """Zoom máximo del MBTiles; por encima el cliente escala las teselas de ese zoom."""
+    try:
+        return int(ArchivoMBTiles(mbtiles_path).metadatos().get('maxzoom', MAX_NATIVE_ZOOM))
+    except (sqlite3.Error, ValueError):
+        return MAX_NATIVE_ZOOM
+
+
+class ManejadorTeselas(BaseHTTPRequestHandler):
+    archivo = None  # ArchivoMBTiles; se fija en crear_servidor
+
+    def do_GET(self):
+        ruta = self.path.split('?', 1)[0]
+        match = RUTA_TESELA.match(ruta)
+        if match:
+            z, x, y = map(int, match.groups())
+            datos = self.archivo.tesela(z, x, y)
+            if datos is None:
+                self._responder(204)
+            else:
+                self._responder(200, datos, {'Content-Type': 'application/x-protobuf', 'Content-Encoding': 'gzip',
+                                             'Cache-Control': 'public, max-age=86400'})
+        elif ruta == '/metadata.json':
+            datos = json.dumps(self.archivo.metadatos(), ensure_ascii=False).encode('utf-8')
+            self._responder(200, datos, {'Content-Type': 'application/json; charset=utf-8'})
+        else:
+            self._responder(404)
+
+    def _responder(self, estado, datos=b'', cabeceras=None):
+        self.send_response(estado)
+        # El mapa se sirve desde el origen de Streamlit: las teselas necesitan CORS
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        if datos:
+            self.wfile.write(datos)
+
+    def log_message(self, format, *args):
+        pass  # una línea por tesela ensuciaría el log de Streamlit
+
+
+def crear_servidor(mbtiles_path=MBTILES_PATH, host=HOST, port=PORT):
+    manejador = type('ManejadorMBTiles', (ManejadorTeselas,), {'archivo': ArchivoMBTiles(mbtiles_path)})
+    servidor = ThreadingHTTPServer((host, port), manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+def host_local(host):
+    """Dirección para conectarse al servidor desde esta máquina (0.0.0.0 o :: escuchan en todas las interfaces)."""
+    return "127.0.0.1" if host in ("", "0.0.0.0", "::") else host
+
+
+def url_teselas(host=HOST, port=PORT, url_publica=URL_PUBLICA):
+    """Plantilla de URL de las teselas para Leaflet (la que usa el navegador)."""
+    base = url_publica.rstrip("/") if url_publica else f"http://{host_local(host)}:{port}"
+    return f"{base}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+def servidor_activo(host=HOST, port=PORT):
+    try:
+        with urllib.request.urlopen(f"http://{host_local(host)}:{port}/metadata.json", timeout=1) as respuesta:
+            return respuesta.status == 200
+    except OSError:
+        return False
+
+
+def iniciar_en_segundo_plano(mbtiles_path=MBTILES_PATH, host=HOST, port=PORT):
+    """
+    Arranca el servidor en un hilo daemon, o reutiliza el que ya escucha en host:port
+    (otra sesión de Streamlit o el servidor lanzado a mano). Devuelve la plantilla de URL.
+    """
+    if not servidor_activo(host, port):
+        servidor = crear_servidor(mbtiles_path, host, port)
+        threading.Thread(target=servidor.serve_forever, name="servidor-teselas", daemon=True).start()
+    return url_teselas(host, port)
+
+
+class CapaTeselasMunicipios(VectorGridProtobuf):
+    """
+    Capa Folium de las teselas vectoriales de municipios (y bordes de CCAA) con el color y el
+    tooltip de cada municipio resueltos en el navegador por mun_code.
+
+    Args:
+        url: plantilla de URL de las teselas (ver url_teselas)
+        valores: {mun_code: [color, valor_1, valor_2, ...]} con los valores de `campos`
+        campos: etiquetas del tooltip para valor_1, valor_2, ...
+        color_sin_valor: color de los municipios que no están en `valores` (None = no se dibujan)
+        max_native_zoom: zoom máximo de las teselas (por defecto, el del MBTiles de MBTILES_PATH)
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) -%}
+        var {{ this.get_name() }} = (function () {
+            var valores = {{ this.valores|tojson }};
+            var campos = {{ this.campos|tojson }};
+            var colorSinValor = {{ this.color_sin_valor|tojson }};
+            var formato = new Intl.NumberFormat('es-ES', {maximumFractionDigits: 2});
+            var oculto = {fill: false, stroke: false, weight: 0};
+
+            var capa = L.vectorGrid.protobuf('{{ this.url }}', {
+                rendererFactory: L.canvas.tile,
+                interactive: true,
+                maxNativeZoom: {{ this.max_native_zoom }},
+                getFeatureId: function (f) { return f.properties.mun_code; },
+                vectorTileLayerStyles: {
+                    municipios: function (props) {
+                        var v = valores[props.mun_code];
+                        var fillColor = v ? v[0] : colorSinValor;
+                        if (!fillColor) { return oculto; }
+                        return {fill: true, fillColor: fillColor, fillOpacity: 0.7, color: 'black', weight: 0.3, opacity: 0.5};
+                    },
+                    comunidades: {fill: false, color: '#333333', weight: 1.2, opacity: 0.8}
+                }
+            });
+
+            function texto(props) {
+                var v = valores[props.mun_code];
+                var lineas = ['<b>Municipio:</b> ' + props.mun_name, '<b>Cód. Municipio:</b> ' + props.mun_code];
+                if (v) {
+                    campos.forEach(function (campo, i) {
+                        var valor = v[i + 1];
+                        lineas.push('<b>' + campo + '</b> ' +
+                            (valor === null ? 'sin datos' : (typeof valor === 'number' ? formato.format(valor) : valor)));
+                    });
+                }
+                return lineas.join('<br>');
+            }
+
+            var tooltip = L.tooltip({sticky: true});
+            capa.on('mouseover', function (e) {
+                var props = e.layer.properties;
+                if (!props || props.mun_code === undefined) { return; }
+                if (!valores[props.mun_code] && !colorSinValor) { return; }
+                tooltip.setLatLng(e.latlng).setContent(texto(props)).openOn({{ this._parent.get_name() }});
+            });
+            capa.on('mousemove', function (e) { tooltip.setLatLng(e.latlng); });
+            capa.on('mouseout', function () { {{ this._parent.get_name() }}.closeTooltip(tooltip); });
+            return capa;
+        })();
+        {%- endmacro %}
+        """
+    )
+
+    def __init__(self, url, valores=None, campos=None, color_sin_valor=None, name=None,
+                 max_native_zoom=None, overlay=True, control=True, show=True):
+        super().__init__(url, name=name, overlay=overlay, control=control, show=show)
+        self._name = "CapaTeselasMunicipios"
+        self.valores = valores or {}
+        self.campos = campos or []
+        self.color_sin_valor = color_sin_valor
+        self.max_native_zoom = max_native_zoom if max_native_zoom is not None else zoom_maximo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sirve las teselas vectoriales de municipios y CCAA (MBTiles).")
+    parser.add_argument("--mbtiles", default=MBTILES_PATH)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.mbtiles):
+        print(f"❌ No se encontró {args.mbtiles}. Ejecute 'python ETL/GeoRef_Spain/construir_teselas_vectoriales.py'.")
+        return 1
+    servidor = crear_servidor(args.mbtiles, args.host, args.port)
+    print(f"✅ Sirviendo {args.mbtiles} en {url_teselas(args.host, args.port)} (Ctrl+C para detener)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,60 @@
-\
-import sqlite3
-import pyodbc
+"""
+Bulk, resumable migration of the SQLite data warehouse to Azure SQL.
+
+- Rows are streamed from SQLite in fixed-size chunks (never the whole table).
+- Each table is copied by its own worker with its own source and target
+  connections; several tables are migrated in parallel.
+- Inserts use pyodbc `fast_executemany` (parameter arrays, one round trip per
+  chunk) on Azure SQL.
+- A per-table checkpoint (rows copied so far) is committed in the target in
+  the same transaction as each chunk, so an interrupted run continues where it
+  stopped instead of starting over.
+- The checkpoint stores a fingerprint of the source table (SHA-256 of its
+  DDL and rows). If the source changes (e.g. the warehouse is rebuilt), the
+  checkpoint no longer matches and the table is copied again from scratch.
+- Views are recreated in the target from the warehouse schema
+  ("database 2/esquema_dw.py"): the VISTAS views and the wide compatibility
+  views of the FORMATO_LARGO datasets. At the end, every source table and view
+  is checked to exist in the target.
+- The target is pluggable: `AzureSQLTarget` for Azure SQL / SQL Server, or
+  `SQLiteTarget` to migrate into a second SQLite file through the same
+  interface (useful to test the migration locally without a SQL Server).
+
+Usage:
+    AZURE_DB_PASSWORD=... python migrar_sqlite_a_azure_sql.py
+    python migrar_sqlite_a_azure_sql.py --sqlite-target /tmp/copia.db
+    python migrar_sqlite_a_azure_sql.py --restart tabla_equivalencias PIE
+"""
+
+import argparse
+import hashlib
+import os
 import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-print("--- Script top level: Imports loaded ---", flush=True)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'database 2'))
+from esquema_dw import FORMATO_LARGO, VISTAS
 
 # --- CONFIGURATION ---
-# Azure SQL Database connection details (FILL THESE IN)
-AZURE_DB_SERVER   = 'servidor-tfg.database.windows.net'
-AZURE_DB_NAME     = 'tfg-database'
-AZURE_DB_USER = 'agmalaga2020'
-AZURE_DB_PASSWORD = 'sJc!Ld5R.k6kT9r'
+# Azure SQL Database connection details, read from the environment
+AZURE_DB_SERVER = os.environ.get('AZURE_DB_SERVER', 'servidor-tfg.database.windows.net')
+AZURE_DB_NAME = os.environ.get('AZURE_DB_NAME', 'tfg-database')
+AZURE_DB_USER = os.environ.get('AZURE_DB_USER', 'agmalaga2020')
+AZURE_DB_PASSWORD = os.environ.get('AZURE_DB_PASSWORD', '')
 # Common drivers: 'ODBC Driver 17 for SQL Server', 'ODBC Driver 18 for SQL Server'
 # Ensure this driver is installed on your system
-AZURE_DB_DRIVER = '{ODBC Driver 17 for SQL Server}'
+AZURE_DB_DRIVER = os.environ.get('AZURE_DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
 
-# SQLite database file path
-SQLITE_DB_PATH = '/home/agmalaga/Documentos/GitHub/PolicySpace2_Spanish_data/data base/datawarehouse.db'
+# SQLite database file path (the warehouse built by "database 2/etl_load_data.py" by default)
+SQLITE_DB_PATH = os.environ.get('SQLITE_DB_PATH', os.path.join(REPO_DIR, 'database 2', 'datawarehouse_v2.db'))
 
-print(f"--- Script top level: SQLITE_DB_PATH = {SQLITE_DB_PATH} ---", flush=True)
+CHUNK_SIZE = 10_000
+MAX_WORKERS = 4
+CHECKPOINT_TABLE = 'migration_checkpoint'
 
 # --- HELPER FUNCTIONS ---
 
@@ -28,13 +64,13 @@ def clean_name(name):
     # If name is purely numeric (like "1996"), prefix it
     if re.match(r'^\d+$', name):
         return f'Anio_{name}'
-    
+
     # Replace spaces and special characters with underscores
     name = re.sub(r'[^a-zA-Z0-9_]', '_', name)
-    
+
     # Remove leading/trailing underscores that might result from replacements
     name = name.strip('_')
-    
+
     # Avoid names starting with a number if not already handled (e.g. after stripping underscores)
     if name and name[0].isdigit():
         name = f'_{name}' # Generic prefix if it still starts with a digit
@@ -42,13 +78,13 @@ def clean_name(name):
     # Ensure name is not empty after cleaning
     if not name:
         return '_unnamed_column'
-        
+
     return name
 
 def map_sqlite_type_to_azure(sqlite_type):
     """Maps SQLite data types to Azure SQL data types."""
     sqlite_type_upper = sqlite_type.upper() if sqlite_type else ''
-    
+
     if 'INT' in sqlite_type_upper: # INTEGER, BIGINT
         return 'BIGINT'
     elif 'TEXT' in sqlite_type_upper or 'CHAR' in sqlite_type_upper or 'CLOB' in sqlite_type_upper:
@@ -64,217 +100,437 @@ def map_sqlite_type_to_azure(sqlite_type):
     else:
         return 'NVARCHAR(MAX)' # Default fallback
 
+# --- TARGETS ---
+# Both targets expose the same interface; each worker calls connect() to get
+# its own connection and passes it back to the other methods.
+
+class AzureSQLTarget:
+    """Azure SQL / SQL Server target through pyodbc."""
+
+    def __init__(self, server, database, user, password, driver):
+        self.server = server
+        self.database = database
+        self.user = user
+        self.password = password
+        self.driver = driver
+
+    def describe(self):
+        return f"Azure SQL: Server={self.server}, DB={self.database}, User={self.user}"
+
+    def connect(self):
+        import pyodbc  # only needed for this target
+
+        conn_str = (
+            f'DRIVER={self.driver};'
+            f'SERVER={self.server};'
+            f'DATABASE={self.database};'
+            f'UID={self.user};'
+            f'PWD={self.password};'
+            f'Encrypt=yes;'
+            f'TrustServerCertificate=no;'
+            f'Connection Timeout=30;'
+        )
+        conn = pyodbc.connect(conn_str, autocommit=False)
+        return conn
+
+    def map_type(self, sqlite_type):
+        return map_sqlite_type_to_azure(sqlite_type)
+
+    def ensure_checkpoint_table(self, conn):
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[{CHECKPOINT_TABLE}]') AND type in (N'U'))
+            CREATE TABLE [dbo].[{CHECKPOINT_TABLE}] (
+                [table_name] NVARCHAR(256) NOT NULL PRIMARY KEY,
+                [rows_copied] BIGINT NOT NULL,
+                [completed] BIT NOT NULL,
+                [source_fingerprint] NVARCHAR(64) NULL
+            );
+        """)
+        # Checkpoint tables created before the fingerprint column existed
+        cursor.execute(f"""
+        IF COL_LENGTH(N'[dbo].[{CHECKPOINT_TABLE}]', 'source_fingerprint') IS NULL
+            ALTER TABLE [dbo].[{CHECKPOINT_TABLE}] ADD [source_fingerprint] NVARCHAR(64) NULL;
+        """)
+        conn.commit()
+
+    def read_checkpoint(self, conn, table):
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT [rows_copied], [completed], [source_fingerprint] FROM [dbo].[{CHECKPOINT_TABLE}] "
+                       f"WHERE [table_name] = ?", table)
+        row = cursor.fetchone()
+        return (int(row[0]), bool(row[1]), row[2]) if row else None
+
+    def write_checkpoint(self, cursor, table, rows_copied, completed, fingerprint):
+        cursor.execute(f"""
+        MERGE [dbo].[{CHECKPOINT_TABLE}] AS t
+        USING (SELECT ? AS [table_name], ? AS [rows_copied], ? AS [completed], ? AS [source_fingerprint]) AS s
+        ON t.[table_name] = s.[table_name]
+        WHEN MATCHED THEN UPDATE SET [rows_copied] = s.[rows_copied], [completed] = s.[completed],
+                                     [source_fingerprint] = s.[source_fingerprint]
+        WHEN NOT MATCHED THEN INSERT ([table_name], [rows_copied], [completed], [source_fingerprint])
+            VALUES (s.[table_name], s.[rows_copied], s.[completed], s.[source_fingerprint]);
+        """, table, rows_copied, int(completed), fingerprint)
+
+    def create_table(self, conn, table, column_defs, drop_existing):
+        cursor = conn.cursor()
+        if drop_existing:
+            cursor.execute(f"IF OBJECT_ID(N'[dbo].[{table}]', 'U') IS NOT NULL DROP TABLE [dbo].[{table}];")
+        cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[{table}]') AND type in (N'U'))
+        BEGIN
+            CREATE TABLE [dbo].[{table}] ({', '.join(f'[{name}] {col_type}' for name, col_type in column_defs)});
+        END
+        """)
+        conn.commit()
+
+    def insert_chunk(self, conn, table, columns, rows, rows_copied, completed, fingerprint):
+        """Inserts one chunk and advances the checkpoint in the same transaction."""
+        cursor = conn.cursor()
+        cursor.fast_executemany = True
+        insert_sql = (f"INSERT INTO [dbo].[{table}] ({', '.join(f'[{c}]' for c in columns)}) "
+                      f"VALUES ({', '.join(['?'] * len(columns))});")
+        try:
+            if rows:
+                cursor.executemany(insert_sql, rows)
+            self.write_checkpoint(cursor, table, rows_copied, completed, fingerprint)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def create_view(self, conn, view, select_sql):
+        cursor = conn.cursor()
+        cursor.execute(f"IF OBJECT_ID(N'[dbo].[{view}]', 'V') IS NOT NULL DROP VIEW [dbo].[{view}];")
+        cursor.execute(f"EXEC('CREATE VIEW [dbo].[{view}] AS {select_sql.replace(chr(39), chr(39) * 2)}');")
+        conn.commit()
+
+    def list_objects(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sys.objects WHERE type IN ('U', 'V') AND schema_id = SCHEMA_ID('dbo')")
+        return {row[0] for row in cursor.fetchall()}
+
+
+class SQLiteTarget:
+    """Second SQLite database as target (same interface as AzureSQLTarget)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def describe(self):
+        return f"SQLite: {self.path}"
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def map_type(self, sqlite_type):
+        return sqlite_type or ''
+
+    def ensure_checkpoint_table(self, conn):
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS [{CHECKPOINT_TABLE}] (
+            [table_name] TEXT NOT NULL PRIMARY KEY,
+            [rows_copied] INTEGER NOT NULL,
+            [completed] INTEGER NOT NULL,
+            [source_fingerprint] TEXT
+        )""")
+        # Checkpoint tables created before the fingerprint column existed
+        columns = [info[1] for info in conn.execute(f"PRAGMA table_info([{CHECKPOINT_TABLE}])")]
+        if 'source_fingerprint' not in columns:
+            conn.execute(f"ALTER TABLE [{CHECKPOINT_TABLE}] ADD COLUMN [source_fingerprint] TEXT")
+        conn.commit()
+
+    def read_checkpoint(self, conn, table):
+        row = conn.execute(
+            f"SELECT [rows_copied], [completed], [source_fingerprint] FROM [{CHECKPOINT_TABLE}] "
+            f"WHERE [table_name] = ?", (table,)
+        ).fetchone()
+        return (int(row[0]), bool(row[1]), row[2]) if row else None
+
+    def create_table(self, conn, table, column_defs, drop_existing):
+        if drop_existing:
+            conn.execute(f"DROP TABLE IF EXISTS [{table}]")
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS [{table}] ({', '.join(f'[{name}] {col_type}' for name, col_type in column_defs)})"
+        )
+        conn.commit()
+
+    def insert_chunk(self, conn, table, columns, rows, rows_copied, completed, fingerprint):
+        """Inserts one chunk and advances the checkpoint in the same transaction."""
+        insert_sql = (f"INSERT INTO [{table}] ({', '.join(f'[{c}]' for c in columns)}) "
+                      f"VALUES ({', '.join(['?'] * len(columns))})")
+        with conn:
+            if rows:
+                conn.executemany(insert_sql, rows)
+            conn.execute(
+                f"INSERT OR REPLACE INTO [{CHECKPOINT_TABLE}] "
+                f"([table_name], [rows_copied], [completed], [source_fingerprint]) VALUES (?, ?, ?, ?)",
+                (table, rows_copied, int(completed), fingerprint)
+            )
+
+    def create_view(self, conn, view, select_sql):
+        conn.execute(f"DROP VIEW IF EXISTS [{view}]")
+        conn.execute(f"CREATE VIEW [{view}] AS {select_sql}")
+        conn.commit()
+
+    def list_objects(self, conn):
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+
+
 # --- MAIN MIGRATION LOGIC ---
 
-def migrate_data():
-    print("--- Starting migrate_data() function ---", flush=True)
+def list_sqlite_tables(sqlite_path):
+    """Tables of the source database (excluding sqlite internal tables)."""
+    with sqlite3.connect(sqlite_path) as conn:
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name;"
+        ).fetchall()
+    return [row[0] for row in rows]
 
-    # Connect to SQLite
-    print(f"Attempting to connect to SQLite database: {SQLITE_DB_PATH}", flush=True)
-    try:
-        sqlite_conn = sqlite3.connect(SQLITE_DB_PATH)
-        sqlite_cursor = sqlite_conn.cursor()
-        print("Successfully connected to SQLite.", flush=True)
-    except Exception as e_sqlite:
-        print(f"!!! Critical error connecting to SQLite: {e_sqlite} !!!", flush=True)
-        return
-
-    # Connect to Azure SQL
-    print(f"Attempting to connect to Azure SQL database: Server={AZURE_DB_SERVER}, DB={AZURE_DB_NAME}, User={AZURE_DB_USER}", flush=True)
-    
-    # --- Enhanced Placeholder Check ---
-    placeholder_server = 'your_server_name.database.windows.net'
-    placeholder_user = 'your_username'
-    placeholder_password = 'your_password'
-
-    print(f"--- DEBUG: Checking placeholders ---", flush=True)
-    print(f"--- DEBUG: AZURE_DB_SERVER   = '{AZURE_DB_SERVER}' (Type: {type(AZURE_DB_SERVER)})", flush=True)
-    print(f"--- DEBUG: placeholder_server = '{placeholder_server}' (Type: {type(placeholder_server)})", flush=True)
-    print(f"--- DEBUG: Comparison 1 (Server): {AZURE_DB_SERVER == placeholder_server}", flush=True)
-
-    print(f"--- DEBUG: AZURE_DB_USER     = '{AZURE_DB_USER}' (Type: {type(AZURE_DB_USER)})", flush=True)
-    print(f"--- DEBUG: placeholder_user   = '{placeholder_user}' (Type: {type(placeholder_user)})", flush=True)
-    print(f"--- DEBUG: Comparison 2 (User): {AZURE_DB_USER == placeholder_user}", flush=True)
-
-    print(f"--- DEBUG: AZURE_DB_PASSWORD  = '{AZURE_DB_PASSWORD}' (Type: {type(AZURE_DB_PASSWORD)})", flush=True)
-    print(f"--- DEBUG: placeholder_password= '{placeholder_password}' (Type: {type(placeholder_password)})", flush=True)
-    print(f"--- DEBUG: Comparison 3 (Password): {AZURE_DB_PASSWORD == placeholder_password}", flush=True)
-    
-    is_placeholder_server = AZURE_DB_SERVER == placeholder_server
-    is_placeholder_user = AZURE_DB_USER == placeholder_user
-    is_placeholder_password = AZURE_DB_PASSWORD == placeholder_password
-
-    if is_placeholder_server or is_placeholder_user or is_placeholder_password:
-        print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!", flush=True)
-        print("!!! ERROR: Azure SQL credentials are still placeholders. Please fill them in. !!!", flush=True)
-        print(f"--- DEBUG: Triggered by: Server={is_placeholder_server}, User={is_placeholder_user}, Password={is_placeholder_password} ---", flush=True)
-        print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!", flush=True)
-        sqlite_conn.close()
-        print("SQLite connection closed due to placeholder credentials.", flush=True)
-        return
-
-    azure_conn_str = (
-        f'DRIVER={AZURE_DB_DRIVER};'
-        f'SERVER={AZURE_DB_SERVER};'
-        f'DATABASE={AZURE_DB_NAME};'
-        f'UID={AZURE_DB_USER};'
-        f'PWD={AZURE_DB_PASSWORD};'
-        f'Encrypt=yes;'
-        f'TrustServerCertificate=no;'
-        f'Connection Timeout=30;'
+
+def list_sqlite_views(sqlite_path):
+    """Views of the source database."""
+    with sqlite3.connect(sqlite_path) as conn:
+        rows = conn.execute("SELECT name FROM sqlite_master WHERE type='view' ORDER BY name;").fetchall()
+    return [row[0] for row in rows]
+
+
+def wide_view_sql(sqlite_conn, view_name, id_col='mun_code'):
+    """
+    SELECT of the wide compatibility view of a FORMATO_LARGO dataset over the
+    migrated long and attribute tables (same shape as esquema_dw.crear_vista_ancha).
+    Identifiers go through clean_name like every migrated column, so the year
+    columns are named as the wide tables used to be in Azure SQL (e.g. Anio_2019).
+    """
+    long_table, value_col, attributes_table = FORMATO_LARGO[view_name]
+    years = [row[0] for row in sqlite_conn.execute(f"SELECT DISTINCT [year] FROM [{long_table}] ORDER BY [year]")]
+    year_columns = ", ".join(
+        f"MAX(CASE WHEN [year] = {int(y)} THEN [{clean_name(value_col)}] END) AS [{clean_name(y)}]" for y in years
     )
-    print(f"Using Azure connection string (password redacted): DRIVER={AZURE_DB_DRIVER};SERVER={AZURE_DB_SERVER};DATABASE={AZURE_DB_NAME};UID={AZURE_DB_USER};PWD=********;Encrypt=yes;TrustServerCertificate=no;Connection Timeout=30;", flush=True)
+    id_target = clean_name(id_col)
+    select_sql = (f"SELECT [{id_target}], {year_columns} FROM [{clean_name(long_table)}] "
+                  f"GROUP BY [{id_target}]")
+
+    attribute_columns = [info[1] for info in sqlite_conn.execute(f"PRAGMA table_info([{attributes_table}])")
+                         if info[1] != id_col]
+    if attribute_columns:
+        select_sql = (f"SELECT p.*{''.join(f', a.[{clean_name(c)}]' for c in attribute_columns)} "
+                      f"FROM ({select_sql}) AS p LEFT JOIN [{clean_name(attributes_table)}] AS a "
+                      f"ON a.[{id_target}] = p.[{id_target}]")
+    return select_sql
 
+
+def views_to_create(sqlite_path):
+    """
+    {view: SELECT} to recreate in the target: the esquema_dw.VISTAS views and the
+    FORMATO_LARGO wide views whose source tables exist in the source database.
+    """
+    source_tables = set(list_sqlite_tables(sqlite_path))
+    views = {view: select_sql for view, (depends_on, select_sql) in VISTAS.items()
+             if set(depends_on) <= source_tables}
+    with sqlite3.connect(sqlite_path) as conn:
+        for view_name, (long_table, _, _) in FORMATO_LARGO.items():
+            if long_table in source_tables:
+                views[view_name] = wide_view_sql(conn, view_name)
+    return views
+
+
+def missing_in_target(target, sqlite_path, tables):
+    """Source tables (of `tables`) and source views that do not exist in the target."""
+    conn = target.connect()
     try:
-        azure_conn = pyodbc.connect(azure_conn_str)
-        azure_cursor = azure_conn.cursor()
-        print("Successfully connected to Azure SQL.", flush=True)
-    except pyodbc.Error as ex:
-        sqlstate = ex.args[0] if ex.args and len(ex.args) > 0 else "Unknown SQL state"
-        detailed_error_message = str(ex)
-        print(f"!!! pyodbc.Error connecting to Azure SQL. SQLSTATE: {sqlstate} !!!", flush=True)
-        print(f"Full pyodbc error details: {detailed_error_message}", flush=True)
-        sqlite_conn.close()
-        print("SQLite connection closed due to Azure connection error.", flush=True)
-        return
-    except Exception as e_generic_azure:
-        print(f"!!! A non-pyodbc error occurred while trying to connect to Azure SQL: {e_generic_azure} !!!", flush=True)
-        sqlite_conn.close()
-        print("SQLite connection closed due to Azure connection error.", flush=True)
-        return
+        present = target.list_objects(conn)
+    finally:
+        conn.close()
+    expected = list(tables) + list_sqlite_views(sqlite_path)
+    return [name for name in expected if clean_name(name) not in present]
+
 
-    # Get list of tables from SQLite (excluding sqlite internal tables)
-    print("Fetching list of tables from SQLite...", flush=True)
-    sqlite_cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-    tables = [row[0] for row in sqlite_cursor.fetchall()]
-    print(f"Found tables: {tables}", flush=True)
+def source_order_by(sqlite_conn, table_name, columns_info):
+    """
+    Stable row order for chunked reads, so that a resumed run can skip the rows
+    it already copied: rowid for ordinary tables, the primary key for
+    WITHOUT ROWID tables.
+    """
+    without_rowid = sqlite_conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name = ?", (table_name,)
+    ).fetchone()[0].upper().rstrip().endswith('WITHOUT ROWID')
+    if not without_rowid:
+        return 'rowid'
+    pk_cols = [info[1] for info in sorted(columns_info, key=lambda info: info[5]) if info[5] > 0]
+    return ', '.join(f'"{c}"' for c in pk_cols)
+
+
+def source_fingerprint(sqlite_conn, table_name, select_cols, order_by, chunk_size):
+    """
+    SHA-256 of the table's DDL and of its rows in copy order. A rebuilt source
+    with the same row count but different values (or a different schema) gets
+    a different fingerprint, so a stale checkpoint is never trusted.
+    """
+    digest = hashlib.sha256()
+    ddl = sqlite_conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name = ?", (table_name,)
+    ).fetchone()[0]
+    digest.update(ddl.encode('utf-8'))
+    cursor = sqlite_conn.execute(f'SELECT {select_cols} FROM "{table_name}" ORDER BY {order_by}')
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        digest.update(repr(rows).encode('utf-8'))
+    return digest.hexdigest()
 
 
-    for table_name in tables:
-        print(f"\nProcessing table: {table_name}", flush=True)
-        azure_table_name = clean_name(table_name)
-        
+def migrate_table(target, sqlite_path, table_name, chunk_size, restart=False):
+    """Copies one table; runs inside a worker thread with its own connections."""
+    azure_table_name = clean_name(table_name)
+    sqlite_conn = sqlite3.connect(sqlite_path)
+    target_conn = target.connect()
+    try:
         # Get SQLite table schema
-        sqlite_cursor.execute(f"PRAGMA table_info('{table_name}');")
-        columns_info = sqlite_cursor.fetchall()
-        
+        # info: (cid, name, type, notnull, dflt_value, pk)
+        columns_info = sqlite_conn.execute(f"PRAGMA table_info('{table_name}');").fetchall()
         if not columns_info:
-            print(f"Could not get schema for table {table_name}. Skipping.", flush=True)
-            continue
-
-        # Create Azure SQL table
-        azure_columns_defs = []
-        column_names_sqlite = []
-        column_names_azure = []
-
-        for col_info in columns_info:
-            # col_info: (cid, name, type, notnull, dflt_value, pk)
-            col_name_sqlite = col_info[1]
-            col_type_sqlite = col_info[2]
-            
-            col_name_azure = clean_name(col_name_sqlite)
-            col_type_azure = map_sqlite_type_to_azure(col_type_sqlite)
-            
-            azure_columns_defs.append(f"[{col_name_azure}] {col_type_azure}")
-            column_names_sqlite.append(col_name_sqlite)
-            column_names_azure.append(f"[{col_name_azure}]")
-
-
-        # Check if table exists in Azure SQL
-        check_table_exists_sql = f"""
-        IF NOT EXISTS (SELECT * FROM sys.objects WHERE object_id = OBJECT_ID(N'[dbo].[{azure_table_name}]') AND type in (N'U'))
-        BEGIN
-            CREATE TABLE [dbo].[{azure_table_name}] ({', '.join(azure_columns_defs)});
-        END
-        """
-        
-        try:
-            print(f"Ensuring table [{azure_table_name}] exists in Azure SQL...", flush=True)
-            # For CREATE TABLE, it's better to execute without parameters and commit immediately if needed.
-            # Or ensure autocommit is on (default for DDL usually).
-            azure_conn.autocommit = True 
-            azure_cursor.execute(check_table_exists_sql)
-            azure_conn.autocommit = False # Turn off autocommit for data insertion
-            print(f"Table [{azure_table_name}] ensured.", flush=True)
-        except pyodbc.Error as ex:
-            print(f"Error creating/checking table [{azure_table_name}] in Azure SQL: {ex}", flush=True)
-            # Consider if you want to skip or halt on error
-            continue 
-
-        # Fetch data from SQLite
-        print(f"Fetching data from SQLite table: {table_name}...", flush=True)
-        sqlite_cursor.execute(f"SELECT {', '.join([f'\\"{c}\\"' for c in column_names_sqlite])} FROM \"{table_name}\";")
-        
-        # Insert data into Azure SQL
-        insert_sql = f"INSERT INTO [dbo].[{azure_table_name}] ({', '.join(column_names_azure)}) VALUES ({', '.join(['?'] * len(column_names_azure))});"
-        
-        batch_size = 1000
-        rows_inserted = 0
-        
+            raise RuntimeError(f"Could not get schema for table {table_name}")
+        column_names_sqlite = [info[1] for info in columns_info]
+        column_names_target = [clean_name(name) for name in column_names_sqlite]
+        column_defs = [(clean_name(info[1]), target.map_type(info[2])) for info in columns_info]
+
+        order_by = source_order_by(sqlite_conn, table_name, columns_info)
+        select_cols = ', '.join(f'"{c}"' for c in column_names_sqlite)
+        fingerprint = source_fingerprint(sqlite_conn, table_name, select_cols, order_by, chunk_size)
+
+        checkpoint = None if restart else target.read_checkpoint(target_conn, azure_table_name)
+        source_changed = checkpoint is not None and checkpoint[2] != fingerprint
+        if source_changed:
+            # The source was rebuilt after this checkpoint: its row counts no longer apply
+            checkpoint = None
+        if checkpoint and checkpoint[1]:
+            return {'table': table_name, 'rows': 0, 'seconds': 0.0, 'status': 'already completed'}
+
+        rows_done = checkpoint[0] if checkpoint else 0
+        # Without a checkpoint the table is (re)created from scratch
+        target.create_table(target_conn, azure_table_name, column_defs, drop_existing=checkpoint is None)
+
+        cursor = sqlite_conn.execute(
+            f'SELECT {select_cols} FROM "{table_name}" ORDER BY {order_by} LIMIT -1 OFFSET ?', (rows_done,)
+        )
+
+        t0 = time.perf_counter()
+        rows_this_run = 0
         while True:
-            rows = sqlite_cursor.fetchmany(batch_size)
+            rows = cursor.fetchmany(chunk_size)
             if not rows:
                 break
-            
+            rows_done += len(rows)
+            rows_this_run += len(rows)
+            target.insert_chunk(target_conn, azure_table_name, column_names_target, rows, rows_done,
+                                completed=False, fingerprint=fingerprint)
+        target.insert_chunk(target_conn, azure_table_name, column_names_target, [], rows_done,
+                            completed=True, fingerprint=fingerprint)
+        elapsed = time.perf_counter() - t0
+        status = 'resumed' if checkpoint else ('copied (source changed)' if source_changed else 'copied')
+        return {'table': table_name, 'rows': rows_this_run, 'seconds': elapsed, 'status': status}
+    finally:
+        sqlite_conn.close()
+        target_conn.close()
+
+
+def migrate_data(target, sqlite_path=SQLITE_DB_PATH, tables=None, chunk_size=CHUNK_SIZE,
+                 max_workers=MAX_WORKERS, restart=()):
+    """Migrates `tables` (default: all) from `sqlite_path` into `target`."""
+    print(f"Source SQLite database: {sqlite_path}", flush=True)
+    print(f"Target: {target.describe()}", flush=True)
+
+    all_tables = list_sqlite_tables(sqlite_path)
+    tables = [t for t in all_tables if t in tables] if tables else all_tables
+    print(f"Tables to migrate: {tables}", flush=True)
+
+    conn = target.connect()
+    try:
+        target.ensure_checkpoint_table(conn)
+    finally:
+        conn.close()
+
+    results = []
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(migrate_table, target, sqlite_path, t, chunk_size, t in restart): t
+            for t in tables
+        }
+        for future in as_completed(futures):
+            table_name = futures[future]
             try:
-                azure_cursor.fast_executemany = True # Enable for potentially faster inserts
-                azure_cursor.executemany(insert_sql, rows)
-                azure_conn.commit()
-                rows_inserted += len(rows)
-                print(f"Inserted {rows_inserted} rows into [{azure_table_name}] (batch of {len(rows)})...", flush=True)
-            except pyodbc.Error as ex:
-                print(f"Error inserting data into [{azure_table_name}]: {ex}", flush=True)
-                azure_conn.rollback() # Rollback batch on error
-                # Decide if you want to skip this batch or halt
-                break # Halting for this example
-        print(f"Finished inserting data for table [{azure_table_name}]. Total rows: {rows_inserted}", flush=True)
-
-    # Recreate the view
-    print("\nRecreating view: vista_equivalencias_unicas", flush=True)
-    azure_view_name = clean_name("vista_equivalencias_unicas")
-    # Original SQLite view: CREATE VIEW vista_equivalencias_unicas AS SELECT CMUN, MIN(NOMBRE) AS NOMBRE, MIN(CPRO) AS CPRO FROM tabla_equivalencias GROUP BY CMUN
-    # Cleaned names for Azure SQL:
-    # CMUN -> CMUN (assuming it's already clean)
-    # NOMBRE -> NOMBRE
-    # CPRO -> CPRO
-    # tabla_equivalencias -> tabla_equivalencias (assuming it's already clean or cleaned by clean_name)
-    
-    # We need to use the cleaned names of the table and columns in the view definition
-    cleaned_source_table_name = clean_name("tabla_equivalencias")
-    cleaned_cmun_col = clean_name("CMUN")
-    cleaned_nombre_col = clean_name("NOMBRE")
-    cleaned_cpro_col = clean_name("CPRO")
-
-    create_view_sql = f"""
-    IF OBJECT_ID(N'[dbo].[{azure_view_name}]', 'V') IS NOT NULL
-        DROP VIEW [dbo].[{azure_view_name}];
-    EXEC('CREATE VIEW [dbo].[{azure_view_name}] AS 
-        SELECT 
-            [{cleaned_cmun_col}], 
-            MIN([{cleaned_nombre_col}]) AS [{cleaned_nombre_col}], 
-            MIN([{cleaned_cpro_col}]) AS [{cleaned_cpro_col}] 
-        FROM 
-            [dbo].[{cleaned_source_table_name}] 
-        GROUP BY 
-            [{cleaned_cmun_col}]
-    ');
-    """
+                result = future.result()
+            except Exception as ex:
+                # A failed table keeps its checkpoint; the next run resumes it
+                print(f"[{table_name}] ERROR: {ex}", flush=True)
+                results.append({'table': table_name, 'rows': 0, 'seconds': 0.0, 'status': f'error: {ex}'})
+                continue
+            rate = result['rows'] / result['seconds'] if result['seconds'] > 0 else 0.0
+            print(f"[{table_name}] {result['status']}: {result['rows']} rows in {result['seconds']:.2f}s "
+                  f"({rate:,.0f} rows/s)", flush=True)
+            results.append(result)
+
+    # Recreate the views once their tables are copied
+    conn = target.connect()
     try:
-        azure_conn.autocommit = True
-        azure_cursor.execute(create_view_sql)
-        azure_conn.autocommit = False
-        print(f"View [{azure_view_name}] recreated successfully.", flush=True)
-    except pyodbc.Error as ex:
-        print(f"Error recreating view [{azure_view_name}]: {ex}", flush=True)
+        for view_name, select_sql in views_to_create(sqlite_path).items():
+            try:
+                target.create_view(conn, clean_name(view_name), select_sql)
+                print(f"View [{view_name}] recreated successfully.", flush=True)
+            except Exception as ex:
+                print(f"Error recreating view [{view_name}]: {ex}", flush=True)
+    finally:
+        conn.close()
+
+    total_rows = sum(r['rows'] for r in results)
+    total_seconds = time.perf_counter() - t_start
+    print(f"\nMigration finished: {total_rows} rows in {total_seconds:.2f}s.", flush=True)
+
+    missing = missing_in_target(target, sqlite_path, tables)
+    if missing:
+        print(f"ERROR: missing in the target: {missing}", flush=True)
+    else:
+        print(f"All {len(tables)} tables and the source views exist in the target.", flush=True)
+    return results, missing
 
 
-    # Close connections
-    print("\nMigration process finished.", flush=True)
-    sqlite_conn.close()
-    azure_conn.close()
-    print("Connections closed.", flush=True)
+def main():
+    parser = argparse.ArgumentParser(description="Migrates the SQLite data warehouse to Azure SQL (or another SQLite).")
+    parser.add_argument("tables", nargs="*", help="Tables to migrate (default: all).")
+    parser.add_argument("--sqlite-source", default=SQLITE_DB_PATH, help="Source SQLite database.")
+    parser.add_argument("--sqlite-target", default=None,
+                        help="Migrate into this SQLite file instead of Azure SQL (local testing).")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per chunk/transaction.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Tables migrated in parallel.")
+    parser.add_argument("--restart", nargs="*", default=[], metavar="TABLE",
+                        help="Ignore the checkpoint of these tables and copy them again from scratch.")
+    args = parser.parse_args()
+
+    if args.sqlite_target:
+        target = SQLiteTarget(args.sqlite_target)
+    else:
+        if not AZURE_DB_PASSWORD:
+            print("!!! ERROR: Azure SQL password not set. Export AZURE_DB_PASSWORD (and optionally "
+                  "AZURE_DB_SERVER, AZURE_DB_NAME, AZURE_DB_USER, AZURE_DB_DRIVER). !!!", flush=True)
+            return
+        target = AzureSQLTarget(AZURE_DB_SERVER, AZURE_DB_NAME, AZURE_DB_USER, AZURE_DB_PASSWORD, AZURE_DB_DRIVER)
+
+    _, missing = migrate_data(
+        target,
+        sqlite_path=args.sqlite_source,
+        tables=args.tables or None,
+        chunk_size=args.chunk_size,
+        max_workers=args.workers,
+        restart=set(args.restart),
+    )
+    if missing:
+        sys.exit(1)
+
 
 if __name__ == '__main__':
-    print("--- Script execution started (__main__ block) ---", flush=True)
-    migrate_data()
-    print("--- Script execution finished (__main__ block) ---", flush=True)
+    main()
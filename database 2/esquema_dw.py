@@ -0,0 +1,340 @@
+"""
+esquema_dw.py
+
+Esquema declarado (DDL) del data warehouse SQLite.
+
+Sustituye a `DataFrame.to_sql(if_exists='replace')`, que creaba las tablas sin
+claves, sin índices y con los códigos y años como texto suelto. Cada tabla
+declara aquí:
+  - `columnas`: afinidad SQLite de las columnas conocidas. Las columnas no
+    declaradas (p. ej. las columnas-año de las tablas anchas) se tipan a partir
+    del dtype del DataFrame.
+  - `clave`: clave primaria (la indicada en `info_tablas.md`).
+  - `without_rowid`: tablas estrechas cuya clave primaria es la clave de
+    búsqueda habitual; se almacenan directamente en el B-tree de la clave.
+  - `indices`: índices secundarios (compuestos) para los filtros del dashboard
+    por `mun_code`, `year`, `ccaa_code` y `cpro`.
+
+Los códigos territoriales se normalizan como TEXT con ceros a la izquierda
+(`mun_code` = 5 dígitos, `cpro`/`ccaa_code` = 2) para que las uniones entre
+tablas no dependan de que cada CSV los haya guardado como "1001", "1001.0" o
+"01001".
+"""
+
+import pandas as pd
+
+# Ancho de cada código territorial normalizado
+ANCHO_CODIGOS = {
+    'mun_code': 5,
+    'ccaa_code': 2,
+    'cpro': 2,
+    'CPRO': 2,
+    'CODAUTO': 2,
+    'CMUN': 3,
+}
+
+ESQUEMA = {
+    'tabla_equivalencias': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'CODAUTO': 'TEXT',
+            'CPRO': 'TEXT',
+            'CMUN': 'TEXT',
+            'DC': 'TEXT',
+            'NOMBRE': 'TEXT',
+        },
+        'clave': ['mun_code'],
+        'without_rowid': True,
+        'indices': [['CPRO', 'CMUN'], ['CODAUTO']],
+    },
+    # Formato largo canónico de cifras_poblacion_municipio (ver FORMATO_LARGO)
+    'cifras_poblacion_municipio_anual': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'year': 'INTEGER NOT NULL',
+            'poblacion': 'REAL',
+        },
+        'clave': ['mun_code', 'year'],
+        'without_rowid': True,
+        # Índice cubriente: un corte por año se resuelve sin tocar la tabla
+        'indices': [['year', 'mun_code', 'poblacion']],
+    },
+    'cifras_poblacion_municipio_atributos': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'num_outliers': 'INTEGER',
+        },
+        'clave': ['mun_code'],
+        'without_rowid': True,
+        'indices': [],
+    },
+    'df_mortalidad_ccaa_sexo': {
+        'columnas': {
+            'ccaa_code': 'TEXT NOT NULL',
+            'ccaa_name': 'TEXT',
+            'Edad': 'INTEGER NOT NULL',
+            'year': 'INTEGER NOT NULL',
+            'sex': 'TEXT NOT NULL',
+            'total_muertes': 'REAL',
+        },
+        'clave': ['ccaa_code', 'year', 'sex', 'Edad'],
+        'without_rowid': True,
+        'indices': [['year', 'ccaa_code']],
+    },
+    'distribucion_urbana': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'year': 'INTEGER NOT NULL',
+            'proporcion_urbana': 'REAL',
+        },
+        'clave': ['mun_code', 'year'],
+        'without_rowid': True,
+        'indices': [['year', 'mun_code']],
+    },
+    'empresas_municipio_actividad_principal': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'municipio_name': 'TEXT',
+            'year': 'INTEGER NOT NULL',
+            'total_empresas': 'REAL',
+        },
+        'clave': ['mun_code', 'year'],
+        'without_rowid': True,
+        'indices': [['year', 'mun_code']],
+    },
+    'estimativas_pop_anual': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'year': 'INTEGER NOT NULL',
+            'poblacion': 'REAL',
+        },
+        'clave': ['mun_code', 'year'],
+        'without_rowid': True,
+        'indices': [['year', 'mun_code', 'poblacion']],
+    },
+    'idhm_indice_desarrollo_humano_municipal': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'year': 'INTEGER NOT NULL',
+        },
+        'clave': ['mun_code', 'year'],
+        'without_rowid': False,
+        'indices': [['year', 'mun_code']],
+    },
+    # Una fila por provincia, periodo y edad; sin clave primaria porque hay
+    # provincias sin correspondencia de código (cpro nulo)
+    'indicadores_fecundidad_municipio_provincias': {
+        'columnas': {
+            'cpro': 'TEXT',
+            'provincias_name': 'TEXT',
+            'year': 'INTEGER NOT NULL',
+            'edad': 'INTEGER',
+            'tasa_fert_prov': 'REAL',
+        },
+        'clave': [],
+        'without_rowid': False,
+        'indices': [['cpro', 'year'], ['year']],
+    },
+    'interest_data_ETL': {
+        'columnas': {
+            'date': 'TEXT NOT NULL',
+            'interest_fixed': 'REAL',
+            'interest_nominal': 'REAL',
+            'interest_real': 'REAL',
+        },
+        'clave': ['date'],
+        'without_rowid': True,
+        'indices': [],
+    },
+    'nivel_educativo_comunidades': {
+        'columnas': {
+            'ccaa_code': 'TEXT NOT NULL',
+            'ccaa_name': 'TEXT',
+            'año': 'INTEGER NOT NULL',
+            'nivel_formacion': 'TEXT NOT NULL',
+            'media_total': 'REAL',
+            'nivel_formacion_code': 'INTEGER',
+        },
+        'clave': ['ccaa_code', 'año', 'nivel_formacion'],
+        'without_rowid': True,
+        'indices': [['año', 'ccaa_code']],
+    },
+    'PIE': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'year': 'INTEGER NOT NULL',
+        },
+        'clave': ['mun_code', 'year'],
+        'without_rowid': False,
+        'indices': [['year', 'mun_code']],
+    },
+    # Área de cada municipio; estática, se une por mun_code con las tablas anuales
+    'mun_area': {
+        'columnas': {
+            'mun_code': 'TEXT NOT NULL',
+            'area_km2': 'REAL',
+            'crs_area': 'TEXT',
+        },
+        'clave': ['mun_code'],
+        'without_rowid': True,
+        'indices': [],
+    },
+}
+
+# Vistas que dependen de las tablas anteriores: {vista: (tablas de las que depende, SELECT)}
+VISTAS = {
+    'vista_equivalencias_unicas': (
+        ['tabla_equivalencias'],
+        "SELECT CMUN, MIN(NOMBRE) AS NOMBRE, MIN(CPRO) AS CPRO FROM tabla_equivalencias GROUP BY CMUN",
+    ),
+}
+
+# Datasets anchos (una columna por año) que se guardan en formato largo
+# (mun_code, year, valor). Con el nombre original se crea una vista de
+# compatibilidad con la forma ancha; las columnas que no son años van a una
+# tabla de atributos por municipio.
+# {vista_ancha: (tabla_larga, columna_valor, tabla_atributos)}
+FORMATO_LARGO = {
+    'cifras_poblacion_municipio': (
+        'cifras_poblacion_municipio_anual', 'poblacion', 'cifras_poblacion_municipio_atributos',
+    ),
+    'estimativas_pop': (
+        'estimativas_pop_anual', 'poblacion', 'estimativas_pop_atributos',
+    ),
+}
+
+
+def quote(nombre):
+    """Entrecomilla un identificador SQLite."""
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def afinidad_por_dtype(serie):
+    """Afinidad SQLite para una columna no declarada en el esquema."""
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(serie):
+        return 'REAL'
+    return 'TEXT'
+
+
+def normalizar_codigo(serie, ancho):
+    """'1001', '1001.0' o 1001 -> '01001'. Los nulos se mantienen."""
+    texto = serie.astype('string').str.strip().str.replace(r'\.0+$', '', regex=True)
+    return texto.str.zfill(ancho).where(serie.notna())
+
+
+def preparar_dataframe(nombre_tabla, df):
+    """Normaliza códigos y convierte las columnas declaradas a su afinidad."""
+    columnas = ESQUEMA.get(nombre_tabla, {}).get('columnas', {})
+    df = df.copy()
+    for col in df.columns:
+        if col in ANCHO_CODIGOS:
+            df[col] = normalizar_codigo(df[col], ANCHO_CODIGOS[col])
+            continue
+        tipo = columnas.get(col, '')
+        if tipo.startswith('INTEGER'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').round().astype('Int64')
+        elif tipo.startswith('REAL'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df
+
+
+def ddl_tabla(nombre_tabla, df):
+    """Sentencias CREATE TABLE / CREATE INDEX para `df` según el esquema declarado."""
+    spec = ESQUEMA.get(nombre_tabla, {})
+    columnas = spec.get('columnas', {})
+    clave = spec.get('clave', [])
+
+    definiciones = [f"{quote(col)} {columnas.get(col) or afinidad_por_dtype(df[col])}" for col in df.columns]
+    if clave:
+        definiciones.append(f"PRIMARY KEY ({', '.join(quote(c) for c in clave)})")
+    sufijo = " WITHOUT ROWID" if clave and spec.get('without_rowid') else ""
+    sentencias = [f"CREATE TABLE {quote(nombre_tabla)} (\n    " + ",\n    ".join(definiciones) + f"\n){sufijo}"]
+
+    for cols in spec.get('indices', []):
+        if not all(c in df.columns for c in cols):
+            continue
+        nombre_indice = f"idx_{nombre_tabla}_{'_'.join(cols)}"
+        sentencias.append(
+            f"CREATE INDEX {quote(nombre_indice)} ON {quote(nombre_tabla)} ({', '.join(quote(c) for c in cols)})"
+        )
+    return sentencias
+
+
+def eliminar_objeto(conn, nombre):
+    """Elimina la tabla o vista `nombre`, sea cual sea su tipo actual."""
+    fila = conn.exec_driver_sql(
+        "SELECT type FROM sqlite_master WHERE name = ? AND type IN ('table', 'view')", (nombre,)
+    ).fetchone()
+    if fila:
+        conn.exec_driver_sql(f"DROP {fila[0].upper()} {quote(nombre)}")
+
+
+def separar_formato_largo(vista_ancha, df, id_col='mun_code'):
+    """
+    Convierte un DataFrame ancho (una columna por año) en las tablas de
+    `FORMATO_LARGO[vista_ancha]`. Devuelve {nombre_tabla: DataFrame}.
+    """
+    tabla_larga, columna_valor, tabla_atributos = FORMATO_LARGO[vista_ancha]
+    years = [c for c in df.columns if str(c).isdigit()]
+    otras = [c for c in df.columns if c != id_col and c not in years]
+
+    df_largo = df.melt(id_vars=[id_col], value_vars=years, var_name='year', value_name=columna_valor)
+    df_largo = df_largo.dropna(subset=[columna_valor])
+    tablas = {tabla_larga: df_largo}
+    if otras:
+        tablas[tabla_atributos] = df[[id_col] + otras]
+    return tablas
+
+
+def crear_vista_ancha(conn, vista_ancha, id_col='mun_code'):
+    """
+    (Re)crea la vista de compatibilidad con la forma ancha a partir de la tabla
+    larga ya cargada: una columna por año presente en los datos más las
+    columnas de la tabla de atributos.
+    """
+    tabla_larga, columna_valor, tabla_atributos = FORMATO_LARGO[vista_ancha]
+    years = [fila[0] for fila in conn.exec_driver_sql(
+        f"SELECT DISTINCT year FROM {quote(tabla_larga)} ORDER BY year"
+    )]
+    columnas_year = ", ".join(
+        f"MAX(CASE WHEN year = {int(y)} THEN {quote(columna_valor)} END) AS {quote(str(y))}" for y in years
+    )
+    select = f"SELECT {quote(id_col)}, {columnas_year} FROM {quote(tabla_larga)} GROUP BY {quote(id_col)}"
+
+    existe_atributos = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla_atributos,)
+    ).fetchone()
+    if existe_atributos:
+        otras = [fila[1] for fila in conn.exec_driver_sql(f"PRAGMA table_info({quote(tabla_atributos)})")
+                 if fila[1] != id_col]
+        columnas_otras = "".join(f", a.{quote(c)}" for c in otras)
+        select = (f"SELECT p.*{columnas_otras} FROM ({select}) AS p "
+                  f"LEFT JOIN {quote(tabla_atributos)} AS a ON a.{quote(id_col)} = p.{quote(id_col)}")
+
+    eliminar_objeto(conn, vista_ancha)
+    conn.exec_driver_sql(f"CREATE VIEW {quote(vista_ancha)} AS {select}")
+
+
+def crear_y_cargar_tabla(conn, nombre_tabla, df):
+    """
+    Recrea `nombre_tabla` con su DDL declarado e inserta `df`.
+
+    `conn` es una conexión SQLAlchemy dentro de una transacción: si falla la
+    inserción (p. ej. por una clave primaria duplicada) la tabla anterior se
+    conserva intacta.
+    """
+    df = preparar_dataframe(nombre_tabla, df)
+    dependientes = [v for v, (tablas, _) in VISTAS.items() if nombre_tabla in tablas]
+    for vista in dependientes:
+        conn.exec_driver_sql(f"DROP VIEW IF EXISTS {quote(vista)}")
+    eliminar_objeto(conn, nombre_tabla)
+    for sentencia in ddl_tabla(nombre_tabla, df):
+        conn.exec_driver_sql(sentencia)
+    df.to_sql(nombre_tabla, conn, if_exists='append', index=False, chunksize=50_000)
+    for vista in dependientes:
+        conn.exec_driver_sql(f"CREATE VIEW {quote(vista)} AS {VISTAS[vista][1]}")
+    return df
@@ -1,59 +1,72 @@
 import os
+import argparse
+import hashlib
+import time
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import numpy as np
 
+from esquema_dw import FORMATO_LARGO, crear_vista_ancha, crear_y_cargar_tabla, separar_formato_largo
+
 # Configuración de paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "datawarehouse_v2.db") # Modificado para la nueva BD
 LOG_PATH = os.path.join(BASE_DIR, "etl_load_log_v2.txt") # Modificado para el nuevo log
 
+# Tabla interna donde se guarda el hash de las fuentes de cada tarea ya cargada
+MANIFEST_TABLE = "etl_manifest"
+# Incrementar cuando cambie la lógica de parseo para forzar la recarga de todas las tablas
+LOADER_VERSION = "5"
+
+# Rutas de los CSV de origen: las salidas de los flujos de ETL/ (ver ETL/ejecutar_flujo_etl.py),
+# no las copias de database 2/ETL, a las que les faltan PIE, IDHM, fecundidad y mun_area
+ETL_DIR = os.path.join(os.path.dirname(BASE_DIR), 'ETL')
+RUTA_EQUIVALENCIAS = os.path.join(ETL_DIR, 'tabla_equivalencias/data/df_equivalencias_municipio_CORRECTO.csv')
+RUTA_PROVINCIAS = os.path.join(ETL_DIR, 'indicadores_fecundidad_municipio_provincias/codigos_ccaa_provincias.csv')
+RUTA_CIFRAS_POB = os.path.join(ETL_DIR, 'cifras_poblacion_municipio/cifras_poblacion_municipio.csv')
+RUTA_MORTALIDAD = os.path.join(ETL_DIR, 'df_mortalidad_ccaa_sexo/df_mortalidad_final.csv')
+RUTA_URBANA = os.path.join(ETL_DIR, 'distribucion_urbana/data_final/distribucion_urbana_municipios_2003_to_2022.csv')
+RUTA_EMPRESAS = os.path.join(ETL_DIR, 'empresas_municipio_actividad_principal/preprocesados/empresas_municipio_actividad_principal.csv')
+RUTA_ESTPOP = os.path.join(ETL_DIR, 'estimativas_pop/preprocesados/cifras_poblacion_municipio.csv')
+RUTA_IDHM = os.path.join(ETL_DIR, 'idhm_indice_desarrollo_humano_municipal/IRPFmunicipios_final_IDHM.csv')
+RUTA_FECUNDIDAD = os.path.join(ETL_DIR, 'indicadores_fecundidad_municipio_provincias/df_total_interpolado_full_tasa_estandarizada.csv')
+RUTA_INTERES_FIJO = os.path.join(ETL_DIR, 'interest_data_ETL/imputados/interest_fixed_imputado.csv')
+RUTA_INTERES_NOMINAL = os.path.join(ETL_DIR, 'interest_data_ETL/imputados/interest_nominal_imputado.csv')
+RUTA_INTERES_REAL = os.path.join(ETL_DIR, 'interest_data_ETL/imputados/interest_real_imputado.csv')
+RUTA_EDUCACION = os.path.join(ETL_DIR, 'nivel_educativo_comunidades/data_final/nivel_educativo_comunidades_completo.csv')
+RUTA_PIE = os.path.join(ETL_DIR, 'PIE/data/raw/finanzas/liquidaciones/preprocess/pie_final_final.csv')
+RUTA_MUN_AREA = os.path.join(ETL_DIR, 'GeoRef_Spain/capa_municipios/mun_area.csv')
+
+
 def log(msg):
     print(msg)
     with open(LOG_PATH, "a", encoding="utf-8") as f:
         f.write(f"{msg}\n")
 
-# Limpiar log anterior
-with open(LOG_PATH, "w", encoding="utf-8") as f:
-    f.write(f"LOG ETL LOAD DATA - {datetime.now()}\n\n")
 
-# Crear motor de base de datos (SQLite)
-engine = create_engine(f"sqlite:///{DB_PATH}")
+# --- Parsers (uno por tabla) ---
+# Se ejecutan en procesos separados: solo leen y transforman, nunca escriben en la BD.
+# Cada uno devuelve (tablas, notas): un dict {nombre_tabla: DataFrame} y una lista
+# de mensajes que el proceso escritor añade al log.
 
-try:
+def parse_tabla_equivalencias():
     # 1. Tabla de equivalencias (municipios)
-    df_eq = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/tabla_equivalencias/data/df_equivalencias_municipio_CORRECTO.csv'), # Modificada ruta
-        dtype=str
-    )
-    df_eq.to_sql('tabla_equivalencias', engine, if_exists='replace', index=False)
-    log(f"[tabla_equivalencias] OK: {df_eq.shape[0]} filas, {df_eq.shape[1]} columnas")
-    
-    # Cargar códigos de provincias (para el merge de fecundidad)
-    df_prov = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/indicadores_fecundidad_municipio_provincias/codigos_ccaa_provincias.csv'), # Modificada ruta
-        dtype=str
-    )
-    # Renombrar columna de provincia para el merge
-    df_prov = df_prov.rename(columns={'Provincia': 'provincia_name'})
-    log(f"\n[codigos_ccaa_provincias] Cargado: {df_prov.shape[0]} filas, {df_prov.shape[1]} columnas")
-    log(f"Columnas: {', '.join(df_prov.columns)}")
-    log(df_prov.head().to_string())
+    df_eq = pd.read_csv(RUTA_EQUIVALENCIAS, dtype=str)
+    return {'tabla_equivalencias': df_eq}, []
+
 
+def parse_cifras_poblacion_municipio():
     # 2. Cifras población municipio
-    df_cif_pob = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/cifras_poblacion_municipio/cifras_poblacion_municipio.csv'), # Modificada ruta
-        dtype={'mun_code': str}
-    )
-    df_cif_pob.to_sql('cifras_poblacion_municipio', engine, if_exists='replace', index=False)
-    log(f"\n[cifras_poblacion_municipio] OK: {df_cif_pob.shape[0]} filas, {df_cif_pob.shape[1]} columnas")
+    df_cif_pob = pd.read_csv(RUTA_CIFRAS_POB, dtype={'mun_code': str})
+    # Se guarda en formato largo; 'cifras_poblacion_municipio' queda como vista ancha
+    return separar_formato_largo('cifras_poblacion_municipio', df_cif_pob), []
+
 
+def parse_mortalidad():
     # 3. Mortalidad CCAA por sexo
-    df_mort = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/df_mortalidad_ccaa_sexo/df_mortalidad_final.csv'), # Modificada ruta
-        dtype={'ccaa_code': str}
-    )
+    df_mort = pd.read_csv(RUTA_MORTALIDAD, dtype={'ccaa_code': str})
     df_mort = df_mort.rename(
         columns={
             'ccaa_code': 'ccaa_code',
@@ -62,14 +75,12 @@ try:
             'Total': 'total_muertes'
         }
     )
-    df_mort.to_sql('df_mortalidad_ccaa_sexo', engine, if_exists='replace', index=False)
-    log(f"\n[df_mortalidad_ccaa_sexo] OK: {df_mort.shape[0]} filas, {df_mort.shape[1]} columnas")
+    return {'df_mortalidad_ccaa_sexo': df_mort}, []
+
 
+def parse_distribucion_urbana():
     # 4. Distribución urbana (2003-2022)
-    df_urb = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/distribucion_urbana/data_final/distribucion_urbana_municipios_2003_to_2022.csv'), # Modificada ruta
-        dtype={'municipio_code': str}
-    )
+    df_urb = pd.read_csv(RUTA_URBANA, dtype={'municipio_code': str})
     years = [c for c in df_urb.columns if c.isdigit()]
     df_urb_long = df_urb.melt(
         id_vars=['municipio_code'],
@@ -78,14 +89,12 @@ try:
         value_name='proporcion_urbana'
     )
     df_urb_long = df_urb_long.rename(columns={'municipio_code': 'mun_code'})
-    df_urb_long.to_sql('distribucion_urbana', engine, if_exists='replace', index=False)
-    log(f"\n[distribucion_urbana] OK: {df_urb_long.shape[0]} filas, {df_urb_long.shape[1]} columnas")
+    return {'distribucion_urbana': df_urb_long}, []
+
 
+def parse_empresas():
     # 5. Empresas Municipio
-    df_emp = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/empresas_municipio_actividad_principal/preprocesados/empresas_municipio_actividad_principal.csv'), # Modificada ruta
-        dtype={'municipio_code': str}
-    )
+    df_emp = pd.read_csv(RUTA_EMPRESAS, dtype={'municipio_code': str})
     df_emp = df_emp.rename(
         columns={
             'municipio_code': 'mun_code',
@@ -93,77 +102,71 @@ try:
             'Total': 'total_empresas'
         }
     )
-    df_emp.to_sql('empresas_municipio_actividad_principal', engine, if_exists='replace', index=False)
-    log(f"\n[empresas_municipio_actividad_principal] OK: {df_emp.shape[0]} filas, {df_emp.shape[1]} columnas")
+    return {'empresas_municipio_actividad_principal': df_emp}, []
+
 
+def parse_estimativas_pop():
     # 6. Estimativas población
-    df_estpop = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/estimativas_pop/preprocesados/cifras_poblacion_municipio.csv'), # Modificada ruta
-        dtype={'mun_code': str}
-    )
-    df_estpop.to_sql('estimativas_pop', engine, if_exists='replace', index=False)
-    log(f"\n[estimativas_pop] OK: {df_estpop.shape[0]} filas, {df_estpop.shape[1]} columnas")
+    df_estpop = pd.read_csv(RUTA_ESTPOP, dtype={'mun_code': str})
+    return separar_formato_largo('estimativas_pop', df_estpop), []
+
 
+def parse_idhm():
     # 7. IDHM municipal
-    df_idhm = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/idhm_indice_desarrollo_humano_municipal/IRPFmunicipios_final_IDHM.csv'), # Modificada ruta
-        dtype={'mun_code': str}
-    )
-    df_idhm.to_sql('idhm_indice_desarrollo_humano_municipal', engine, if_exists='replace', index=False)
-    log(f"\n[idhm_indice_desarrollo_humano_municipal] OK: {df_idhm.shape[0]} filas, {df_idhm.shape[1]} columnas")
+    df_idhm = pd.read_csv(RUTA_IDHM, dtype={'mun_code': str})
+    return {'idhm_indice_desarrollo_humano_municipal': df_idhm}, []
+
 
+def parse_fecundidad():
     # 8. Indicadores fecundidad provincias
-    df_fert = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/indicadores_fecundidad_municipio_provincias/df_total_interpolado_full_tasa_estandarizada.csv'), # Modificada ruta
-        dtype=str
-    )
-    
-    log("\n[indicadores_fecundidad] Provincias en datos:")
+    notas = []
+
+    # Cargar códigos de provincias (para el merge de fecundidad)
+    df_prov = pd.read_csv(RUTA_PROVINCIAS, dtype=str)
+    # Renombrar columna de provincia para el merge
+    df_prov = df_prov.rename(columns={'Provincia': 'provincia_name'})
+    notas.append(f"[codigos_ccaa_provincias] Cargado: {df_prov.shape[0]} filas, {df_prov.shape[1]} columnas")
+    notas.append(f"Columnas: {', '.join(df_prov.columns)}")
+
+    df_fert = pd.read_csv(RUTA_FECUNDIDAD, dtype=str)
+
+    notas.append("[indicadores_fecundidad] Provincias en datos:")
     prov_list = df_fert['provincias_name'].unique().tolist()
-    log(str(sorted(prov_list)[:10]))
-    
+    notas.append(str(sorted(prov_list)[:10]))
+
     # Normalizar nombres de provincia para el merge
     df_fert['provincias_name_clean'] = df_fert['provincias_name'].str.normalize('NFKD').str.encode('ASCII', errors='ignore').str.decode('ASCII').str.upper()
     df_prov['provincia_name_clean'] = df_prov['provincia_name'].str.normalize('NFKD').str.encode('ASCII', errors='ignore').str.decode('ASCII').str.upper()
-    
+
     # Intentar merge con códigos de provincias usando el archivo correcto
     df_fert_merged = df_fert.merge(
-        df_prov[['CPRO', 'provincia_name_clean']], 
-        left_on='provincias_name_clean', 
-        right_on='provincia_name_clean', 
+        df_prov[['CPRO', 'provincia_name_clean']],
+        left_on='provincias_name_clean',
+        right_on='provincia_name_clean',
         how='left'
     )
-    
+
     n_missing = df_fert_merged['CPRO'].isna().sum()
     if n_missing > 0:
-        log(f"\n[indicadores_fecundidad] ADVERTENCIA: {n_missing} filas sin correspondencia de provincia")
-        log("Provincias sin match:")
+        notas.append(f"[indicadores_fecundidad] ADVERTENCIA: {n_missing} filas sin correspondencia de provincia")
+        notas.append("Provincias sin match:")
         missing_prov = df_fert_merged[df_fert_merged['CPRO'].isna()]['provincias_name'].unique()
-        log(str(sorted(missing_prov.tolist())))
-    
+        notas.append(str(sorted(missing_prov.tolist())))
+
     df_fert_merged = df_fert_merged.drop(['provincias_name_clean', 'provincia_name_clean'], axis=1)
     df_fert_merged = df_fert_merged.rename(columns={
-        'tasa_estandarizada': 'tasa_fert_prov', 
+        'tasa_estandarizada': 'tasa_fert_prov',
         'periodo': 'year',
         'CPRO': 'cpro'
     })
-    
-    df_fert_merged.to_sql('indicadores_fecundidad_municipio_provincias', engine, if_exists='replace', index=False)
-    log(f"\n[indicadores_fecundidad_municipio_provincias] OK: {df_fert_merged.shape[0]} filas, {df_fert_merged.shape[1]} columnas")
+    return {'indicadores_fecundidad_municipio_provincias': df_fert_merged}, notas
 
+
+def parse_interes():
     # 9. Interest data (nacional)
-    df_fixed = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/interest_data_ETL/imputados/interest_fixed_imputado.csv'), # Modificada ruta
-        sep=';', parse_dates=['date']
-    )
-    df_nom = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/interest_data_ETL/imputados/interest_nominal_imputado.csv'), # Modificada ruta
-        sep=';', parse_dates=['date']
-    )
-    df_real = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/interest_data_ETL/imputados/interest_real_imputado.csv'), # Modificada ruta
-        sep=';', parse_dates=['date']
-    )
+    df_fixed = pd.read_csv(RUTA_INTERES_FIJO, sep=';', parse_dates=['date'])
+    df_nom = pd.read_csv(RUTA_INTERES_NOMINAL, sep=';', parse_dates=['date'])
+    df_real = pd.read_csv(RUTA_INTERES_REAL, sep=';', parse_dates=['date'])
     df_int = df_fixed.merge(df_nom, on='date').merge(df_real, on='date')
     df_int = df_int.rename(
         columns={
@@ -172,28 +175,175 @@ try:
             'interest': 'interest_real'
         }
     )
-    df_int.to_sql('interest_data_ETL', engine, if_exists='replace', index=False)
-    log(f"\n[interest_data_ETL] OK: {df_int.shape[0]} filas, {df_int.shape[1]} columnas")
+    return {'interest_data_ETL': df_int}, []
 
+
+def parse_nivel_educativo():
     # 10. Nivel educativo CCAA
-    df_edu = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/nivel_educativo_comunidades/data_final/nivel_educativo_comunidades_completo.csv'), # Modificada ruta
-        dtype={'ccaa_code': str}
-    )
-    df_edu.to_sql('nivel_educativo_comunidades', engine, if_exists='replace', index=False)
-    log(f"\n[nivel_educativo_comunidades] OK: {df_edu.shape[0]} filas, {df_edu.shape[1]} columnas")
+    df_edu = pd.read_csv(RUTA_EDUCACION, dtype={'ccaa_code': str})
+    return {'nivel_educativo_comunidades': df_edu}, []
 
+
+def parse_pie():
     # 11. PIE
-    df_pie = pd.read_csv(
-        os.path.join(BASE_DIR, 'ETL/PIE/data/raw/finanzas/liquidaciones/preprocess/pie_final_final.csv'), # Modificada ruta
-        dtype={'codigo_municipio': str}
-    )
-    df_pie = df_pie.rename(columns={'codigo_municipio': 'mun_code', 'año': 'year'})
-    df_pie.to_sql('PIE', engine, if_exists='replace', index=False)
-    log(f"\n[PIE] OK: {df_pie.shape[0]} filas, {df_pie.shape[1]} columnas")
+    df_pie = pd.read_csv(RUTA_PIE, dtype={'codigo_municipio': str, 'mun_code': str})
+    notas = []
+    # codigo_municipio es el CMUN de 3 dígitos (se repite entre provincias); la clave
+    # (mun_code, year) necesita el código INE de 5 dígitos que procesar_pie.py guarda en mun_code
+    if 'mun_code' not in df_pie.columns:
+        provincia = df_pie['codigo_provincia'].astype(str).str.split('.').str[0].str.zfill(2)
+        municipio = df_pie['codigo_municipio'].str.split('.').str[0].str.zfill(3)
+        df_pie['mun_code'] = provincia + municipio
+        notas.append("[PIE] Columna 'mun_code' derivada de codigo_provincia + codigo_municipio")
+    df_pie = df_pie.rename(columns={'año': 'year'})
+    return {'PIE': df_pie}, notas
+
+
+def parse_mun_area():
+    # 12. Área municipal (km²), calculada una sola vez por ETL/GeoRef_Spain/construir_capa_municipios.py
+    df_area = pd.read_csv(RUTA_MUN_AREA, dtype={'mun_code': str})
+    return {'mun_area': df_area}, []
+
+
+# Una tarea por tabla: nombre, CSV de origen (para el hash) y parser
+TAREAS = [
+    {'nombre': 'tabla_equivalencias', 'fuentes': [RUTA_EQUIVALENCIAS], 'parser': parse_tabla_equivalencias},
+    {'nombre': 'cifras_poblacion_municipio', 'fuentes': [RUTA_CIFRAS_POB], 'parser': parse_cifras_poblacion_municipio},
+    {'nombre': 'df_mortalidad_ccaa_sexo', 'fuentes': [RUTA_MORTALIDAD], 'parser': parse_mortalidad},
+    {'nombre': 'distribucion_urbana', 'fuentes': [RUTA_URBANA], 'parser': parse_distribucion_urbana},
+    {'nombre': 'empresas_municipio_actividad_principal', 'fuentes': [RUTA_EMPRESAS], 'parser': parse_empresas},
+    {'nombre': 'estimativas_pop', 'fuentes': [RUTA_ESTPOP], 'parser': parse_estimativas_pop},
+    {'nombre': 'idhm_indice_desarrollo_humano_municipal', 'fuentes': [RUTA_IDHM], 'parser': parse_idhm},
+    {'nombre': 'indicadores_fecundidad_municipio_provincias', 'fuentes': [RUTA_FECUNDIDAD, RUTA_PROVINCIAS], 'parser': parse_fecundidad},
+    {'nombre': 'interest_data_ETL', 'fuentes': [RUTA_INTERES_FIJO, RUTA_INTERES_NOMINAL, RUTA_INTERES_REAL], 'parser': parse_interes},
+    {'nombre': 'nivel_educativo_comunidades', 'fuentes': [RUTA_EDUCACION], 'parser': parse_nivel_educativo},
+    {'nombre': 'PIE', 'fuentes': [RUTA_PIE], 'parser': parse_pie},
+    {'nombre': 'mun_area', 'fuentes': [RUTA_MUN_AREA], 'parser': parse_mun_area},
+]
+
+
+# --- Control incremental ---
+
+def hash_fuentes(tarea):
+    """SHA-256 del contenido de los CSV de una tarea (más la versión del loader)."""
+    h = hashlib.sha256(f"{tarea['nombre']}|{LOADER_VERSION}".encode("utf-8"))
+    for ruta in tarea['fuentes']:
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+    return h.hexdigest()
+
+
+def leer_manifest(engine):
+    """Devuelve {tarea: hash} de las tareas cargadas en ejecuciones anteriores."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} ("
+            "tarea TEXT PRIMARY KEY, hash TEXT NOT NULL, tablas TEXT, filas INTEGER, cargado_en TEXT)"
+        ))
+        filas = conn.execute(text(f"SELECT tarea, hash FROM {MANIFEST_TABLE}")).fetchall()
+    return {tarea: h for tarea, h in filas}
+
+
+def ejecutar_parser(tarea):
+    """Punto de entrada de los procesos del pool: parsea una tarea y mide su duración."""
+    t0 = time.perf_counter()
+    tablas, notas = tarea['parser']()
+    return tablas, notas, time.perf_counter() - t0
+
+
+def escribir_tarea(engine, tarea, hash_actual, tablas):
+    """Escribe las tablas de una tarea y actualiza el manifest en una única transacción."""
+    with engine.begin() as conn:
+        for nombre_tabla, df in tablas.items():
+            crear_y_cargar_tabla(conn, nombre_tabla, df)
+        for vista_ancha, (tabla_larga, _, _) in FORMATO_LARGO.items():
+            if tabla_larga in tablas:
+                crear_vista_ancha(conn, vista_ancha)
+        conn.execute(
+            text(f"INSERT OR REPLACE INTO {MANIFEST_TABLE} (tarea, hash, tablas, filas, cargado_en) "
+                 "VALUES (:tarea, :hash, :tablas, :filas, :cargado_en)"),
+            {
+                'tarea': tarea['nombre'],
+                'hash': hash_actual,
+                'tablas': ",".join(tablas),
+                'filas': int(sum(len(df) for df in tablas.values())),
+                'cargado_en': datetime.now().isoformat(timespec='seconds'),
+            }
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga incremental y en paralelo de las tablas del data warehouse.")
+    parser.add_argument("tablas", nargs="*", help="Tareas a cargar (por defecto, todas).")
+    parser.add_argument("--forzar", action="store_true", help="Recargar aunque el hash de las fuentes no haya cambiado.")
+    parser.add_argument("--workers", type=int, default=None, help="Número máximo de procesos de parseo.")
+    args = parser.parse_args()
+
+    # Limpiar log anterior
+    with open(LOG_PATH, "w", encoding="utf-8") as f:
+        f.write(f"LOG ETL LOAD DATA - {datetime.now()}\n\n")
+
+    tareas = TAREAS
+    if args.tablas:
+        desconocidas = set(args.tablas) - {t['nombre'] for t in TAREAS}
+        if desconocidas:
+            parser.error(f"Tareas desconocidas: {', '.join(sorted(desconocidas))}")
+        tareas = [t for t in TAREAS if t['nombre'] in args.tablas]
+
+    # Crear motor de base de datos (SQLite)
+    engine = create_engine(f"sqlite:///{DB_PATH}")
+    manifest = leer_manifest(engine)
+
+    t_inicio = time.perf_counter()
+    pendientes = []
+    errores = []
+    omitidas = 0
+    for tarea in tareas:
+        try:
+            hash_actual = hash_fuentes(tarea)
+        except FileNotFoundError as e:
+            log(f"[{tarea['nombre']}] ERROR: fuente no encontrada: {e.filename}")
+            errores.append(tarea['nombre'])
+            continue
+        if not args.forzar and manifest.get(tarea['nombre']) == hash_actual:
+            log(f"[{tarea['nombre']}] Sin cambios, se omite")
+            omitidas += 1
+            continue
+        pendientes.append((tarea, hash_actual))
+
+    if pendientes:
+        max_workers = args.workers or min(len(pendientes), os.cpu_count() or 1)
+        # Parseo en paralelo; el proceso principal es el único escritor de la BD
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futuros = {pool.submit(ejecutar_parser, tarea): (tarea, h) for tarea, h in pendientes}
+            for futuro in as_completed(futuros):
+                tarea, hash_actual = futuros[futuro]
+                try:
+                    tablas, notas, duracion = futuro.result()
+                    for nota in notas:
+                        log(nota)
+                    t_escritura = time.perf_counter()
+                    escribir_tarea(engine, tarea, hash_actual, tablas)
+                    for nombre_tabla, df in tablas.items():
+                        log(f"\n[{nombre_tabla}] OK: {df.shape[0]} filas, {df.shape[1]} columnas "
+                            f"(parseo {duracion:.2f}s, escritura {time.perf_counter() - t_escritura:.2f}s)")
+                except Exception as e:
+                    # Un fallo solo afecta a su tarea; el resto de tablas se sigue cargando
+                    log(f"\n[{tarea['nombre']}] ERROR: {str(e)}")
+                    errores.append(tarea['nombre'])
+
+    cargadas = len(tareas) - omitidas - len(errores)
+    if cargadas:
+        # Actualizar estadísticas para que el planificador aproveche los índices nuevos
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    log(f"\nCarga completa en {time.perf_counter() - t_inicio:.2f}s: "
+        f"{cargadas} tareas cargadas, {omitidas} sin cambios, {len(errores)} con errores.")
+    if errores:
+        log(f"Tareas con errores: {', '.join(errores)}")
+    print(f"\nCarga completa. Revisa el log en {LOG_PATH}") # Modificado para mostrar la nueva ruta del log
 
-except Exception as e:
-    log(f"\nERROR GENERAL: {str(e)}")
 
-log("\nCarga completa de todas las tablas seleccionadas.")
-print(f"\nCarga completa. Revisa el log en {LOG_PATH}") # Modificado para mostrar la nueva ruta del log
+if __name__ == "__main__":
+    main()
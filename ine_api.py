@@ -5,23 +5,29 @@ Módulo para conectar con la API JSON del INE (Instituto Nacional de Estadístic
 y obtener datos equivalentes a los utilizados en PolicySpace2.
 """
 
-import requests
 import pandas as pd
 import json
 import os
 from datetime import datetime
 
+from ine_client import INEClientError, get_shared_client
+
 class INE_API:
     """
     Clase para interactuar con la API JSON del INE (Instituto Nacional de Estadística) de España.
     """
     
-    def __init__(self):
+    def __init__(self, client=None):
         """
         Inicializa la clase con la URL base de la API del INE.
+        
+        Args:
+            client (INEClient, optional): Cliente HTTP a usar. Por defecto, el
+                cliente compartido (sesión con pool de conexiones y caché en disco).
         """
         self.base_url = "https://servicios.ine.es/wstempus/js"
         self.output_dir = "datos_espana"
+        self.client = client or get_shared_client()
         
         # Crear directorio de salida si no existe
         if not os.path.exists(self.output_dir):
@@ -38,12 +44,10 @@ class INE_API:
             dict: Datos de la serie en formato JSON.
         """
         url = f"{self.base_url}/ES/SERIES/{series_id}"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Error al obtener la serie {series_id}: {response.status_code}")
+        try:
+            return self.client.get_json(url)
+        except INEClientError as e:
+            print(f"Error al obtener la serie {series_id}: {e}")
             return None
     
     def get_table(self, table_id):
@@ -57,14 +61,35 @@ class INE_API:
             dict: Datos de la tabla en formato JSON.
         """
         url = f"{self.base_url}/ES/DATOS_TABLA/{table_id}"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Error al obtener la tabla {table_id}: {response.status_code}")
+        try:
+            return self.client.get_json(url)
+        except INEClientError as e:
+            print(f"Error al obtener la tabla {table_id}: {e}")
             return None
     
+    def get_tables(self, table_ids, max_workers=None):
+        """
+        Obtiene varias tablas del INE en paralelo.
+        
+        Args:
+            table_ids (list): Identificadores de las tablas.
+            max_workers (int, optional): Máximo de descargas simultáneas.
+            
+        Returns:
+            dict: {table_id: datos JSON o None si la descarga falló}.
+        """
+        urls = {f"{self.base_url}/ES/DATOS_TABLA/{table_id}": table_id for table_id in table_ids}
+        resultados = self.client.fetch_many(list(urls), max_workers=max_workers)
+        tablas = {}
+        for url, valor in resultados.items():
+            table_id = urls[url]
+            if isinstance(valor, INEClientError):
+                print(f"Error al obtener la tabla {table_id}: {valor}")
+                tablas[table_id] = None
+            else:
+                tablas[table_id] = json.loads(valor.decode("utf-8"))
+        return tablas
+    
     def search_operations(self, query):
         """
         Busca operaciones estadísticas que coincidan con la consulta.
@@ -77,12 +102,10 @@ class INE_API:
         """
         url = f"{self.base_url}/ES/OPERACIONES_ESTADISTICAS"
         params = {"q": query}
-        response = requests.get(url, params=params)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"Error al buscar operaciones: {response.status_code}")
+        try:
+            return self.client.get_json(url, params=params)
+        except INEClientError as e:
+            print(f"Error al buscar operaciones: {e}")
             return None
     
     def get_municipalities(self):
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cliente HTTP compartido para la API del INE (JSON y CSV de `DATOS_TABLA`).
+
+Características:
+- Una única `requests.Session` con pool de conexiones (keep-alive) para todas
+  las peticiones.
+- Caché en disco por URL. Las respuestas se revalidan con `If-None-Match` /
+  `If-Modified-Since` cuando el servidor envía `ETag` / `Last-Modified`; un 304
+  reutiliza el cuerpo guardado sin volver a descargarlo.
+- Reintentos con backoff exponencial ante errores de red, 429 y 5xx.
+- Descarga concurrente de muchas tablas con un número máximo de peticiones
+  simultáneas.
+- Descarga directa a fichero por bloques (`descargar`), sin cargar el cuerpo
+  en memoria, con SHA-256 calculado durante la escritura.
+- Transporte intercambiable: `RequestsTransport` en producción y
+  `FixtureTransport` para ejecutar sin red a partir de respuestas grabadas.
+"""
+
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+INE_BASE_URL = "https://servicios.ine.es/wstempus"
+
+# Respuesta mínima que devuelven los transportes
+Respuesta = namedtuple("Respuesta", ["status_code", "headers", "content"])
+# Respuesta en streaming: `bloques` es un iterador de bytes
+RespuestaStream = namedtuple("RespuestaStream", ["status_code", "headers", "bloques"])
+
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+TAMANO_BLOQUE = 1 << 16
+SUFIJO_PARCIAL = ".part"
+
+
+class INEClientError(Exception):
+    """Error definitivo al obtener un recurso del INE (tras agotar los reintentos)."""
+
+
+def construir_url(url, params=None):
+    """URL canónica con los parámetros ordenados (clave de la caché)."""
+    if not params:
+        return url
+    separador = "&" if "?" in url else "?"
+    return f"{url}{separador}{urlencode(sorted(params.items()))}"
+
+
+class RequestsTransport:
+    """Transporte real: `requests.Session` con pool de conexiones."""
+
+    def __init__(self, pool_size=16):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, headers=None, timeout=None):
+        response = self.session.get(url, headers=headers, timeout=timeout)
+        return Respuesta(response.status_code, dict(response.headers), response.content)
+
+    @contextmanager
+    def stream(self, url, headers=None, timeout=None, tam_bloque=TAMANO_BLOQUE):
+        with self.session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            yield RespuestaStream(response.status_code, dict(response.headers),
+                                  response.iter_content(chunk_size=tam_bloque))
+
+
+class FixtureTransport:
+    """
+    Transporte sin red: sirve respuestas grabadas en `directorio`.
+
+    Cada respuesta son dos ficheros con el nombre `clave_cache(url)`:
+    `<clave>.body` (cuerpo) y `<clave>.json` (`{"url", "status_code", "headers"}`).
+    Con `grabar_desde` se delega en otro transporte y se graban sus respuestas.
+    """
+
+    def __init__(self, directorio, grabar_desde=None):
+        self.directorio = directorio
+        self.grabar_desde = grabar_desde
+        os.makedirs(directorio, exist_ok=True)
+
+    def get(self, url, headers=None, timeout=None):
+        clave = clave_cache(url)
+        ruta_meta = os.path.join(self.directorio, f"{clave}.json")
+        ruta_body = os.path.join(self.directorio, f"{clave}.body")
+        if self.grabar_desde is not None:
+            respuesta = self.grabar_desde.get(url, headers=headers, timeout=timeout)
+            escribir_atomico(ruta_body, respuesta.content)
+            meta = {"url": url, "status_code": respuesta.status_code, "headers": respuesta.headers}
+            escribir_atomico(ruta_meta, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            return respuesta
+        if not os.path.exists(ruta_meta):
+            return Respuesta(404, {}, b"")
+        with open(ruta_meta, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(ruta_body, "rb") as f:
+            content = f.read()
+        return Respuesta(meta["status_code"], meta.get("headers", {}), content)
+
+    @contextmanager
+    def stream(self, url, headers=None, timeout=None, tam_bloque=TAMANO_BLOQUE):
+        respuesta = self.get(url, headers=headers, timeout=timeout)
+        bloques = (respuesta.content[i:i + tam_bloque] for i in range(0, len(respuesta.content), tam_bloque))
+        yield RespuestaStream(respuesta.status_code, respuesta.headers, bloques)
+
+
+def clave_cache(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def escribir_atomico(ruta, datos):
+    """Escribe `datos` en `ruta` mediante un temporal + rename (sin ficheros a medias)."""
+    directorio = os.path.dirname(ruta) or "."
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(tmp, ruta)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class INEClient:
+    """
+    Cliente compartido para la API del INE.
+
+    Args:
+        cache_dir (str): Directorio de la caché en disco (None para desactivarla).
+        transport: Objeto con método `get(url, headers, timeout)` que devuelve
+            una `Respuesta` y, para `descargar`, `stream(url, headers, timeout,
+            tam_bloque)` que devuelve una `RespuestaStream` como gestor de
+            contexto. Por defecto, `RequestsTransport`.
+        timeout (float): Timeout por petición en segundos.
+        max_retries (int): Reintentos ante errores transitorios.
+        backoff (float): Espera base del backoff exponencial en segundos.
+        max_age (float): Segundos durante los que una respuesta cacheada se usa
+            sin revalidar con el servidor.
+        max_workers (int): Peticiones simultáneas en `fetch_many`.
+    """
+
+    def __init__(self, cache_dir=".cache_ine", transport=None, timeout=60, max_retries=4,
+                 backoff=1.0, max_age=12 * 3600, max_workers=8):
+        self.cache_dir = cache_dir
+        self.transport = transport or RequestsTransport(pool_size=max_workers)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_age = max_age
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self.stats = {"red": 0, "cache": 0, "revalidadas": 0, "reintentos": 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # --- Caché en disco ---
+
+    def _rutas_cache(self, url):
+        clave = clave_cache(url)
+        return (os.path.join(self.cache_dir, f"{clave}.json"),
+                os.path.join(self.cache_dir, f"{clave}.body"))
+
+    def _leer_cache(self, url):
+        if not self.cache_dir:
+            return None, None
+        ruta_meta, ruta_body = self._rutas_cache(url)
+        if not (os.path.exists(ruta_meta) and os.path.exists(ruta_body)):
+            return None, None
+        with open(ruta_meta, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(ruta_body, "rb") as f:
+            return meta, f.read()
+
+    def _guardar_cache(self, url, headers, content=None):
+        """Guarda metadatos y cuerpo; con `content=None` solo renueva los metadatos."""
+        if not self.cache_dir:
+            return
+        headers = {k.lower(): v for k, v in headers.items()}
+        meta = {
+            "url": url,
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "guardado": time.time(),
+        }
+        ruta_meta, ruta_body = self._rutas_cache(url)
+        if content is not None:
+            escribir_atomico(ruta_body, content)
+        escribir_atomico(ruta_meta, json.dumps(meta).encode("utf-8"))
+
+    def _contar(self, clave):
+        with self._lock:
+            self.stats[clave] += 1
+
+    # --- Peticiones ---
+
+    def get(self, url, params=None):
+        """
+        Obtiene el cuerpo de `url` (bytes), usando la caché cuando es posible.
+
+        Raises:
+            INEClientError: Si la petición falla tras agotar los reintentos.
+        """
+        url = construir_url(url, params)
+        meta, cuerpo_cacheado = self._leer_cache(url)
+
+        if meta is not None and self.max_age and time.time() - meta.get("guardado", 0) < self.max_age:
+            self._contar("cache")
+            return cuerpo_cacheado
+
+        headers = {}
+        if meta is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        respuesta = self._get_con_reintentos(url, headers)
+        if respuesta.status_code == 304 and cuerpo_cacheado is not None:
+            self._contar("revalidadas")
+            # Renovar la fecha de la caché sin reescribir el cuerpo
+            self._guardar_cache(url, {"etag": meta.get("etag"), "last-modified": meta.get("last_modified")})
+            return cuerpo_cacheado
+        if respuesta.status_code != 200:
+            raise INEClientError(f"HTTP {respuesta.status_code} al obtener {url}")
+
+        self._contar("red")
+        self._guardar_cache(url, respuesta.headers, respuesta.content)
+        return respuesta.content
+
+    def _esperar_reintento(self, intento):
+        self._contar("reintentos")
+        # Backoff exponencial con jitter: 1s, 2s, 4s, ... (+ hasta un 10 %)
+        espera = self.backoff * (2 ** (intento - 1))
+        time.sleep(espera + random.uniform(0, espera * 0.1))
+
+    def _get_con_reintentos(self, url, headers):
+        ultimo_error = None
+        for intento in range(self.max_retries + 1):
+            if intento:
+                self._esperar_reintento(intento)
+            try:
+                respuesta = self.transport.get(url, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                ultimo_error = e
+                continue
+            if respuesta.status_code in ESTADOS_REINTENTABLES:
+                ultimo_error = INEClientError(f"HTTP {respuesta.status_code}")
+                continue
+            return respuesta
+        raise INEClientError(f"Error al obtener {url} tras {self.max_retries + 1} intentos: {ultimo_error}")
+
+    def descargar(self, url, ruta, params=None, tam_bloque=TAMANO_BLOQUE):
+        """
+        Descarga `url` en el fichero `ruta` por bloques de `tam_bloque` bytes, sin
+        pasar por la caché ni cargar el cuerpo en memoria. Se escribe en
+        `ruta + ".part"`, calculando el SHA-256 a la vez, y se renombra al terminar.
+
+        Returns:
+            dict: {"bytes", "sha256", "etag", "last_modified"} de la descarga.
+
+        Raises:
+            INEClientError: Si la descarga falla tras agotar los reintentos o no se
+                puede escribir el fichero.
+        """
+        url = construir_url(url, params)
+        ruta_parcial = f"{ruta}{SUFIJO_PARCIAL}"
+        ultimo_error = None
+        try:
+            for intento in range(self.max_retries + 1):
+                if intento:
+                    self._esperar_reintento(intento)
+                try:
+                    with self.transport.stream(url, timeout=self.timeout, tam_bloque=tam_bloque) as respuesta:
+                        if respuesta.status_code in ESTADOS_REINTENTABLES:
+                            ultimo_error = INEClientError(f"HTTP {respuesta.status_code}")
+                            continue
+                        if respuesta.status_code != 200:
+                            raise INEClientError(f"HTTP {respuesta.status_code} al obtener {url}")
+                        sha256 = hashlib.sha256()
+                        total = 0
+                        with open(ruta_parcial, "wb") as f:
+                            for bloque in respuesta.bloques:
+                                f.write(bloque)
+                                sha256.update(bloque)
+                                total += len(bloque)
+                        headers = {k.lower(): v for k, v in respuesta.headers.items()}
+                    os.replace(ruta_parcial, ruta)
+                except requests.exceptions.RequestException as e:
+                    ultimo_error = e
+                    continue
+                except OSError as e:
+                    raise INEClientError(f"No se pudo escribir {ruta}: {e}") from e
+                self._contar("red")
+                return {
+                    "bytes": total,
+                    "sha256": sha256.hexdigest(),
+                    "etag": headers.get("etag"),
+                    "last_modified": headers.get("last-modified"),
+                }
+        finally:
+            if os.path.exists(ruta_parcial):
+                os.remove(ruta_parcial)
+        raise INEClientError(f"Error al descargar {url} tras {self.max_retries + 1} intentos: {ultimo_error}")
+
+    def get_json(self, url, params=None):
+        """Obtiene y decodifica una respuesta JSON."""
+        return json.loads(self.get(url, params=params).decode("utf-8"))
+
+    def iter_many(self, urls, max_workers=None):
+        """
+        Descarga varias URL en paralelo (como máximo `max_workers` a la vez) y
+        devuelve cada resultado en cuanto termina, para poder procesarlo sin
+        esperar al resto.
+
+        Yields:
+            tuple: (url, bytes) para las descargas correctas y (url, INEClientError)
+            para las fallidas.
+        """
+        yield from self._en_paralelo(self.get, {url: (url,) for url in urls}, max_workers)
+
+    def iter_descargas(self, destinos, max_workers=None, tam_bloque=TAMANO_BLOQUE):
+        """
+        Descarga en paralelo cada URL de `destinos` ({url: ruta}) con `descargar`.
+
+        Yields:
+            tuple: (url, dict de `descargar`) o (url, INEClientError).
+        """
+        tareas = {url: (url, ruta, None, tam_bloque) for url, ruta in destinos.items()}
+        yield from self._en_paralelo(self.descargar, tareas, max_workers)
+
+    def _en_paralelo(self, funcion, tareas, max_workers=None):
+        """Ejecuta `funcion(*args)` para cada {clave: args} y devuelve (clave, resultado) según terminan."""
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as pool:
+            futuros = {pool.submit(funcion, *args): clave for clave, args in tareas.items()}
+            for futuro in as_completed(futuros):
+                clave = futuros[futuro]
+                try:
+                    yield clave, futuro.result()
+                except INEClientError as e:
+                    yield clave, e
+
+    def fetch_many(self, urls, max_workers=None):
+        """
+        Descarga varias URL en paralelo (como máximo `max_workers` a la vez).
+
+        Returns:
+            dict: {url: bytes} para las descargas correctas y {url: INEClientError}
+            para las fallidas.
+        """
+        return dict(self.iter_many(urls, max_workers=max_workers))
+
+    # --- Atajos de la API del INE ---
+
+    def url_json(self, recurso, identificador, idioma="ES"):
+        return f"{INE_BASE_URL}/js/{idioma}/{recurso}/{identificador}"
+
+    def url_tabla_csv(self, table_code, nult=999, idioma="ES"):
+        return f"{INE_BASE_URL}/csv/{idioma}/DATOS_TABLA/{table_code}?nult={nult}"
+
+    def get_table_csv(self, table_code, nult=999):
+        """CSV (texto) de `DATOS_TABLA/{table_code}`."""
+        return self.get(self.url_tabla_csv(table_code, nult)).decode("utf-8")
+
+    def get_tables_csv(self, table_codes, nult=999, max_workers=None):
+        """
+        CSV de varias tablas descargadas en paralelo.
+
+        Returns:
+            dict: {table_code: texto CSV o INEClientError}.
+        """
+        urls = {self.url_tabla_csv(code, nult): code for code in table_codes}
+        resultados = self.fetch_many(list(urls), max_workers=max_workers)
+        return {
+            urls[url]: (valor.decode("utf-8") if isinstance(valor, bytes) else valor)
+            for url, valor in resultados.items()
+        }
+
+
+_cliente_compartido = None
+_lock_cliente = threading.Lock()
+
+
+def get_shared_client():
+    """Cliente único por proceso, para que todos los módulos compartan sesión y caché."""
+    global _cliente_compartido
+    with _lock_cliente:
+        if _cliente_compartido is None:
+            _cliente_compartido = INEClient()
+    return _cliente_compartido
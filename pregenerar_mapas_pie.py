@@ -1,72 +1,131 @@
-import subprocess
+import argparse
 import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
 import pandas as pd
-import os
+
+# Los módulos del mapa (explorar_pie.py y generar_mapa_pie.py) se importan
+# directamente en lugar de lanzarlos como subprocesos por año.
+MAPA_PIE_DIR = Path(__file__).resolve().parent / "dashboard/pages/exp/mapa_pie_anual"
+sys.path.insert(0, str(MAPA_PIE_DIR))
+
+from explorar_pie import COLUMNAS_MAPA, TARGET_COLUMN, preparar_datos_mapa  # noqa: E402
+from generar_mapa_pie import cargar_municipios, generar_mapa, geojson_path  # noqa: E402
+from generar_mapa_pie_anual import generar_mapa_anual, output_map_filename  # noqa: E402
 
 # --- Configuración ---
 start_year_default = 2007
 end_year_default = 2022
-explorar_script_path = "dashboard/pages/exp/mapa_pie_anual/explorar_pie.py"
-generar_script_path = "dashboard/pages/exp/mapa_pie_anual/generar_mapa_pie.py"
-db_path = 'data base/datawarehouse.db' # Para obtener los años disponibles dinámicamente
+db_path = 'database 2/datawarehouse_v2.db' # Tabla PIE de la que salen los datos de todos los años
+MAX_WORKERS = None # None = un proceso por CPU
+
+# GeoDataFrame de municipios de cada proceso (se carga una vez por proceso, no por año)
+_gdf_municipios = None
 
-def get_available_years_from_db(db_file):
-    """Consulta la base de datos para obtener los años únicos en la tabla PIE."""
+
+def cargar_pie(db_file):
+    """Lee una sola vez las columnas de la tabla PIE que necesitan los mapas."""
+    columnas = ", ".join(COLUMNAS_MAPA)
+    conn = sqlite3.connect(db_file)
     try:
-        conn = sqlite3.connect(db_file)
-        df_years = pd.read_sql_query("SELECT DISTINCT year FROM PIE ORDER BY year", conn)
+        return pd.read_sql_query(f"SELECT {columnas} FROM PIE", conn)
+    finally:
         conn.close()
-        if not df_years.empty:
-            return df_years['year'].tolist()
-    except Exception as e:
-        print(f"Error al leer años de la base de datos: {e}")
-    return None
 
-def run_script(script_path, year):
-    """Ejecuta un script Python con un año como argumento."""
+
+def _inicializar_proceso(gdf_municipios):
+    global _gdf_municipios
+    _gdf_municipios = gdf_municipios
+
+
+def generar_año(year, df_pie_year):
+    """Genera el CSV y el HTML del mapa de un año. Devuelve (year, ok, mensaje)."""
     try:
-        print(f"\n--- Ejecutando {os.path.basename(script_path)} para el año {year} ---")
-        # Usar python3 explícitamente puede ser más robusto en algunos sistemas
-        result = subprocess.run(["python3", script_path, str(year)], capture_output=True, text=True, check=True)
-        print(f"Salida de {os.path.basename(script_path)} para {year}:\n{result.stdout}")
-        if result.stderr:
-            print(f"Errores (stderr) de {os.path.basename(script_path)} para {year}:\n{result.stderr}")
-        print(f"--- {os.path.basename(script_path)} para el año {year} completado ---")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error al ejecutar {os.path.basename(script_path)} para el año {year}:")
-        print(f"Código de retorno: {e.returncode}")
-        print(f"Salida (stdout):\n{e.stdout}")
-        print(f"Error (stderr):\n{e.stderr}")
-        return False
-    except FileNotFoundError:
-        print(f"Error: El intérprete 'python3' o el script '{script_path}' no fue encontrado.")
-        return False
+        non_null = df_pie_year[TARGET_COLUMN].notna().sum()
+        if non_null == 0:
+            return year, False, f"sin valores '{TARGET_COLUMN}'"
 
+        map_data = preparar_datos_mapa(df_pie_year, TARGET_COLUMN)
+        map_data.to_csv(MAPA_PIE_DIR / f"datos_pie_mapa_{year}.csv", index=False)
+
+        # El HTML se genera a partir del CSV escrito, igual que al ejecutar generar_mapa_pie.py
+        df_mapa = pd.read_csv(MAPA_PIE_DIR / f"datos_pie_mapa_{year}.csv")
+        generar_mapa(_gdf_municipios, df_mapa, year, MAPA_PIE_DIR / f"mapa_pie_municipios_{year}.html")
+        return year, True, f"{len(map_data)} municipios"
+    except Exception as e:
+        return year, False, f"{type(e).__name__}: {e}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pregenera los mapas PIE de todos los años.")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="Procesos simultáneos")
+    parser.add_argument("--html-por-año", dest="html_por_año", action="store_true",
+                        help="Generar también los mapas HTML independientes de cada año")
+    args = parser.parse_args()
 
-if __name__ == "__main__":
     print("Iniciando pregeneración de mapas PIE por año...")
-    
-    available_years = get_available_years_from_db(db_path)
-    
+    inicio = time.perf_counter()
+
+    try:
+        df_pie = cargar_pie(db_path)
+    except Exception as e:
+        print(f"❌ Error al leer la tabla PIE de la base de datos: {e}")
+        return 1
+
+    available_years = sorted(df_pie['year'].dropna().unique().tolist())
     if available_years:
         print(f"Años detectados en la base de datos para PIE: {available_years}")
         years_to_process = available_years
     else:
         print(f"No se pudieron obtener años de la BD, usando rango por defecto: {start_year_default}-{end_year_default}")
-        years_to_process = range(start_year_default, end_year_default + 1)
-
-    for year in years_to_process:
-        print(f"\n===== Procesando Año: {year} =====")
-        
-        # 1. Ejecutar explorar_pie.py para generar el CSV de datos del año
-        if not run_script(explorar_script_path, year):
-            print(f"Fallo al generar datos CSV para {year}. Saltando generación de mapa para este año.")
-            continue # Saltar al siguiente año si falla la extracción de datos
-
-        # 2. Ejecutar generar_mapa_pie.py para generar el HTML del mapa del año
-        if not run_script(generar_script_path, year):
-            print(f"Fallo al generar mapa HTML para {year}.")
-            # Continuar con el siguiente año incluso si este falla, para intentar generar los demás
-            
-    print("\n===== Pregeneración de todos los mapas completada. =====")
+        years_to_process = list(range(start_year_default, end_year_default + 1))
+
+    gdf_municipios = cargar_municipios(geojson_path)
+    datos_por_año = {year: df for year, df in df_pie.groupby('year')}
+
+    # Mapa único: geometría compartida y selector de año en el navegador
+    try:
+        datos_mapa = {int(year): preparar_datos_mapa(datos_por_año[year], TARGET_COLUMN)
+                      for year in years_to_process if year in datos_por_año}
+        años_mapa = generar_mapa_anual(gdf_municipios, datos_mapa, MAPA_PIE_DIR / output_map_filename)
+        print(f"✅ Mapa único generado con los años {años_mapa}")
+    except Exception as e:
+        print(f"❌ Fallo al generar el mapa único: {type(e).__name__}: {e}")
+        return 1
+
+    if not args.html_por_año:
+        print(f"\n===== Pregeneración completada en {time.perf_counter() - inicio:.1f} s. =====")
+        return 0
+
+    fallidos = []
+    with ProcessPoolExecutor(max_workers=args.max_workers, initializer=_inicializar_proceso,
+                             initargs=(gdf_municipios,)) as pool:
+        futuros = []
+        for year in years_to_process:
+            df_year = datos_por_año.get(year)
+            if df_year is None or df_year.empty:
+                print(f"⚠️ No se encontraron datos para el año {year}. Saltando.")
+                fallidos.append(year)
+                continue
+            futuros.append(pool.submit(generar_año, int(year), df_year))
+
+        for futuro in as_completed(futuros):
+            year, ok, mensaje = futuro.result()
+            if ok:
+                print(f"✅ Mapa {year} generado ({mensaje})")
+            else:
+                print(f"❌ Fallo al generar el mapa de {year}: {mensaje}")
+                fallidos.append(year)
+
+    print(f"\n===== Pregeneración de todos los mapas completada en {time.perf_counter() - inicio:.1f} s. =====")
+    if fallidos:
+        print(f"Años con errores: {sorted(fallidos)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Pruebas de ine_client.py con un transporte en memoria (respuestas programadas por URL)
+y con FixtureTransport (grabar y reproducir sin red).
+
+Ejecutar desde la raíz del repositorio:
+    $ python -m pytest test_ine_client.py
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+import ine_client
+from ine_client import FixtureTransport, INEClient, INEClientError, Respuesta
+
+URL = "https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/2854?nult=999"
+CUERPO = "Municipios;Periodo;Total\n01001 Alegría-Dulantzi;2023;3.050\n".encode("utf-8")
+ETAG = '"2854-v1"'
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+
+
+class TransporteProgramado:
+    """
+    Devuelve, para cada URL, las respuestas de `respuestas[url]` en orden (la última
+    se repite); un elemento que sea una excepción se lanza. Registra (url, cabeceras)
+    de cada petición y el máximo de peticiones simultáneas.
+    """
+
+    def __init__(self, respuestas, espera=0.0):
+        self.respuestas = {url: list(r) for url, r in respuestas.items()}
+        self.espera = espera
+        self.peticiones = []
+        self.activas = 0
+        self.max_activas = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None):
+        with self._lock:
+            self.peticiones.append((url, dict(headers or {})))
+            self.activas += 1
+            self.max_activas = max(self.max_activas, self.activas)
+            cola = self.respuestas.get(url, [Respuesta(404, {}, b"")])
+            respuesta = cola.pop(0) if len(cola) > 1 else cola[0]
+        try:
+            if self.espera:
+                time.sleep(self.espera)
+            if isinstance(respuesta, Exception):
+                raise respuesta
+            return respuesta
+        finally:
+            with self._lock:
+                self.activas -= 1
+
+
+def ok(cuerpo=CUERPO, etag=ETAG, last_modified=LAST_MODIFIED):
+    return Respuesta(200, {"ETag": etag, "Last-Modified": last_modified}, cuerpo)
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    """Esperas del backoff (sin dormir de verdad)."""
+    registradas = []
+    monkeypatch.setattr(ine_client.time, "sleep", registradas.append)
+    return registradas
+
+
+def cliente(transporte, cache_dir=None, **kwargs):
+    kwargs.setdefault("backoff", 0)
+    return INEClient(cache_dir=str(cache_dir) if cache_dir else None, transport=transporte, **kwargs)
+
+
+def test_acierto_de_cache_no_repite_la_peticion(tmp_path):
+    transporte = TransporteProgramado({URL: [ok()]})
+    c = cliente(transporte, tmp_path, max_age=3600)
+
+    assert c.get(URL) == CUERPO
+    assert c.get(URL) == CUERPO
+
+    assert len(transporte.peticiones) == 1
+    assert c.stats["red"] == 1 and c.stats["cache"] == 1
+
+
+def test_la_cache_en_disco_se_comparte_entre_clientes(tmp_path):
+    assert cliente(TransporteProgramado({URL: [ok()]}), tmp_path, max_age=3600).get(URL) == CUERPO
+
+    transporte = TransporteProgramado({})
+    assert cliente(transporte, tmp_path, max_age=3600).get(URL) == CUERPO
+    assert transporte.peticiones == []
+
+
+def test_revalida_con_if_none_match_e_if_modified_since_y_un_304_reutiliza_el_cuerpo(tmp_path):
+    transporte = TransporteProgramado({URL: [ok(), Respuesta(304, {}, b"")]})
+    c = cliente(transporte, tmp_path, max_age=0)
+
+    assert c.get(URL) == CUERPO
+    assert c.get(URL) == CUERPO
+
+    (_, primeras), (_, revalidacion) = transporte.peticiones
+    assert "If-None-Match" not in primeras
+    assert revalidacion == {"If-None-Match": ETAG, "If-Modified-Since": LAST_MODIFIED}
+    assert c.stats["red"] == 1 and c.stats["revalidadas"] == 1
+
+
+def test_una_version_nueva_sustituye_la_cacheada(tmp_path):
+    nuevo = CUERPO.replace(b"3.050", b"3.112")
+    transporte = TransporteProgramado({URL: [ok(), ok(nuevo, etag='"2854-v2"'), Respuesta(304, {}, b"")]})
+    c = cliente(transporte, tmp_path, max_age=0)
+
+    assert c.get(URL) == CUERPO
+    assert c.get(URL) == nuevo
+    assert c.get(URL) == nuevo
+
+    assert transporte.peticiones[2][1]["If-None-Match"] == '"2854-v2"'
+
+
+@pytest.mark.parametrize("estado", [429, 500, 502, 503, 504])
+def test_reintenta_429_y_5xx_con_backoff_exponencial(estado, esperas):
+    transporte = TransporteProgramado({URL: [Respuesta(estado, {}, b""), Respuesta(estado, {}, b""), ok()]})
+    c = cliente(transporte, backoff=1.0, max_retries=4)
+
+    assert c.get(URL) == CUERPO
+
+    assert len(transporte.peticiones) == 3
+    assert c.stats["reintentos"] == 2
+    # 1 s y 2 s, más un jitter de hasta el 10 %
+    assert 1.0 <= esperas[0] <= 1.1 and 2.0 <= esperas[1] <= 2.2
+
+
+def test_reintenta_errores_de_red(esperas):
+    transporte = TransporteProgramado({URL: [requests.exceptions.ConnectionError("reset"), ok()]})
+
+    assert cliente(transporte).get(URL) == CUERPO
+    assert len(transporte.peticiones) == 2
+
+
+def test_se_rinde_tras_agotar_los_reintentos(esperas):
+    transporte = TransporteProgramado({URL: [Respuesta(503, {}, b"")]})
+
+    with pytest.raises(INEClientError, match="3 intentos"):
+        cliente(transporte, max_retries=2).get(URL)
+    assert len(transporte.peticiones) == 3
+
+
+def test_no_reintenta_errores_del_cliente(esperas):
+    transporte = TransporteProgramado({})
+
+    with pytest.raises(INEClientError, match="HTTP 404"):
+        cliente(transporte, max_retries=4).get(URL)
+    assert len(transporte.peticiones) == 1 and esperas == []
+
+
+def test_fetch_many_descarga_en_paralelo_hasta_max_workers():
+    urls = [f"https://servicios.ine.es/wstempus/csv/ES/DATOS_TABLA/{code}?nult=999" for code in range(10)]
+    transporte = TransporteProgramado({url: [ok(url.encode("utf-8"))] for url in urls[:-1]}, espera=0.05)
+    c = cliente(transporte, max_retries=0)
+
+    resultados = c.fetch_many(urls, max_workers=3)
+
+    assert transporte.max_activas == 3
+    assert {url: resultados[url] for url in urls[:-1]} == {url: url.encode("utf-8") for url in urls[:-1]}
+    assert isinstance(resultados[urls[-1]], INEClientError)
+
+
+def test_fixture_transport_graba_y_reproduce_sin_red(tmp_path):
+    grabadas = tmp_path / "fixtures"
+    en_linea = TransporteProgramado({URL: [ok()]})
+    assert cliente(FixtureTransport(str(grabadas), grabar_desde=en_linea)).get(URL) == CUERPO
+
+    sin_red = cliente(FixtureTransport(str(grabadas)))
+    assert sin_red.get(URL) == CUERPO
+    assert sin_red.get_tables_csv(["2854"]) == {"2854": CUERPO.decode("utf-8")}
+    with pytest.raises(INEClientError, match="HTTP 404"):
+        sin_red.get(URL.replace("2854", "2855"))